@@ -1,19 +1,1069 @@
 
 # -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from collections import OrderedDict, deque
 from contextlib import contextmanager
 from html import escape
-from threading import Timer
-from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
-from types import TracebackType
-
-import pymqi
+from threading import Condition, Event, Lock, Thread, current_thread, local
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from xml.etree import ElementTree
+
+import importlib
+import json
+import math
+import operator
+import os
 import configparser
+import struct
 
 from robot.api import logger
 from robot.running.context import EXECUTION_CONTEXTS
 from robot.running.timeouts import KeywordTimeout, TestTimeout
-from robot.utils import ConnectionCache
-from robot.libraries.BuiltIn import BuiltIn
+from robot.utils import ConnectionCache, timestr_to_secs
+from robot.libraries.BuiltIn import BuiltIn, RobotNotRunningError
+
+
+class _LazyModule(object):
+
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    pymqi loads the native MQ client libraries, which libdoc, dry-runs and suites that never
+    touch MQ do not need. Once imported, the module replaces this stand-in in the globals, so
+    later accesses cost nothing extra.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __getattr__(self, attribute: str) -> Any:
+        started = time.perf_counter()
+        module = importlib.import_module(self._name)
+        _IMPORT_TIMES[self._name] = time.perf_counter() - started
+        if globals().get(self._name) is self:
+            globals()[self._name] = module
+        return getattr(module, attribute)
+
+
+_IMPORT_TIMES: Dict[str, float] = {}
+pymqi: Any = _LazyModule('pymqi')
+
+# MQOO_* values of CMQC, spelled out so that importing the library does not import pymqi.
+_OPEN_OUTPUT = 16 | 8192  # MQOO_OUTPUT | MQOO_FAIL_IF_QUIESCING
+_OPEN_INPUT = 2 | 8192  # MQOO_INPUT_SHARED | MQOO_FAIL_IF_QUIESCING, so cached handles never lock a queue
+_OPEN_INQUIRE = 32 | 8192  # MQOO_INQUIRE | MQOO_FAIL_IF_QUIESCING
+_OPEN_BROWSE_INPUT = 8 | _OPEN_INPUT  # MQOO_BROWSE | _OPEN_INPUT
+_OPEN_DYNAMIC_REPLY = 4 | 8192  # MQOO_INPUT_EXCLUSIVE | MQOO_FAIL_IF_QUIESCING
+
+_CONFIG_FILE = 'PyMQI.cfg'  # The default config file, in the current working directory
+_CONFIG_SECTION = 'IBM.MQ'
+_CONFIG_CACHE: Dict[str, Dict[str, str]] = {}
+
+# Queues known to exist, per queue manager connection (queue manager, channel, connection info), so
+# repeated suite setups of one run skip their definition.
+_KNOWN_QUEUES: Dict[Tuple[str, Optional[str], Optional[str]], Set[str]] = {}
+
+_PURGE_BUFFER_LENGTH = 1  # Purging gets accept truncation, so message bodies are not transferred
+
+# MQRC_CONNECTION_BROKEN, MQRC_HCONN_ERROR, MQRC_Q_MGR_NOT_AVAILABLE, MQRC_Q_MGR_QUIESCING, MQRC_Q_MGR_STOPPING,
+# MQRC_CONNECTION_QUIESCING and MQRC_RECONNECT_FAILED: the connection is gone and has to be made again.
+_CONNECTION_LOST_REASONS = frozenset((2009, 2018, 2059, 2161, 2162, 2202, 2548))
+
+# MQRC_NO_MSG_AVAILABLE: keywords returning nothing for an empty queue have not failed.
+_EMPTY_QUEUE_REASONS = frozenset((2033,))
+
+# MQRC_GET_INHIBITED, MQRC_HOBJ_ERROR, MQRC_OBJECT_CHANGED, MQRC_PUT_INHIBITED, MQRC_Q_DELETED and
+# MQRC_UNKNOWN_OBJECT_NAME, plus a lost connection: a cached handle that saw these is not reused.
+_HANDLE_ERROR_REASONS = frozenset((2016, 2019, 2041, 2051, 2052, 2085)) | _CONNECTION_LOST_REASONS
+
+# Guards the process environment while it carries the CCDT location of a connect.
+_ENVIRONMENT_LOCK = Lock()
+
+# Queue snapshot files: the magic, then one record per message made of a header with the MQMD and
+# payload lengths, the packed MQMD and the payload. The whole file may be compressed.
+_SNAPSHOT_MAGIC = b'PYMQIQ\x00\x01'
+_SNAPSHOT_RECORD = struct.Struct('>II')
+_SNAPSHOT_COMPRESSIONS = {'none': None, 'gzip': 'gzip', 'bz2': 'bz2', 'lzma': 'lzma'}
+_SNAPSHOT_SIGNATURES = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'lzma'))
+
+_CCSID_ENCODINGS = {
+    1208: 'utf-8', 1200: 'utf-16-be', 1202: 'utf-16-le', 13488: 'utf-16-be', 17584: 'utf-16-be',
+    819: 'latin-1', 923: 'iso8859-15', 912: 'iso8859-2', 437: 'cp437', 850: 'cp850',
+    1250: 'cp1250', 1251: 'cp1251', 1252: 'cp1252', 5348: 'cp1252',
+    37: 'cp037', 273: 'cp273', 500: 'cp500', 1140: 'cp1140',
+}
+# UTF-8 text is often labelled with the ASCII based CCSID of the queue manager, so it is tried first.
+_UTF8_FIRST_CCSIDS = frozenset((0, 819, 923, 912, 437, 850, 1250, 1251, 1252, 5348))
+
+
+def _read_config(path: str) -> Dict[str, str]:
+    # Every config file is parsed once per process, however many library instances read it.
+    path = os.path.abspath(path)
+    config = _CONFIG_CACHE.get(path)
+    if config is None:
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        config = _CONFIG_CACHE[path] = dict(parser.items(_CONFIG_SECTION)) if parser.has_section(_CONFIG_SECTION) else {}
+    return config
+
+
+def _conn_info(host: str, port: Optional[int]) -> str:
+    # A connection name list ('host1(1414),host2(1415)') is kept as it is; hosts without a port get the given one.
+    entries = [entry.strip() for entry in str(host).split(',')]
+    return ','.join(entry if '(' in entry else '%s(%s)' % (entry, port) for entry in entries)
+
+
+def _connect(key: Tuple[str, Optional[str], Optional[str], Optional[str]], password: Optional[str] = None,
+             options: int = 0, ccdt_url: Optional[str] = None) -> pymqi.QueueManager:
+    # Without a connection name the client takes the channel from the CCDT. Reconnect options need
+    # MQCONNX, so they always go through connect_with_options.
+    qmgr_name, channel, conn_info, user = key
+    if conn_info and not options:
+        return pymqi.connect(qmgr_name, channel, conn_info, user, password)
+    kwargs: Dict[str, Any] = {'opts': options, 'user': user, 'password': password}
+    if conn_info:
+        kwargs['cd'] = pymqi.CD(ChannelName=channel.encode('utf-8'), ConnectionName=conn_info.encode('utf-8'),
+                                ChannelType=pymqi.CMQXC.MQCHT_CLNTCONN, TransportType=pymqi.CMQXC.MQXPT_TCP)
+    qmgr = pymqi.QueueManager(None)
+    if conn_info or ccdt_url is None:
+        qmgr.connect_with_options(qmgr_name, **kwargs)
+        return qmgr
+    # The client reads the CCDT location from MQCCDTURL when connecting, so it is set only meanwhile.
+    with _ENVIRONMENT_LOCK:
+        previous = os.environ.get('MQCCDTURL')
+        os.environ['MQCCDTURL'] = ccdt_url
+        try:
+            qmgr.connect_with_options(qmgr_name, **kwargs)
+        finally:
+            if previous is None:
+                del os.environ['MQCCDTURL']
+            else:
+                os.environ['MQCCDTURL'] = previous
+    return qmgr
+
+
+def _open_snapshot(path: str, mode: str, compression: Optional[str] = None) -> Any:
+    # The compression of a file being read is told by its signature; the modules are imported on demand.
+    if mode == 'rb':
+        with open(path, 'rb') as snapshotfile:
+            signature = snapshotfile.read(6)
+        compression = next((name for prefix, name in _SNAPSHOT_SIGNATURES if signature.startswith(prefix)), 'none')
+    if compression not in _SNAPSHOT_COMPRESSIONS:
+        raise ValueError("Unknown compression '%s', expected one of: %s." % (compression, ', '.join(_SNAPSHOT_COMPRESSIONS)))
+    module = _SNAPSHOT_COMPRESSIONS[compression]
+    if module is None:
+        return open(path, mode)
+    return importlib.import_module(module).open(path, mode)
+
+
+def _percentile(ordered: List[Union[int, float]], percentile: float) -> Union[int, float]:
+    # Nearest-rank percentile of an already sorted, non-empty list.
+    return ordered[max(0, math.ceil(percentile / 100.0 * len(ordered)) - 1)]
+
+
+def _decode_text(payload: bytes, ccsid: int = 0) -> str:
+    if ccsid in _UTF8_FIRST_CCSIDS:
+        try:
+            return payload.decode('utf-8')
+        except UnicodeDecodeError:
+            if ccsid == 0:
+                raise
+    return payload.decode(_CCSID_ENCODINGS.get(ccsid, 'utf-8'))
+
+
+def _decode_auto(message: 'MQMessage', options: Optional[str]) -> Union[str, bytes]:
+    if message.format == 'MQSTR':
+        return message.text
+    try:
+        return message.text
+    except UnicodeDecodeError:
+        return message.payload
+
+
+def _decode_fixed(message: 'MQMessage', options: Optional[str]) -> Dict[str, str]:
+    # The layout is 'name=width,name=width,...' over the text of the message.
+    if not options:
+        raise ValueError("The fixed codec needs a layout, e.g. 'fixed:id=8,name=20,amount=10'.")
+    text = message.text
+    fields = {}
+    offset = 0
+    for field in options.split(','):
+        name, width = field.split('=')
+        fields[name.strip()] = text[offset:offset + int(width)].strip()
+        offset += int(width)
+    return fields
+
+
+_CODECS: Dict[str, Callable[['MQMessage', Optional[str]], Any]] = {
+    'auto': _decode_auto,
+    'text': lambda message, options: _decode_text(message.payload, message.ccsid),
+    'bytes': lambda message, options: message.payload,
+    'json': lambda message, options: json.loads(message.text),
+    'xml': lambda message, options: ElementTree.fromstring(message.payload),
+    'fixed': _decode_fixed,
+}
+
+
+class MQMessage(object):
+
+    """
+    A got message: the raw payload bytes and the MQMD, decoded lazily.
+
+    Every codec runs at most once per message, so repeated assertions on a large JSON or XML
+    reply parse it once. A codec is given by name, optionally with options after a colon, e.g.
+    _json_ or _fixed:id=8,name=20_. In Robot, use the properties with the extended variable
+    syntax, e.g. _${msg.json}[order][id]_ or _${msg.text}_. Messages compare equal to messages
+    and bytes with the same payload; compare _${msg.text}_ with text.
+    """
+
+    __slots__ = ('payload', 'md', 'codec', 'codecs', '_decoded')
+
+    def __init__(self, payload: bytes, md: pymqi.MD, codec: str = 'auto',
+                 codecs: Optional[Dict[str, Callable[['MQMessage', Optional[str]], Any]]] = None) -> None:
+        self.payload = payload
+        self.md = md
+        self.codec = codec
+        self.codecs = _CODECS if codecs is None else codecs
+        self._decoded: Dict[str, Any] = {}
+
+    def decode(self, codec: Optional[str] = None) -> Any:
+        codec = codec or self.codec
+        try:
+            return self._decoded[codec]
+        except KeyError:
+            pass
+        name, _, options = codec.partition(':')
+        decoder = self.codecs.get(name)
+        if decoder is None:
+            raise ValueError("Unknown payload codec '%s', expected one of %s." % (name, ', '.join(sorted(self.codecs))))
+        value = self._decoded[codec] = decoder(self, options or None)
+        return value
+
+    @property
+    def value(self) -> Any:
+        return self.decode()
+
+    @property
+    def text(self) -> str:
+        return self.decode('text')
+
+    @property
+    def json(self) -> Any:
+        return self.decode('json')
+
+    @property
+    def xml(self) -> ElementTree.Element:
+        return self.decode('xml')
+
+    @property
+    def view(self) -> memoryview:
+        return memoryview(self.payload)
+
+    @property
+    def ccsid(self) -> int:
+        return getattr(self.md, 'CodedCharSetId', 0)
+
+    @property
+    def format(self) -> str:
+        return getattr(self.md, 'Format', b'').decode('ascii', 'replace').strip()
+
+    @property
+    def msg_id(self) -> str:
+        return self.md.MsgId.hex()
+
+    @property
+    def correl_id(self) -> str:
+        return self.md.CorrelId.hex()
+
+    def __len__(self) -> int:
+        return len(self.payload)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, MQMessage):
+            return self.payload == other.payload
+        if isinstance(other, bytes):
+            return self.payload == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.payload)
+
+    def __str__(self) -> str:
+        try:
+            return self.text
+        except UnicodeDecodeError:
+            return repr(self.payload)
+
+    def __repr__(self) -> str:
+        return '<MQMessage %d bytes, msg_id=%s>' % (len(self.payload), self.msg_id)
+
+
+class _QueueHandleCache(object):
+
+    """
+    Bounded LRU cache of open queue handles belonging to one queue manager connection.
+
+    Handles are keyed by (queue name, open options), so a queue opened for output and
+    the same queue opened for input are two separate entries. Evicted handles are closed.
+    """
+
+    def __init__(self, connection: pymqi.QueueManager, max_size: int) -> None:
+        self.connection = connection
+        self.max_size = max(1, int(max_size))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._handles: 'OrderedDict[Tuple[str, int], pymqi.Queue]' = OrderedDict()
+
+    def get(self, queue_name: str, open_options: int) -> pymqi.Queue:
+        key = (queue_name, open_options)
+        queue = self._handles.get(key)
+        if queue is not None:
+            self.hits += 1
+            self._handles.move_to_end(key)
+            return queue
+
+        self.misses += 1
+        queue = pymqi.Queue(self.connection, queue_name, open_options)
+        self._handles[key] = queue
+        while len(self._handles) > self.max_size:
+            _, evicted = self._handles.popitem(last=False)
+            self.evictions += 1
+            self._close(evicted)
+        return queue
+
+    def discard(self, queue: pymqi.Queue) -> None:
+        for key in [key for key, cached in self._handles.items() if cached is queue]:
+            self._close(self._handles.pop(key))
+
+    def discard_queue(self, queue_name: str) -> None:
+        for key in [key for key in self._handles if key[0] == queue_name]:
+            self._close(self._handles.pop(key))
+
+    def close_all(self) -> None:
+        while self._handles:
+            _, queue = self._handles.popitem(last=False)
+            self._close(queue)
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._handles), 'max_size': self.max_size,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    @staticmethod
+    def _close(queue: pymqi.Queue) -> None:
+        try:
+            queue.close()
+        except pymqi.Error:
+            # The handle is unusable anyway, typically because the connection is gone.
+            pass
+
+
+class _ReplyQueuePool(object):
+
+    """
+    Temporary dynamic reply queues of one queue manager connection, reused across requests.
+
+    The queues are created from a model queue on first use and handed out one caller at a
+    time, so replies are only ever matched on a queue nobody else is reading.
+    """
+
+    DYNAMIC_QUEUE_NAME = 'PYMQI.REPLY.*'
+
+    def __init__(self, connection: pymqi.QueueManager) -> None:
+        self.connection = connection
+        self.created = 0
+        self._free: Dict[str, List[Tuple[str, pymqi.Queue]]] = {}
+
+    def acquire(self, model_queue: str) -> Tuple[str, pymqi.Queue]:
+        free = self._free.get(model_queue)
+        if free:
+            return free.pop()
+        od = pymqi.OD(ObjectName=model_queue.encode('utf-8'), DynamicQName=self.DYNAMIC_QUEUE_NAME.encode('utf-8'))
+        queue = pymqi.Queue(self.connection, od, _OPEN_DYNAMIC_REPLY)
+        self.created += 1
+        return od.ObjectName.decode('utf-8').strip(), queue
+
+    def release(self, model_queue: str, queue_name: str, queue: pymqi.Queue) -> None:
+        self._free.setdefault(model_queue, []).append((queue_name, queue))
+
+    def discard(self, queue: pymqi.Queue) -> None:
+        _QueueHandleCache._close(queue)
+
+    def close_all(self) -> None:
+        # Temporary dynamic queues are deleted by the queue manager when closed.
+        for free in self._free.values():
+            for _, queue in free:
+                _QueueHandleCache._close(queue)
+        self._free.clear()
+
+
+class _SubscriptionCache(object):
+
+    """
+    Subscriptions and topic handles of one queue manager connection, kept open across keywords.
+
+    Subscriptions are managed, so the queue manager provides the queue their publications go to,
+    and are keyed by subscription name. A durable subscription that already exists on the queue
+    manager is resumed, so the publications sent while it was closed are still there.
+    """
+
+    def __init__(self, connection: pymqi.QueueManager) -> None:
+        self.connection = connection
+        self.created = 0
+        self.reused = 0
+        self._subscriptions: Dict[str, Tuple[pymqi.Subscription, str, bool]] = {}
+        self._topics: Dict[str, pymqi.Topic] = {}
+
+    def subscribe(self, name: str, topic_string: str, durable: bool) -> pymqi.Subscription:
+        cached = self._subscriptions.get(name)
+        if cached is not None:
+            subscription, cached_topic, cached_durable = cached
+            if (cached_topic, cached_durable) != (topic_string, durable):
+                raise ValueError("Subscription '%s' is already open on topic '%s'." % (name, cached_topic))
+            self.reused += 1
+            return subscription
+
+        options = pymqi.CMQC.MQSO_CREATE | pymqi.CMQC.MQSO_MANAGED | pymqi.CMQC.MQSO_FAIL_IF_QUIESCING
+        if durable:
+            options |= pymqi.CMQC.MQSO_RESUME | pymqi.CMQC.MQSO_DURABLE
+        sub_desc = pymqi.SD(Options=options)
+        sub_desc.set_vs('SubName', name.encode('utf-8'))
+        sub_desc.set_vs('ObjectString', topic_string.encode('utf-8'))
+        subscription = pymqi.Subscription(self.connection)
+        subscription.sub(sub_desc=sub_desc)
+        self._subscriptions[name] = (subscription, topic_string, durable)
+        self.created += 1
+        return subscription
+
+    def get(self, name: str) -> pymqi.Subscription:
+        cached = self._subscriptions.get(name)
+        if cached is None:
+            raise ValueError("Subscription '%s' is not open, use Subscribe first." % name)
+        return cached[0]
+
+    def topic(self, topic_string: str) -> pymqi.Topic:
+        topic = self._topics.get(topic_string)
+        if topic is None:
+            topic = pymqi.Topic(self.connection, topic_string=topic_string.encode('utf-8'))
+            topic.open(open_opts=_OPEN_OUTPUT)
+            self._topics[topic_string] = topic
+        return topic
+
+    def close(self, name: str, remove: bool = False) -> None:
+        cached = self._subscriptions.pop(name, None)
+        if cached is not None:
+            self._close(*cached, remove=remove)
+
+    def close_all(self) -> None:
+        # Durable subscriptions stay on the queue manager and are resumed by the next run.
+        while self._subscriptions:
+            _, cached = self._subscriptions.popitem()
+            try:
+                self._close(*cached)
+            except pymqi.Error:
+                pass
+        while self._topics:
+            _, topic = self._topics.popitem()
+            _QueueHandleCache._close(topic)
+
+    def stats(self) -> Dict[str, int]:
+        return {'subscriptions': len(self._subscriptions), 'topics': len(self._topics),
+                'created': self.created, 'reused': self.reused}
+
+    @staticmethod
+    def _close(subscription: pymqi.Subscription, topic_string: str, durable: bool, remove: bool = False) -> None:
+        options = pymqi.CMQC.MQCO_NONE
+        if durable:
+            options = pymqi.CMQC.MQCO_REMOVE_SUB if remove else pymqi.CMQC.MQCO_KEEP_SUB
+        subscription.close(sub_close_options=options, close_sub_queue=True)
+
+
+class _ReceiveBufferSizer(object):
+
+    """
+    Learns the MQGET buffer size of each queue from the sizes of the messages got from it.
+
+    The buffer covers the given percentile of the recent message sizes, rounded up to a power
+    of two, so most gets need a single call and small messages do not over-allocate. It is
+    shared by the connections of all threads, so updates are locked.
+
+    Besides the window of recent sizes, a histogram counts them by power of two, so the buffer
+    is found by walking a few dozen buckets instead of sorting the window on every get.
+    """
+
+    INITIAL_SIZE = 4096
+    MIN_SIZE = 256
+    WINDOW = 256
+    BUCKETS = 64      # power of two buckets, bucket b holds the sizes up to 2 ** b
+
+    def __init__(self, percentile: float) -> None:
+        self.percentile = float(percentile)
+        self._sizes: Dict[str, 'deque[int]'] = {}
+        self._histograms: Dict[str, List[int]] = {}
+        self._buffers: Dict[str, int] = {}
+        self._truncations: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def buffer_size(self, queue_name: str) -> int:
+        return self._buffers.get(queue_name, self.INITIAL_SIZE)
+
+    def record(self, queue_name: str, size: int) -> None:
+        with self._lock:
+            sizes = self._sizes.get(queue_name)
+            if sizes is None:
+                sizes = self._sizes[queue_name] = deque(maxlen=self.WINDOW)
+                self._histograms[queue_name] = [0] * self.BUCKETS
+            histogram = self._histograms[queue_name]
+            if len(sizes) == self.WINDOW:
+                histogram[max(0, sizes[0] - 1).bit_length()] -= 1
+            sizes.append(size)
+            histogram[max(0, size - 1).bit_length()] += 1
+            # Nearest rank, as in _percentile, counted over the buckets.
+            rank = max(1, math.ceil(self.percentile / 100.0 * len(sizes)))
+            for bucket, count in enumerate(histogram):
+                rank -= count
+                if rank <= 0:
+                    break
+            self._buffers[queue_name] = max(self.MIN_SIZE, 1 << bucket)
+
+    def get(self, queue: pymqi.Queue, queue_name: str, md: pymqi.MD, gmo: Optional[pymqi.GMO],
+            retry_gmo: Optional[pymqi.GMO] = None) -> bytes:
+        """
+        Get a message with the buffer learned for the queue, and record its size.
+
+        A bigger message costs exactly one retry with its real length, which the truncation error
+        reports; _retry_gmo_ replaces _gmo_ for that retry, as a browse has to re-read under the cursor.
+        """
+        try:
+            message = queue.get(self.buffer_size(queue_name), md, gmo)
+        except pymqi.MQMIError as err:
+            if err.reason != pymqi.CMQC.MQRC_TRUNCATED_MSG_FAILED:
+                raise
+            self.record_truncation(queue_name)
+            message = queue.get(getattr(err, 'original_length', None), md, gmo if retry_gmo is None else retry_gmo)
+        self.record(queue_name, len(message))
+        return message
+
+    def record_truncation(self, queue_name: str) -> None:
+        with self._lock:
+            self._truncations[queue_name] = self._truncations.get(queue_name, 0) + 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return self._stats()
+
+    def _stats(self) -> Dict[str, Dict[str, int]]:
+        return {queue_name: {'buffer_size': self._buffers[queue_name],
+                             'samples': len(sizes),
+                             'p50': self._percentile(sizes, 50.0),
+                             'p%g' % self.percentile: self._percentile(sizes, self.percentile),
+                             'max': max(sizes),
+                             'truncations': self._truncations.get(queue_name, 0)}
+                for queue_name, sizes in self._sizes.items()}
+
+    @staticmethod
+    def _percentile(sizes: Iterable[int], percentile: float) -> int:
+        return _percentile(sorted(sizes), percentile)
+
+
+class _LoadWorker(object):
+
+    """
+    One thread of a load run, with its own queue manager connection and its own results.
+    """
+
+    def __init__(self, qmgr: pymqi.QueueManager, index: int, queue_name: str, reply_queue: Optional[str],
+                 round_trip: bool, template: str, count: Optional[int], deadline: Optional[float],
+                 interval: float, reply_timeout: float) -> None:
+        self.qmgr = qmgr
+        self.index = index
+        self.queue_name = queue_name
+        self.reply_queue = reply_queue
+        self.round_trip = round_trip
+        self.template = template
+        self.count = count
+        self.deadline = deadline
+        self.interval = interval
+        self.reply_timeout = reply_timeout
+        self.messages = 0
+        self.bytes = 0
+        self.put_latencies: List[float] = []
+        self.round_trip_latencies: List[float] = []
+        self.error: Optional[str] = None
+
+    def run(self) -> None:
+        queues = []
+        try:
+            output = pymqi.Queue(self.qmgr, self.queue_name, _OPEN_OUTPUT)
+            queues.append(output)
+            if self.round_trip:
+                reply_input = pymqi.Queue(self.qmgr, self.reply_queue or self.queue_name, _OPEN_INPUT)
+                queues.append(reply_input)
+            pmo = pymqi.PMO(Options=pymqi.CMQC.MQPMO_NO_SYNCPOINT | pymqi.CMQC.MQPMO_NEW_MSG_ID | pymqi.CMQC.MQPMO_FAIL_IF_QUIESCING)
+            gmo = pymqi.GMO(Version=pymqi.CMQC.MQGMO_VERSION_2, WaitInterval=int(self.reply_timeout * 1000),
+                            Options=pymqi.CMQC.MQGMO_WAIT | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING,
+                            MatchOptions=pymqi.CMQC.MQMO_MATCH_CORREL_ID if self.reply_queue else pymqi.CMQC.MQMO_MATCH_MSG_ID)
+            started = time.perf_counter()
+            n = 0
+            while self.count is None or n < self.count:
+                if self.deadline is not None and time.monotonic() >= self.deadline:
+                    break
+                if self.interval:
+                    delay = started + n * self.interval - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                payload = self.template.format(n=n, worker=self.index, timestamp=time.time()).encode('utf-8')
+                md = pymqi.MD()
+                if self.reply_queue:
+                    md.MsgType = pymqi.CMQC.MQMT_REQUEST
+                    md.ReplyToQ = self.reply_queue.encode('utf-8')
+                sent = time.perf_counter()
+                output.put(payload, md, pmo)
+                put_done = time.perf_counter()
+                self.put_latencies.append(put_done - sent)
+                if self.round_trip:
+                    reply_md = pymqi.MD(CorrelId=md.MsgId) if self.reply_queue else pymqi.MD(MsgId=md.MsgId)
+                    reply_input.get(None, reply_md, gmo)
+                    self.round_trip_latencies.append(time.perf_counter() - sent)
+                self.messages += 1
+                self.bytes += len(payload)
+                n += 1
+        except Exception as err:
+            # Any failure is reported by the keyword, a worker thread must not end silently.
+            self.error = str(err)
+        finally:
+            for queue in queues:
+                _QueueHandleCache._close(queue)
+            try:
+                self.qmgr.disconnect()
+            except pymqi.Error:
+                pass
+
+
+class _QueueListener(object):
+
+    """
+    Background consumer of one queue, on its own queue manager connection.
+
+    Got messages are kept with their MQMD in a bounded buffer; when it is full, the oldest
+    message is dropped. Waiting for buffered messages needs no MQ call.
+    """
+
+    def __init__(self, qmgr: pymqi.QueueManager, queue_name: str, max_buffered: int, wait_slice: float,
+                 percentile: float, codecs: Dict[str, Callable[[MQMessage, Optional[str]], Any]]) -> None:
+        self.qmgr = qmgr
+        self.queue_name = queue_name
+        self.wait_slice = wait_slice
+        self.codecs = codecs
+        self.buffer: 'deque[MQMessage]' = deque(maxlen=max_buffered)
+        self.received = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.error: Optional[str] = None
+        self._receive_buffers = _ReceiveBufferSizer(percentile)
+        self._changed = Condition()
+        self._stop = Event()
+        self._thread = Thread(target=self.run, name='PyMQI-listener-%s' % queue_name, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def run(self) -> None:
+        queue = None
+        try:
+            queue = pymqi.Queue(self.qmgr, self.queue_name, _OPEN_INPUT)
+            gmo = pymqi.GMO(Options=pymqi.CMQC.MQGMO_WAIT | pymqi.CMQC.MQGMO_NO_SYNCPOINT | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING,
+                            WaitInterval=max(1, int(self.wait_slice * 1000)))
+            while not self._stop.is_set():
+                md = pymqi.MD()
+                try:
+                    message = self._receive_buffers.get(queue, self.queue_name, md, gmo)
+                except pymqi.MQMIError as err:
+                    if err.reason == pymqi.CMQC.MQRC_NO_MSG_AVAILABLE:
+                        continue
+                    raise
+                with self._changed:
+                    if len(self.buffer) == self.buffer.maxlen:
+                        self.dropped += 1
+                    self.buffer.append(MQMessage(message, md, codecs=self.codecs))
+                    self.received += 1
+                    self.bytes += len(message)
+                    self._changed.notify_all()
+        except pymqi.MQMIError as err:
+            self.error = str(err)
+        finally:
+            if queue is not None:
+                _QueueHandleCache._close(queue)
+            try:
+                self.qmgr.disconnect()
+            except pymqi.Error:
+                pass
+            with self._changed:
+                self._changed.notify_all()
+
+    def messages(self, clear: bool = False) -> List[MQMessage]:
+        with self._changed:
+            messages = list(self.buffer)
+            if clear:
+                self.buffer.clear()
+            return messages
+
+    def wait_for(self, matches: Callable[[MQMessage], bool], count: int, deadline: float) -> List[MQMessage]:
+        """
+        Wait until _count_ buffered messages satisfy _matches_ or the deadline passes, return the matching ones.
+        """
+        with self._changed:
+            while True:
+                matching = [message for message in self.buffer if matches(message)]
+                remaining = deadline - time.monotonic()
+                if len(matching) >= count or remaining <= 0 or not self.running:
+                    return matching
+                self._changed.wait(min(remaining, self.wait_slice))
+
+
+class _FanInReceiver(object):
+
+    """
+    Waiting gets on several queues at once, each in its own thread on its own queue manager connection.
+
+    Every worker gets at most one message, under syncpoint, and holds it until `finish` commits
+    or backs out all of them together. A message got after enough have arrived is backed out at
+    once, so it stays on its queue.
+    """
+
+    def __init__(self, connect: Callable[[], pymqi.QueueManager], queue_names: List[Tuple[str, str]], needed: int,
+                 wait_slice: float, percentile: float, codecs: Dict[str, Callable[[MQMessage, Optional[str]], Any]]) -> None:
+        self.connect = connect
+        self.needed = needed
+        self.wait_slice = wait_slice
+        self.codecs = codecs
+        self.results: List[Dict[str, Any]] = []
+        self.errors: Dict[str, str] = {}
+        self._running = len(queue_names)
+        self._commit = False
+        self._started = time.monotonic()
+        self._receive_buffers = _ReceiveBufferSizer(percentile)
+        self._changed = Condition()
+        self._done = Event()
+        self._threads = {queue_name: Thread(target=self.run, args=(queue_name, mq_name), name='PyMQI-fan-in-%s' % queue_name, daemon=True)
+                         for queue_name, mq_name in queue_names}
+
+    def start(self) -> None:
+        for thread in self._threads.values():
+            thread.start()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait until enough messages have arrived, a worker failed or all workers ended; return whether so.
+        """
+        with self._changed:
+            if not self._finished:
+                self._changed.wait(timeout)
+            return self._finished
+
+    @property
+    def _finished(self) -> bool:
+        return len(self.results) >= self.needed or bool(self.errors) or not self._running
+
+    def finish(self, commit: bool) -> None:
+        # Only the workers holding a message are joined; the others end within one wait slice.
+        with self._changed:
+            self._commit = commit
+            holding = [self._threads[result['queue']] for result in self.results]
+        self._done.set()
+        for thread in holding:
+            thread.join()
+
+    def run(self, queue_name: str, mq_name: str) -> None:
+        qmgr = None
+        queue = None
+        try:
+            qmgr = self.connect()
+            queue = pymqi.Queue(qmgr, mq_name, _OPEN_INPUT)
+            gmo = pymqi.GMO(Options=pymqi.CMQC.MQGMO_WAIT | pymqi.CMQC.MQGMO_SYNCPOINT | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING,
+                            WaitInterval=max(1, int(self.wait_slice * 1000)))
+            while not self._done.is_set():
+                md = pymqi.MD()
+                try:
+                    message = self._receive_buffers.get(queue, mq_name, md, gmo)
+                except pymqi.MQMIError as err:
+                    if err.reason == pymqi.CMQC.MQRC_NO_MSG_AVAILABLE:
+                        continue
+                    raise
+                with self._changed:
+                    if self._done.is_set() or len(self.results) >= self.needed:
+                        break
+                    self.results.append({'queue': queue_name, 'message': MQMessage(message, md, codecs=self.codecs), 'msg_id': md.MsgId.hex(),
+                                         'received': time.time(), 'elapsed': time.monotonic() - self._started})
+                    self._changed.notify_all()
+                self._done.wait()
+                if self._commit:
+                    qmgr.commit()
+                break
+        except pymqi.MQMIError as err:
+            with self._changed:
+                self.errors[queue_name] = str(err)
+        finally:
+            if qmgr is not None:
+                try:
+                    qmgr.backout()
+                except pymqi.Error:
+                    pass
+            if queue is not None:
+                _QueueHandleCache._close(queue)
+            if qmgr is not None:
+                try:
+                    qmgr.disconnect()
+                except pymqi.Error:
+                    pass
+            with self._changed:
+                self._running -= 1
+                self._changed.notify_all()
+
+
+class _MQConnection(object):
+
+    """
+    One queue manager connection of the library together with its open queue handles.
+
+    A connection found broken is marked with the time it was noticed, and `reconnect` replaces
+    it by a new one with the same parameters; the handles of the old one are dropped and
+    reopened on first use.
+    """
+
+    def __init__(self, qmgr: pymqi.QueueManager, key: Tuple[str, Optional[str], Optional[str], Optional[str]],
+                 queue_cache_size: int, password: Optional[str] = None, options: int = 0,
+                 ccdt_url: Optional[str] = None) -> None:
+        self.qmgr = qmgr
+        self.key = key
+        self.options = options
+        self.ccdt_url = ccdt_url
+        self._password = password
+        self.queue_cache = _QueueHandleCache(qmgr, queue_cache_size)
+        self.reply_queues = _ReplyQueuePool(qmgr)
+        self.subscriptions = _SubscriptionCache(qmgr)
+        self.pcf_clear_allowed = True
+        self.pcf_inquire_allowed = True
+        self.closed = False
+        self.broken_since: Optional[float] = None
+        self.aliases: Set[str] = set()  # Aliases given when the connection was reused, ConnectionCache knows only the first
+        self._pcf: Optional[pymqi.PCFExecute] = None
+
+    @property
+    def pcf(self) -> pymqi.PCFExecute:
+        if self._pcf is None:
+            self._pcf = pymqi.PCFExecute(self.qmgr)
+        return self._pcf
+
+    def connect_again(self) -> pymqi.QueueManager:
+        """
+        Open another, independent connection with the same parameters, e.g. for a worker thread.
+        """
+        return _connect(self.key, self._password, self.options, self.ccdt_url)
+
+    def reconnect(self) -> None:
+        qmgr = self.connect_again()
+        # Closing on the broken connection fails quietly; the emptied caches refill on the new one.
+        self.queue_cache.close_all()
+        self.reply_queues.close_all()
+        self.subscriptions.close_all()
+        try:
+            self.qmgr.disconnect()
+        except pymqi.Error:
+            pass
+        self.qmgr = qmgr
+        for resources in (self.queue_cache, self.reply_queues, self.subscriptions):
+            resources.connection = qmgr
+        self._pcf = None
+        self.broken_since = None
+
+    @property
+    def is_alive(self) -> bool:
+        if self.closed:
+            return False
+        try:
+            return bool(self.qmgr.is_connected)
+        except pymqi.Error:
+            return False
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.queue_cache.close_all()
+        self.reply_queues.close_all()
+        self.subscriptions.close_all()
+        if self._pcf is not None:
+            try:
+                self._pcf.disconnect()
+            except pymqi.Error:
+                pass
+            self._pcf = None
+        self.qmgr.disconnect()
+
+
+class _CallRecord(object):
+
+    """
+    What one instrumented keyword call moved; filled in by the keyword while it runs.
+    """
+
+    __slots__ = ('messages', 'bytes', 'reason')
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self.bytes = 0
+        self.reason: Optional[int] = None
+
+    def add(self, size: int, messages: int = 1) -> None:
+        self.messages += messages
+        self.bytes += size
+
+
+class _Instrumentation(object):
+
+    """
+    Leveled logging and metrics of the keyword calls, written through robot.api.logger.
+
+    Every call is counted per keyword and per queue with its duration, messages, bytes and the
+    MQ reason code of a failure. Log messages are only built when the level asks for them, and
+    payloads are only logged, truncated, when payload logging is switched on.
+    """
+
+    LEVELS = {'NONE': 0, 'INFO': 1, 'DEBUG': 2}
+    COUNTERS = ('calls', 'errors', 'messages', 'bytes', 'seconds')
+
+    def __init__(self, level: str = 'INFO', log_payloads: bool = False, payload_limit: int = 256) -> None:
+        self.level = self.LEVELS[str(level).upper()]
+        self.log_payloads = log_payloads
+        self.payload_limit = int(payload_limit)
+        self._lock = Lock()
+        self._keywords: Dict[str, Dict[str, Union[int, float]]] = {}
+        self._queues: Dict[str, Dict[str, Union[int, float]]] = {}
+        self._connections: Dict[str, Union[int, float]] = {'reconnects': 0, 'failed_reconnects': 0,
+                                                           'outage_seconds': 0.0, 'max_outage_seconds': 0.0}
+        self.on_error: Optional[Callable[[Exception], None]] = None
+
+    @contextmanager
+    def call(self, keyword: str, queue_name: Optional[str] = None, ok_reasons: Iterable[int] = ()) -> Iterator[_CallRecord]:
+        # Errors with a reason in ok_reasons, e.g. an empty queue, are outcomes the keyword turns into a result.
+        record = _CallRecord()
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield record
+        except Exception as err:
+            reason = getattr(err, 'reason', None)
+            if reason is None or reason not in ok_reasons:
+                failed = True
+                record.reason = reason
+                if self.on_error is not None:
+                    self.on_error(err)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._count(self._keywords, keyword, record, elapsed, failed)
+                if queue_name is not None:
+                    self._count(self._queues, queue_name, record, elapsed, failed)
+            if self.level >= self.LEVELS['DEBUG']:
+                logger.debug('[PyMQI::%s] queue=%s messages=%d bytes=%d time=%.3fms%s'
+                             % (keyword, queue_name, record.messages, record.bytes, elapsed * 1000.0,
+                                ' reason=%s' % record.reason if failed else ''))
+
+    def info(self, message: str) -> None:
+        if self.level >= self.LEVELS['INFO']:
+            logger.info(message)
+
+    def debug(self, message: str) -> None:
+        if self.level >= self.LEVELS['DEBUG']:
+            logger.debug(message)
+
+    def payload(self, keyword: str, payload: Union[str, bytes]) -> None:
+        if self.log_payloads:
+            shown = payload[:self.payload_limit]
+            more = len(payload) - len(shown)
+            logger.info('[PyMQI::%s] payload=%r%s' % (keyword, shown, ' (%d more bytes)' % more if more else ''))
+
+    def reconnected(self, outage: Optional[float]) -> None:
+        """
+        Count a reconnect after an outage of the given seconds, or a failed one if None.
+        """
+        with self._lock:
+            if outage is None:
+                self._connections['failed_reconnects'] += 1
+                return
+            self._connections['reconnects'] += 1
+            self._connections['outage_seconds'] += outage
+            self._connections['max_outage_seconds'] = max(self._connections['max_outage_seconds'], outage)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {'keywords': {name: dict(counters) for name, counters in self._keywords.items()},
+                    'queues': {name: dict(counters) for name, counters in self._queues.items()},
+                    'connections': dict(self._connections)}
+
+    def log_summary(self, metrics_file: Optional[str] = None) -> None:
+        metrics = self.metrics()
+        if metrics_file:
+            with open(metrics_file, 'w') as metricsfile:
+                json.dump(metrics, metricsfile, indent=2, sort_keys=True)
+        if self.level < self.LEVELS['INFO'] or not metrics['keywords']:
+            return
+        rows = []
+        for section, title in (('keywords', 'Keyword'), ('queues', 'Queue')):
+            rows.append('<tr><th>%s</th>%s</tr>' % (title, ''.join('<th>%s</th>' % name for name in self.COUNTERS)))
+            for name, counters in sorted(metrics[section].items()):
+                rows.append('<tr><td>%s</td>%s</tr>' % (escape(name), ''.join(
+                    '<td>%s</td>' % ('%.3f' % counters[counter] if counter == 'seconds' else counters[counter])
+                    for counter in self.COUNTERS)))
+        logger.info('<table border="1">%s</table>' % ''.join(rows), html=True)
+        if metrics['connections']['reconnects'] or metrics['connections']['failed_reconnects']:
+            logger.info('[PyMQI]:: Reconnects: [%(reconnects)d], failed: [%(failed_reconnects)d], outage: [%(outage_seconds).3f] s, '
+                        'longest: [%(max_outage_seconds).3f] s.' % metrics['connections'])
+        logger.debug(json.dumps(metrics, sort_keys=True))
+
+    def _count(self, table: Dict[str, Dict[str, Union[int, float]]], name: str, record: _CallRecord,
+               elapsed: float, failed: bool) -> None:
+        counters = table.get(name)
+        if counters is None:
+            counters = table[name] = dict.fromkeys(self.COUNTERS, 0)
+        counters['calls'] += 1
+        counters['errors'] += 1 if failed else 0
+        counters['messages'] += record.messages
+        counters['bytes'] += record.bytes
+        counters['seconds'] += elapsed
+        if failed and record.reason is not None:
+            counters['last_reason'] = record.reason
+
+
+class _LibraryListener(object):
+
+    """
+    Library listener emitting the metrics summary when the library goes out of scope.
+    """
+
+    ROBOT_LISTENER_API_VERSION = 3
+
+    def __init__(self, library: 'PyMQI') -> None:
+        self.library = library
+
+    def close(self) -> None:
+        self.library._stop_listeners()
+        self.library._instrumentation.log_summary(self.library.metrics_file)
+
 
 class PyMQI(object):
 
@@ -26,54 +1076,179 @@ class PyMQI(object):
     """
 
     DEFAULT_TIMEOUT = 900.0  # The default timeout for connecting
+    DEFAULT_QUEUE_CACHE_SIZE = 16  # The default number of open queue handles kept per connection
+    DEFAULT_BATCH_SIZE = 500  # The default number of messages put under one syncpoint
+    DEFAULT_WAIT_TIMEOUT = '30s'  # The default time to wait for messages to arrive
+    DEFAULT_PUBLICATION_WAIT = '1s'  # The default time Get Publications waits for the next publication
+    DEFAULT_MODEL_QUEUE = 'SYSTEM.DEFAULT.MODEL.QUEUE'  # The model queue of the temporary reply queues
+    DEFAULT_LOAD_TEMPLATE = 'PyMQI load message {worker}-{n}'  # The default payload template of the load keywords
+    RECEIVE_BUFFER_PERCENTILE = 95.0  # The share of recent messages that fit into the learned receive buffer
+    WAIT_SLICE = 1.0  # The longest single MQGET wait in seconds, cancellation is checked in between
+    DEFAULT_LISTENER_BUFFER = 10000  # The default number of messages a queue listener keeps
+    DEFAULT_PAYLOAD_LOG_LIMIT = 256  # The default number of payload bytes logged when payload logging is on
+    DEFAULT_QUEUE_ATTRIBUTES = ('CURRENT_Q_DEPTH', 'MAX_Q_DEPTH', 'OPEN_INPUT_COUNT', 'OPEN_OUTPUT_COUNT',
+                                'INHIBIT_GET', 'INHIBIT_PUT')  # The attributes of Get Queue Attributes without selectors
+    DEPTH_POLL_INTERVAL = 0.05  # The first depth poll interval in seconds, doubled up to WAIT_SLICE
+    DEPTH_COMPARISONS = {'==': operator.eq, '!=': operator.ne, '>=': operator.ge, '<=': operator.le,
+                         '>': operator.gt, '<': operator.lt}  # The comparisons of Wait Until Queue Depth Is
+    EXECUTION_MODES = ('shared', 'thread')  # One connection cache for all threads, or one per thread
+    RECONNECT_MODES = {'none': None, 'library': 0, 'qmgr': 67108864,
+                       'any': 16777216}  # MQCNO options of the reconnect modes: MQCNO_RECONNECT_Q_MGR, MQCNO_RECONNECT
+    DEFAULT_RECONNECT_TIMEOUT = '60s'  # The default time a lost connection is tried to be made again
+    DEFAULT_RECONNECT_BACKOFF = '0.5s'  # The default first delay between reconnect attempts, doubled up to RECONNECT_BACKOFF_MAX
+    RECONNECT_BACKOFF_MAX = 8.0  # The longest delay between reconnect attempts in seconds
     ROBOT_LIBRARY_SCOPE = 'GLOBAL'
     qmgr:          Optional[str] = None
     channel:       Optional[str] = None
     host:          Optional[str] = None
     port:          Optional[int] = None
     conn_info:     Optional[str] = None
-    connection:    pymqi.QueueManager
 
 
-    def __init__(self) -> None:
+    def __init__(self, queue_cache_size: int = DEFAULT_QUEUE_CACHE_SIZE, instrumentation_level: str = 'INFO',
+                 log_payloads: bool = False, payload_log_limit: int = DEFAULT_PAYLOAD_LOG_LIMIT,
+                 metrics_file: Optional[str] = None, execution_mode: str = 'shared',
+                 queue_partition: Optional[str] = None, config_file: Optional[str] = None, qmgr: Optional[str] = None,
+                 channel: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None,
+                 lazy_connect: bool = True, ccdt: Optional[str] = None, reconnect: Optional[str] = None,
+                 reconnect_timeout: Union[str, float] = DEFAULT_RECONNECT_TIMEOUT,
+                 reconnect_backoff: Union[str, float] = DEFAULT_RECONNECT_BACKOFF) -> None:
         """
         Check config.
-        """
-        try:
-            config = configparser.ConfigParser()
-            config.read('PyMQI.cfg')
 
-            self.qmgr = config.get('IBM.MQ', 'mq_qmgr')
-            self.channel       = config.get('IBM.MQ', 'mq_channel')
-            self.host          = config.get('IBM.MQ', 'mq_host')
-            self.port          = config.getint('IBM.MQ', 'mq_port')
-            self.conn_info     = '%s(%s)' % (self.host, self.port)
+        The default connection parameters are taken, in this order of precedence, from the
+        library arguments, the environment variables PYMQI_QMGR, PYMQI_CHANNEL, PYMQI_HOST,
+        PYMQI_PORT, PYMQI_CCDT and PYMQI_RECONNECT, and the [IBM.MQ] section of the config file
+        (mq_qmgr, mq_channel, mq_host, mq_port, mq_ccdt, mq_reconnect): _config_file_, the file
+        named by PYMQI_CONFIG, or PyMQI.cfg in the current directory. Each file is parsed once per
+        process.
+
+        The host may be a connection name list, e.g. _mq1(1414),mq2(1414)_, for the instances of a
+        multi-instance queue manager. Without a host, connections take their channel definition
+        from _ccdt_, a client channel definition table file or URL, passed to the MQ client as
+        MQCCDTURL only while the library connects.
+
+        With _reconnect_ _qmgr_ (to the same queue manager only, e.g. another instance of it) or
+        _any_ (to any queue manager of the list or CCDT), the MQ client reconnects by itself
+        (MQCNO_RECONNECT), keeping the open handles; its reconnect timeout is MQReconnectTimeout in
+        mqclient.ini. If the client cannot reconnect, or with _reconnect_ _library_, the keyword
+        that finds the connection lost fails, and the next keyword connects again, retrying with
+        a delay starting at _reconnect_backoff_ and doubling up to `RECONNECT_BACKOFF_MAX` seconds
+        for up to _reconnect_timeout_. The queue handles of the lost connection are reopened on first
+        use, non-durable subscriptions are lost. Reconnects and outages are counted in the metrics.
+
+        Neither pymqi nor the MQ client libraries are loaded until a keyword needs them. With
+        _lazy_connect_, a keyword needing a connection when none is open connects with the
+        default parameters, as `Connect In Client Mode` without arguments would, unless the
+        connections were closed with `Disconnect` or `Disconnect All` and none was opened since.
+
+        Every keyword call is measured (duration, messages, bytes, MQ reason code of a failure)
+        and summed per keyword and per queue; the summary is logged when the library goes out of
+        scope, see `Log Metrics Summary`.
+
+        A queue manager connection must not be used by several threads at once. With
+        _execution_mode_ _thread_, every thread calling the keywords has its own connections and
+        queue handles; a thread without a connection of its own gets one opened with the
+        parameters of the last connection made by any thread, on its first MQ call. The
+        connections of threads that have ended are closed when the next new thread comes. Under pabot every process has its
+        own library instance and connections anyway; _queue_partition_ additionally gives every
+        pabot process its own queues, e.g. _{queue}.{worker}_ turns _APP.REQUEST_ into
+        _APP.REQUEST.3_ in pabot process 3 (${PABOTQUEUEINDEX}), and leaves names unchanged
+        outside pabot.
 
-            print('[PyMQI::PyMQI got default config:')
-            print('qmgr = ',self.qmgr)
-            print('channel       = ',self.channel)
-            print('conn_info     = ',self.conn_info)
-            print('')
-            
+        *Args:*\n
+            _queue_cache_size_      - maximum number of open queue handles kept per connection;\n
+            _instrumentation_level_ - NONE, INFO or DEBUG (adds one line per keyword call);\n
+            _log_payloads_          - log the put and got message contents, truncated;\n
+            _payload_log_limit_     - number of bytes or characters of a payload that are logged;\n
+            _metrics_file_          - path of a JSON file the metrics summary is written to;\n
+            _execution_mode_        - _shared_ or _thread_, see above;\n
+            _queue_partition_       - template of the queue names per pabot process with _{queue}_ and _{worker}_;\n
+            _config_file_           - path of the config file;\n
+            _qmgr_                  - default queue manager name;\n
+            _channel_               - default channel;\n
+            _host_                  - default host name;\n
+            _port_                  - default port;\n
+            _lazy_connect_          - connect with the default parameters when a keyword needs a connection;\n
+            _ccdt_                  - path or URL of the client channel definition table, used when no host is given;\n
+            _reconnect_             - _none_, _library_, _qmgr_ or _any_, see above;\n
+            _reconnect_timeout_     - how long a lost connection is tried to be made again, in Robot time format;\n
+            _reconnect_backoff_     - first delay between reconnect attempts, in Robot time format;\n
+        """
+        if execution_mode not in self.EXECUTION_MODES:
+            raise Exception("[PyMQI::PyMQI] Error:", "Unknown execution mode '%s', expected one of %s."
+                            % (execution_mode, ', '.join(self.EXECUTION_MODES)))
+        self._instrumentation = _Instrumentation(instrumentation_level, log_payloads, payload_log_limit)
+        self.metrics_file = metrics_file
+        self.ROBOT_LIBRARY_LISTENER = _LibraryListener(self)
+        self.queue_cache_size = int(queue_cache_size)
+        self.execution_mode = execution_mode
+        self.queue_partition = queue_partition
+        self._lock = Lock()
+        self._shared_connections = ConnectionCache('No open IBM MQ connection.')
+        self._thread_connections = local()
+        self._connection_caches: List[Tuple[Optional[Thread], ConnectionCache]] = [(None, self._shared_connections)]
+        self._last_connection: Optional[_MQConnection] = None
+        self._partitioned_queues: Dict[str, str] = {}
+        self._pabot_worker: Optional[str] = None  # None until looked up, empty when not run by pabot
+        self._cancel_waits = Event()
+        self._receive_buffers = _ReceiveBufferSizer(self.RECEIVE_BUFFER_PERCENTILE)
+        self._listeners: Dict[str, _QueueListener] = {}
+        self._codecs = dict(_CODECS)
+        self.lazy_connect = lazy_connect
+        self._disconnected = False
+        config_file = config_file or os.environ.get('PYMQI_CONFIG') or _CONFIG_FILE
+        try:
+            config = _read_config(config_file)
         except configparser.Error as err:
-            print('[PyMQI::PyMQI could not get the default config from PyMQI.cfg')
-        
-
-    def connect_in_client_mode(self, qmgr: str = None, channel: str = None, host:str = None, port: int = None) -> int:
+            self._instrumentation.debug('[PyMQI::PyMQI]:: Could not read the config file [%s]: [%s].' % (config_file, err))
+            config = {}
+
+        self.qmgr          = qmgr or os.environ.get('PYMQI_QMGR') or config.get('mq_qmgr')
+        self.channel       = channel or os.environ.get('PYMQI_CHANNEL') or config.get('mq_channel')
+        self.host          = host or os.environ.get('PYMQI_HOST') or config.get('mq_host')
+        port               = port or os.environ.get('PYMQI_PORT') or config.get('mq_port')
+        self.port          = None if port is None else int(port)
+        self.ccdt          = ccdt or os.environ.get('PYMQI_CCDT') or config.get('mq_ccdt')
+        self.reconnect     = reconnect or os.environ.get('PYMQI_RECONNECT') or config.get('mq_reconnect') or 'none'
+        if self.reconnect not in self.RECONNECT_MODES:
+            raise Exception("[PyMQI::PyMQI] Error:", "Unknown reconnect mode '%s', expected one of %s."
+                            % (self.reconnect, ', '.join(self.RECONNECT_MODES)))
+        self.reconnect_timeout = timestr_to_secs(reconnect_timeout)
+        self.reconnect_backoff = timestr_to_secs(reconnect_backoff)
+        self._instrumentation.on_error = self._connection_lost
+        self._ccdt_url = None
+        if self.ccdt is not None:
+            self._ccdt_url = self.ccdt if '://' in self.ccdt else 'file://' + os.path.abspath(self.ccdt)
+        if self.host is not None:
+            self.conn_info = _conn_info(self.host, self.port)
+        self._instrumentation.debug('[PyMQI::PyMQI]:: Default config: qmgr=[%s], channel=[%s], conn_info=[%s], library imported in [%.1f] ms.'
+                                    % (self.qmgr, self.channel, self.conn_info, _IMPORT_TIMES['PyMQI'] * 1000.0))
+
+
+    def connect_in_client_mode(self, qmgr: str = None, channel: str = None, host:str = None, port: int = None, alias: str = None) -> int:
         """
         Connection to IBM MQ, using client mode.
 
+        If a live connection with the same queue manager, channel and connection info already
+        exists, it is reused and set as active instead of connecting again, and the alias is added
+        to it. The host may be a connection name list; without host and port the channel is taken
+        from the CCDT.
+
         *Args:*\n
             _qmgr       - queue manager name;\n
             _channel    - channel for connection;\n
-            _host       - host name for connection;\n
+            _host       - host name for connection, or a connection name list;\n
             _port       - port used for connection;\n
+            _alias      - optional alias of the connection, usable with `Switch Connection`;\n
 
         *Returns:*\n
             Returns ID of the new connection. The connection is set as active.
 
         *Example:*\n
             | Connect In Client Mode  |  'QM1'  | 'DEV.APP.SVRCONN' |  '127.0.0.1' | '1414'
+            | ${id} = | Connect In Client Mode  |  'QM2'  | 'DEV.APP.SVRCONN' |  '127.0.0.1' | '1415' | alias=qm2
+            | Connect In Client Mode  |  'QM1'  | 'DEV.APP.SVRCONN' |  'mq1(1414),mq2(1414)'
         """
 
         try:
@@ -86,20 +1261,27 @@ class PyMQI(object):
             if port is None:
                 port = self.port
                 
-            print('[PyMQI::connect_in_client_mode]:: Connecting using : qmgr=[',qmgr,'], channel=[',channel,'], host=[',host,'], port=[',port,']...')
-            self.conn_info = '%s(%s)' % (host, port)
-            self.connection = pymqi.connect(qmgr, channel, self.conn_info)
-            print('[PyMQI::connect_in_client_mode]:: Connecting established successfully.')
-            print('')
-            return 0
+            self._instrumentation.info('[PyMQI::connect_in_client_mode]:: Connecting using : qmgr=[%s], channel=[%s], host=[%s], port=[%s]...'
+                                       % (qmgr, channel, host, port))
+            key = self._connection_key(qmgr, channel, host, port, None)
+            index = self._reuse_connection(key, alias)
+            if index is None:
+                connection = _connect(key, None, self.RECONNECT_MODES[self.reconnect] or 0, self._ccdt_url)
+                index = self._register_connection(connection, key, alias)
+                self._instrumentation.debug('[PyMQI::connect_in_client_mode]:: Connecting established successfully.')
+            self.conn_info = key[2]
+            return index
         except pymqi.MQMIError as err:
             raise Exception("[PyMQI::connect_in_client_mode] Error:", str(err))
 
 
-    def connect_with_credencials(self, user: str, pwd: str, qmgr: str = None, channel: str = None, host:str = None, port: int = None) -> int:
+    def connect_with_credencials(self, user: str, pwd: str, qmgr: str = None, channel: str = None, host:str = None, port: int = None, alias: str = None) -> int:
         """
         Connection to IBM MQ, using credentials.
 
+        If a live connection with the same queue manager, channel, connection info and user
+        already exists, it is reused and set as active instead of connecting again.
+
         *Args:*\n
             _qmgr       - queue manager name;\n
             _channel    - channel for connection;\n
@@ -107,6 +1289,7 @@ class PyMQI(object):
             _port       - port used for connection;\n
             _user       - user name for connection;\n
             _pwd        - user password for connection;\n
+            _alias      - optional alias of the connection, usable with `Switch Connection`;\n
 
         *Returns:*\n
             Returns ID of the new connection. The connection is set as active.
@@ -125,17 +1308,46 @@ class PyMQI(object):
             if port is None:
                 port = self.port
                 
-            print('[PyMQI::connect_with_credencials]:: Connecting using : user=[',user,'], pwd=[',pwd,'], qmgr=[',qmgr,'], channel=[',channel, '], host=[',host,'], port=[',port,']...')
-            self.conn_info = '%s(%s)' % (host, port)
-            self.connection = pymqi.connect(qmgr, channel, self.conn_info, user, pwd)
-            print('[PyMQI::connect_with_credencials]:: Connecting established successfully.')
-            print('')
-            return 0
+            self._instrumentation.info('[PyMQI::connect_with_credencials]:: Connecting using : user=[%s], qmgr=[%s], channel=[%s], host=[%s], port=[%s]...'
+                                       % (user, qmgr, channel, host, port))
+            key = self._connection_key(qmgr, channel, host, port, user)
+            index = self._reuse_connection(key, alias)
+            if index is None:
+                connection = _connect(key, pwd, self.RECONNECT_MODES[self.reconnect] or 0, self._ccdt_url)
+                index = self._register_connection(connection, key, alias, pwd)
+                self._instrumentation.debug('[PyMQI::connect_with_credencials]:: Connecting established successfully.')
+            self.conn_info = key[2]
+            return index
 
         except pymqi.MQMIError as err:
             raise Exception("[PyMQI::connect_with_credencials] Error:", str(err))
 
 
+    def switch_connection(self, alias_or_index: Union[str, int]) -> Optional[int]:
+        """
+        Switch the active IBM MQ connection.
+
+        *Args:*\n
+            _alias_or_index_ - alias or ID of the connection, as returned by the connect keywords;\n
+
+        *Returns:*\n
+            Returns ID of the previously active connection, or None if there was none.
+
+        *Example:*\n
+            | ${previous} = | Switch Connection | qm2 |
+            | Switch Connection | ${previous} |
+        """
+
+        self._instrumentation.info('[PyMQI::switch_connection]:: Switching to [%s]...' % alias_or_index)
+        previous = self._connections.current_index
+        index = self._reused_alias_index(alias_or_index) or alias_or_index
+        connection = self._connections.get_connection(index)
+        if connection.closed:
+            raise Exception("[PyMQI::switch_connection] Error:", "Connection '%s' is already disconnected." % alias_or_index)
+        self._connections.switch(index)
+        return previous
+
+
     def disconnect(self) -> None:
         """
         Close active IBM MQ connection.
@@ -145,48 +1357,82 @@ class PyMQI(object):
         """
 
         try:
-            print('[PyMQI::disconnect]:: Start...')
-            self.connection.disconnect()
-            print('[PyMQI::disconnect]:: Ended successfully.')
-            print('')
+            self._instrumentation.info('[PyMQI::disconnect]:: Start...')
+            connection = self._connections.current
+            self._disconnected = True
+            if connection:
+                self._connections.current_index = None
+                connection.close()
+            self._instrumentation.debug('[PyMQI::disconnect]:: Ended successfully.')
 
         except pymqi.MQMIError as err:
             raise Exception("[PyMQI::Disconnect] Error:", str(err))
 
 
-    def purge_queue(self, queue_name: str) -> None:
+    def disconnect_all(self) -> None:
+        """
+        Close all IBM MQ connections opened by the library.
+
+        *Example:*\n
+            | Disconnect All |
+        """
+
+        self._instrumentation.info('[PyMQI::disconnect_all]:: Start...')
+        self._stop_listeners()
+        errors = []
+        with self._lock:
+            caches = [connections for _, connections in self._connection_caches]
+            self._last_connection = None
+            self._disconnected = True
+        for connections in caches:
+            for connection in connections:
+                try:
+                    connection.close()
+                except pymqi.MQMIError as err:
+                    # A connection that is already gone needs no closing.
+                    if err.reason not in _CONNECTION_LOST_REASONS:
+                        errors.append(str(err))
+            connections.empty_cache()
+        if errors:
+            raise Exception("[PyMQI::disconnect_all] Error:", '; '.join(errors))
+        self._instrumentation.debug('[PyMQI::disconnect_all]:: Ended successfully.')
+
+
+    def purge_queue(self, queue_name: str, use_pcf: bool = True, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
         """
          Purge all message from a queue.
 
+        First a PCF CLEAR QLOCAL command is tried, which removes all messages on the queue manager
+        side. If that is not possible (missing authority, not a local queue, queue in use), the
+        messages are removed by destructive gets that accept truncation into a tiny buffer, so
+        message bodies are not transferred, committing once per batch.
+
         *Args:*\n
             _queue_name_ - Name of the queue to purge;\n
+            _use_pcf_    - Try the PCF CLEAR QLOCAL command first;\n
+            _batch_size_ - Number of messages removed under one syncpoint before committing;\n
+
+        *Returns:*\n
+            Number of purged messages.
 
         *Raises:*\n
             MQ Error: Error message according PyMQI.
 
         *Example:*\n
             Purge Queue | 'TEST.SERVICENAME.REPLY'
+            ${count} = | Purge Queue | 'TEST.SERVICENAME.REPLY' | use_pcf=False
         """
 
-        msg_cnt = 0
         try:
-            print('[PyMQI::purge_queue]:: Start with queue_name=[',queue_name,']...')
-            queue = pymqi.Queue(self.connection, queue_name)
-            message = queue.get()
-            while message is not None:
-                msg_cnt += 1
-                #print('[PyMQI::purge_queue]:: Purged message [', msg_cnt, ']: [', message.decode("utf-8"),']')
-                message = queue.get()
-            print('[PyMQI::purge_queue]:: Ended successfully with [',msg_cnt,'] messages.')
-            print('')
+            with self._instrumentation.call('purge_queue', queue_name) as call:
+                msg_cnt = self._clear_queue(queue_name) if use_pcf else None
+                if msg_cnt is None:
+                    msg_cnt = self._purge_queue_by_get(queue_name, max(1, int(batch_size)))
+                call.add(0, msg_cnt)
+                return msg_cnt
 
         except pymqi.MQMIError as err:
-            str_err = str(err)
-            if (str_err.find('MQRC_NO_MSG_AVAILABLE') >= 0):
-                print('[PyMQI::purge_queue]:: Ended with [',msg_cnt,'] messages.')
-                print('')
-            else:
-                raise Exception("[PyMQI::purge_queue] Error:", str(err))
+            raise Exception("[PyMQI::purge_queue] Error:", str(err))
 
 
     def put_message(self, message: str, queue_name: str) -> None:
@@ -205,42 +1451,105 @@ class PyMQI(object):
         """
 
         try:
-            print('[PyMQI::put_message]:: Start with message=[', message, '], queue_name=[', queue_name,']...')
-            queue = pymqi.Queue(self.connection, queue_name)
-            queue.put(message.encode("utf-8"))
-            print('[PyMQI::put_message]:: Ended successfully.')
+            with self._instrumentation.call('put_message', queue_name) as call:
+                queue = self._open_queue(queue_name, _OPEN_OUTPUT)
+                payload = message.encode("utf-8")
+                self._put(queue, payload)
+                call.add(len(payload))
+                self._instrumentation.payload('put_message', payload)
 
         except pymqi.MQMIError as err:
             raise Exception("[PyMQI::Put Message] Error:", str(err))
 
 
-    def put_message_from_file(self, file_path: str, queue_name: str) -> None:
+    def put_message_from_file(self, file_path: str, queue_name: str, segment_size: Optional[int] = None) -> None:
         """
          Put a message from file into a queue.
 
+        The file is put as it is, so binary content is preserved. Without _segment_size_ the whole
+        file is read into memory for the single put. If _segment_size_ is given and the file is
+        larger, the message is put as a segmented message (MQMF_SEGMENT) in logical order, one
+        segment of the file in memory at a time, committed when the last segment has been put;
+        only this bounds the memory used for large files.
+
         *Args:*\n
-            _file_path_  - Path to a message file;\n
-            _queue_name_ - Name of the target queue;\n
+            _file_path_    - Path to a message file;\n
+            _queue_name_   - Name of the target queue;\n
+            _segment_size_ - Size of the segments in bytes for files larger than this;\n
 
         *Raises:*\n
             MQ Error: Error message according PyMQI.
 
         *Example:*\n
             |  Put Messgae From File |  ${CURDIR}${/}message.dat | 'TEST.SERVICENAME.REQUEST'
+            |  Put Messgae From File |  ${CURDIR}${/}image.bin | 'TEST.SERVICENAME.REQUEST' | segment_size=4194304
         """
 
+        segmented = False
         try:
-            print('[PyMQI::put_message_from_file]:: Start with file_path=[', file_path, '], queue_name=[', queue_name,']...')
-            with open(file_path, "r") as messagefile:
-                message = messagefile.read()
-                queue = pymqi.Queue(self.connection, queue_name)
-                queue.put(message.encode("utf-8"))
-            print('[PyMQI::put_message_from_file]:: Ended successfully.')
+            with self._instrumentation.call('put_message_from_file', queue_name) as call:
+                queue = self._open_queue(queue_name, _OPEN_OUTPUT)
+                with open(file_path, "rb") as messagefile:
+                    size = os.fstat(messagefile.fileno()).st_size
+                    call.add(size)
+                    if segment_size is None or size <= int(segment_size):
+                        self._put(queue, messagefile.read())
+                    else:
+                        segmented = True
+                        self._put_segments(queue, messagefile, size, int(segment_size))
 
         except pymqi.MQMIError as err:
+            if segmented:
+                self._backout()
             raise Exception("[PyMQI::Put Message From File] Error:", str(err))
 
 
+    def put_messages(self, messages: Union[List[str], str], queue_name: str, batch_size: int = DEFAULT_BATCH_SIZE) -> List[str]:
+        """
+         Put several messages into a queue under syncpoint, committing once per batch.
+
+        *Args:*\n
+            _messages_   - List of messages, path of a file with one message per line, or path of a directory with one message per file;\n
+            _queue_name_ - Name of the target queue;\n
+            _batch_size_ - Number of messages put under one syncpoint before committing;\n
+
+        *Returns:*\n
+            List of the message IDs of the put messages, as hex strings.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI. The uncommitted batch is backed out.
+
+        *Example:*\n
+            | ${ids} = |  Put Messages |  ${messages} | 'TEST.SERVICENAME.REQUEST'
+            | ${ids} = |  Put Messages |  ${CURDIR}${/}messages | 'TEST.SERVICENAME.REQUEST' | batch_size=1000
+        """
+
+        batch_size = max(1, int(batch_size))
+        msg_ids = []
+        in_batch = 0
+        try:
+            with self._instrumentation.call('put_messages', queue_name) as call:
+                queue = self._open_queue(queue_name, _OPEN_OUTPUT)
+                pmo = pymqi.PMO(Options=pymqi.CMQC.MQPMO_SYNCPOINT | pymqi.CMQC.MQPMO_NEW_MSG_ID | pymqi.CMQC.MQPMO_FAIL_IF_QUIESCING)
+                for message in self._iter_messages(messages):
+                    md = pymqi.MD()
+                    self._put(queue, message, md, pmo)
+                    call.add(len(message))
+                    msg_ids.append(md.MsgId.hex())
+                    in_batch += 1
+                    if in_batch >= batch_size:
+                        self.connection.commit()
+                        in_batch = 0
+                if in_batch:
+                    self.connection.commit()
+                return msg_ids
+
+        except pymqi.MQMIError as err:
+            if in_batch:
+                self._backout()
+            raise Exception("[PyMQI::put_messages] Error:", str(err))
+
+
     def get_message(self, queue_name: str) -> str:
         """
          Get a message from a queue.
@@ -256,133 +1565,2093 @@ class PyMQI(object):
         """
 
         try:
-            print('[PyMQI::get_message]:: Start with queue_name=[', queue_name,']...')
-            queue = pymqi.Queue(self.connection, queue_name)
-            message = queue.get()
-            print('[PyMQI::get_message]:: Ended successfully, returing with message=[', message.decode("utf-8"),'].')
-            return message.decode("utf-8")
+            with self._instrumentation.call('get_message', queue_name, _EMPTY_QUEUE_REASONS) as call:
+                queue = self._open_queue(queue_name, _OPEN_INPUT)
+                md = pymqi.MD()
+                message = self._get(queue, queue_name, md)
+                call.add(len(message))
+                self._instrumentation.payload('get_message', message)
+                return _decode_text(message, md.CodedCharSetId)
 
         except pymqi.MQMIError as err:
             str_err = str(err)
             if (str_err.find('MQRC_NO_MSG_AVAILABLE') >= 0):
-                print('[PyMQI::get_message]:: Ended successfully with no message.')
+                self._instrumentation.debug('[PyMQI::get_message]:: Ended successfully with no message.')
             else:
                 raise Exception("[PyMQI::get_message] Error:", str(err))
 
 
-    def get_all_messages(self, queue_name: str) -> str:
+    def wait_for_message(self, queue_name: str, timeout: Union[str, float] = DEFAULT_WAIT_TIMEOUT) -> str:
         """
-         Get all messages from a queue.
+         Wait for a message to arrive on a queue and get it.
+
+        The wait is done by the queue manager (MQGMO_WAIT), capped by the remaining Robot keyword
+        or test timeout, and can be interrupted with `Cancel Waits`.
 
         *Args:*\n
             _queue_name_ - Name of the target queue;\n
+            _timeout_    - Maximum time to wait, in Robot time format;\n
+
+        *Returns:*\n
+            Content of the got message.
 
         *Raises:*\n
-            MQ Error: Error message according PyMQI.
+            MQ Error: Error message according PyMQI, or no message arrived in time.
 
         *Example:*\n
-            ${msg} = |  Get All Messages | 'TEST.SERVICENAME.REPLY'
+            ${msg} = |  Wait For Message | 'TEST.SERVICENAME.REPLY' | timeout=5s
         """
 
-        messages = ''
-        msg_cnt = 0
-
         try:
-
-            print('[PyMQI::get_all_messages]:: Start with queue_name=[', queue_name,']...')
-            queue = pymqi.Queue(self.connection, queue_name)
-
-            message = queue.get()
-            messages = messages + message.decode("utf-8")
-
-            while message is not None:
-                messages = messages + ', '
-                msg_cnt += 1
-                #print('[PyMQI::purge_queue]:: Purged message [', msg_cnt, ']: [', message.decode("utf-8"),']')
-                message = queue.get()
-                messages = messages + message.decode("utf-8")
-
-            print('[PyMQI::get_all_messages]:: Ended successfully with [',msg_cnt,'] messages, content=[', messages,'].')
-            print('')            
-            return messages
+            with self._instrumentation.call('wait_for_message', queue_name) as call:
+                started = time.monotonic()
+                queue = self._open_queue(queue_name, _OPEN_INPUT)
+                md = pymqi.MD()
+                message = self._wait_get(queue, queue_name, started + timestr_to_secs(timeout), md)
+                waited = time.monotonic() - started
+                if message is None:
+                    raise Exception("[PyMQI::wait_for_message] Error:", "No message arrived on '%s' within %.3f seconds." % (queue_name, waited))
+                call.add(len(message))
+                self._instrumentation.info('[PyMQI::wait_for_message]:: Ended successfully after [%.3f] seconds.' % waited)
+                return _decode_text(message, md.CodedCharSetId)
 
         except pymqi.MQMIError as err:
-            str_err = str(err)
-            if (str_err.find('MQRC_NO_MSG_AVAILABLE') >= 0):
-                print('[PyMQI::get_all_messages]:: Ended successfully with [',msg_cnt,'] messages, content=[', messages,'].')
-                return messages
-            else:
-                raise Exception("[PyMQI::get_all_messages] Error:", str(err))
+            raise Exception("[PyMQI::wait_for_message] Error:", str(err))
 
 
-    def get_message_into_file(self, queue_name: str, file_path: str) -> None:
+    def wait_for_n_messages(self, queue_name: str, count: int, timeout: Union[str, float] = DEFAULT_WAIT_TIMEOUT) -> List[str]:
         """
-         Getting a message into file from a queue.
+         Wait until the given number of messages have been got from a queue.
+
+        The timeout applies to all messages together. The waits are done by the queue manager
+        (MQGMO_WAIT), capped by the remaining Robot keyword or test timeout, and can be
+        interrupted with `Cancel Waits`. The messages are got under syncpoint and committed only
+        when all of them have arrived, otherwise they are left on the queue.
 
         *Args:*\n
             _queue_name_ - Name of the target queue;\n
-            _file_path_  - Path to a message file;\n
+            _count_      - Number of messages to get;\n
+            _timeout_    - Maximum time to wait for all messages, in Robot time format;\n
+
+        *Returns:*\n
+            List of the contents of the got messages.
 
         *Raises:*\n
-            MQ Error: Error message according PyMQI.
+            MQ Error: Error message according PyMQI, or not enough messages arrived in time; the got ones are backed out.
 
         *Example:*\n
-            |  Get Messgae Into File | 'TEST.SERVICENAME.REQUEST' |  ${CURDIR}${/}message.dat 
+            @{msgs} = |  Wait For N Messages | 'TEST.SERVICENAME.REPLY' | 3 | timeout=10s
         """
 
+        count = int(count)
+        messages = []
         try:
-            print('[PyMQI::get_message_into_file]:: Start with queue_name=[', queue_name,', file_path=[', file_path,']]...')
-            with open(file_path, "w") as messagefile:
-                queue = pymqi.Queue(self.connection, queue_name)
-                message = queue.get()
-                messagefile.write(message.decode("utf-8"))
-            print('[PyMQI::get_message_into_file]:: Ended successfully.')
+            with self._instrumentation.call('wait_for_n_messages', queue_name) as call:
+                started = time.monotonic()
+                deadline = started + timestr_to_secs(timeout)
+                queue = self._open_queue(queue_name, _OPEN_INPUT)
+                while len(messages) < count:
+                    md = pymqi.MD()
+                    gmo = pymqi.GMO(Options=pymqi.CMQC.MQGMO_SYNCPOINT | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+                    message = self._wait_get(queue, queue_name, deadline, md, gmo)
+                    if message is None:
+                        if messages:
+                            self._backout()
+                        raise Exception("[PyMQI::wait_for_n_messages] Error:", "Only %d of %d messages arrived on '%s' within %.3f seconds."
+                                        % (len(messages), count, queue_name, time.monotonic() - started))
+                    call.add(len(message))
+                    messages.append(_decode_text(message, md.CodedCharSetId))
+                if messages:
+                    self.connection.commit()
+                self._instrumentation.info('[PyMQI::wait_for_n_messages]:: Ended successfully after [%.3f] seconds.'
+                                           % (time.monotonic() - started))
+                return messages
 
         except pymqi.MQMIError as err:
-            str_err = str(err)
-            if (str_err.find('MQRC_NO_MSG_AVAILABLE') >= 0):
-                print('[PyMQI::get_message_into_file]:: Ended successfully with [',msg_cnt,'] messages.')
-            else:
-                raise Exception("[PyMQI::get_message_into_file] Error:", str(err))
+            if messages:
+                self._backout()
+            raise Exception("[PyMQI::wait_for_n_messages] Error:", str(err))
 
 
-    def get_all_messages_into_file(self, queue_name: str, file_path: str) -> None:
+    def wait_for_message_on_any_queue(self, queue_names: Union[List[str], str], timeout: Union[str, float] = DEFAULT_WAIT_TIMEOUT,
+                                      as_objects: bool = False) -> Dict[str, Any]:
         """
-         Getting all messages into file from a queue.
+         Wait for the first message to arrive on any of several queues and get it.
+
+        Every queue is waited on in parallel, by its own thread on its own connection with the
+        parameters of the active connection, so the message is got as soon as it arrives. Only the
+        first message is got; the other queues are left as they are. The wait is capped by the
+        remaining Robot keyword or test timeout and can be interrupted with `Cancel Waits`.
 
         *Args:*\n
-            _queue_name_ - Name of the target queue;\n
-            _file_path_  - Path to a message file;\n
+            _queue_names_ - List of queue names, or a comma separated string of them;\n
+            _timeout_     - Maximum time to wait, in Robot time format;\n
+            _as_objects_  - Return the message as a message object instead of its decoded text;\n
+
+        *Returns:*\n
+            Dictionary with the _queue_ the message was got from, the _message_, its _msg_id_ as hex string,
+            the epoch time it was _received_ and the seconds _elapsed_ since the wait started.
 
         *Raises:*\n
-            MQ Error: Error message according PyMQI.
+            MQ Error: Error message according PyMQI, or no message arrived in time.
 
         *Example:*\n
-            |  Get All Messages Into File | 'TEST.SERVICENAME.REQUEST' |  ${CURDIR}${/}message.dat 
+            | ${first} = |  Wait For Message On Any Queue | ${queues} | timeout=10s
+            | Should Be Equal | ${first}[queue] | TEST.SERVICENAME.ERROR
         """
 
-        msg_cnt = 0
-        try:
-            print('[PyMQI::get_all_messages_into_file]:: Start with queue_name=[', queue_name,', file_path=[', file_path,']]...')
-            with open(file_path, "w") as messagefile:
-                queue = pymqi.Queue(self.connection, queue_name)
-                message = queue.get()
-                messagefile.write(message.decode("utf-8"))
+        return self._fan_in('wait_for_message_on_any_queue', queue_names, 1, timeout, as_objects)[0]
 
-                while message is not None:
-                    msg_cnt += 1
-                    message = queue.get()
-                    messagefile.write(', ')
-                    messagefile.write(message.decode("utf-8"))
 
-            print('[PyMQI::get_all_messages_into_file]:: Ended successfully.')
+    def collect_from_queues(self, queue_names: Union[List[str], str], timeout: Union[str, float] = DEFAULT_WAIT_TIMEOUT,
+                            as_objects: bool = False) -> List[Dict[str, Any]]:
+        """
+         Wait for one message from each of several queues and get them together.
 
-        except pymqi.MQMIError as err:
-            str_err = str(err)
-            if (str_err.find('MQRC_NO_MSG_AVAILABLE') >= 0):
-                print('[PyMQI::get_all_messages_into_file]:: Ended successfully with [',msg_cnt,'] messages.')
-            else:
-                raise Exception("[PyMQI::get_all_messages_into_file] Error:", str(err))
+        Every queue is waited on in parallel, by its own thread on its own connection with the
+        parameters of the active connection, so the total wait is that of the latest message. The
+        messages are got under syncpoint and committed only if all of them arrived in time,
+        otherwise they are all left on their queues. The wait is capped by the remaining Robot
+        keyword or test timeout and can be interrupted with `Cancel Waits`.
+
+        *Args:*\n
+            _queue_names_ - List of queue names, or a comma separated string of them;\n
+            _timeout_     - Maximum time to wait for all messages, in Robot time format;\n
+            _as_objects_  - Return the messages as message objects instead of their decoded text;\n
+
+        *Returns:*\n
+            List of dictionaries in the order of arrival, see `Wait For Message On Any Queue`.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, or not every queue got a message in time.
+
+        *Example:*\n
+            | @{replies} = |  Collect From Queues | TEST.BILLING.REPLY, TEST.SHIPPING.REPLY | timeout=10s
+            | Should Be Equal | ${replies}[0][queue] | TEST.BILLING.REPLY
+        """
+
+        return self._fan_in('collect_from_queues', queue_names, None, timeout, as_objects)
+
+
+    def cancel_waits(self) -> None:
+        """
+         Interrupt the message waits in progress, e.g. from a listener or another thread.
+
+        A cancelled wait ends within `WAIT_SLICE` seconds as if the timeout had expired. A cancel
+        given while no wait is in progress ends the next wait.
+
+        *Example:*\n
+            | Cancel Waits |
+        """
+
+        self._cancel_waits.set()
+
+
+    def get_message_by_correlation_id(self, queue_name: str, correl_id: Union[str, bytes], timeout: Union[str, float] = 0,
+                                      browse_first: bool = False) -> Optional[str]:
+        """
+         Get the message with the given correlation ID from a queue.
+
+        The queue manager looks the message up by its correlation ID (MQMO_MATCH_CORREL_ID),
+        other messages on the queue are neither transferred nor removed.
+
+        *Args:*\n
+            _queue_name_   - Name of the target queue;\n
+            _correl_id_    - Correlation ID as a 48 character hex string, or as text padded with zero bytes;\n
+            _timeout_      - Time to wait for the message to arrive, in Robot time format, 0 means no wait;\n
+            _browse_first_ - Browse the matching message first and get it under the browse cursor;\n
+
+        *Returns:*\n
+            Content of the got message, or None if there is no matching message.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            ${msg} = |  Get Message By Correlation Id | 'TEST.SERVICENAME.REPLY' | ${msg_id} | timeout=5s
+        """
+
+        try:
+            with self._instrumentation.call('get_message_by_correlation_id', queue_name) as call:
+                md = pymqi.MD(CorrelId=self._to_mq_id(correl_id))
+                message = self._get_message_by_id(queue_name, md, pymqi.CMQC.MQMO_MATCH_CORREL_ID, timeout, browse_first)
+                if message is None:
+                    return None
+                call.add(len(message))
+                return _decode_text(message, md.CodedCharSetId)
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::get_message_by_correlation_id] Error:", str(err))
+
+
+    def get_message_by_message_id(self, queue_name: str, msg_id: Union[str, bytes], timeout: Union[str, float] = 0,
+                                  browse_first: bool = False) -> Optional[str]:
+        """
+         Get the message with the given message ID from a queue.
+
+        The queue manager looks the message up by its message ID (MQMO_MATCH_MSG_ID),
+        other messages on the queue are neither transferred nor removed.
+
+        *Args:*\n
+            _queue_name_   - Name of the target queue;\n
+            _msg_id_       - Message ID as a 48 character hex string, or as text padded with zero bytes;\n
+            _timeout_      - Time to wait for the message to arrive, in Robot time format, 0 means no wait;\n
+            _browse_first_ - Browse the matching message first and get it under the browse cursor;\n
+
+        *Returns:*\n
+            Content of the got message, or None if there is no matching message.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            ${msg} = |  Get Message By Message Id | 'TEST.SERVICENAME.REQUEST' | ${ids}[0]
+        """
+
+        try:
+            with self._instrumentation.call('get_message_by_message_id', queue_name) as call:
+                md = pymqi.MD(MsgId=self._to_mq_id(msg_id))
+                message = self._get_message_by_id(queue_name, md, pymqi.CMQC.MQMO_MATCH_MSG_ID, timeout, browse_first)
+                if message is None:
+                    return None
+                call.add(len(message))
+                return _decode_text(message, md.CodedCharSetId)
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::get_message_by_message_id] Error:", str(err))
+
+
+    def send_request_and_wait_for_reply(self, message: str, request_queue: str, reply_queue: Optional[str] = None,
+                                        timeout: Union[str, float] = DEFAULT_WAIT_TIMEOUT,
+                                        model_queue: str = DEFAULT_MODEL_QUEUE) -> Tuple[str, float]:
+        """
+         Put a request message and wait for its reply.
+
+        The request is put with ReplyToQ set and the reply is got by its correlation ID, which the
+        replying service is expected to copy from the request message ID. Without _reply_queue_, a
+        temporary dynamic queue created from _model_queue_ is used; these are pooled per connection
+        and reused by later calls. One whose reply did not arrive in time is deleted instead, so
+        late replies do not pile up on it.
+
+        *Args:*\n
+            _message_       - Content of the request message;\n
+            _request_queue_ - Name of the request queue;\n
+            _reply_queue_   - Name of the reply queue, a pooled temporary dynamic queue if not given;\n
+            _timeout_       - Maximum time to wait for the reply, in Robot time format;\n
+            _model_queue_   - Model queue of the temporary dynamic reply queues;\n
+
+        *Returns:*\n
+            Content of the reply and the round-trip time in seconds.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, or no reply arrived in time.
+
+        *Example:*\n
+            ${reply} | ${rtt} = |  Send Request And Wait For Reply | Hello World! | 'TEST.SERVICENAME.REQUEST' | timeout=5s
+            Should Be True | ${rtt} < 0.5
+        """
+
+        pooled = None
+        try:
+            with self._instrumentation.call('send_request_and_wait_for_reply', request_queue) as call:
+                reply_queues = self._active_connection.reply_queues
+                if reply_queue is None:
+                    pooled = reply_queues.acquire(model_queue)
+                    reply_queue, reply_handle = pooled
+                else:
+                    reply_handle = self._open_queue(reply_queue, _OPEN_INPUT)
+                    reply_queue = self._queue_name(reply_queue)
+                request_handle = self._open_queue(request_queue, _OPEN_OUTPUT)
+
+                md = pymqi.MD(MsgType=pymqi.CMQC.MQMT_REQUEST, ReplyToQ=reply_queue.encode('utf-8'))
+                pmo = pymqi.PMO(Options=pymqi.CMQC.MQPMO_NO_SYNCPOINT | pymqi.CMQC.MQPMO_NEW_MSG_ID | pymqi.CMQC.MQPMO_FAIL_IF_QUIESCING)
+                gmo = pymqi.GMO(Version=pymqi.CMQC.MQGMO_VERSION_2, MatchOptions=pymqi.CMQC.MQMO_MATCH_CORREL_ID,
+                                Options=pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+                started = time.perf_counter()
+                payload = message.encode("utf-8")
+                self._put(request_handle, payload, md, pmo)
+                reply_md = pymqi.MD(CorrelId=md.MsgId)
+                reply = self._wait_get(reply_handle, reply_queue, time.monotonic() + timestr_to_secs(timeout), reply_md, gmo)
+                rtt = time.perf_counter() - started
+                if reply is None:
+                    if pooled is not None:
+                        # A late reply would stay on a pooled queue for good; closing deletes the queue with it.
+                        reply_queues.discard(pooled[1])
+                        pooled = None
+                    raise Exception("[PyMQI::send_request_and_wait_for_reply] Error:",
+                                    "No reply arrived on '%s' within %.3f seconds." % (reply_queue, rtt))
+                call.add(len(payload) + len(reply), 2)
+                self._instrumentation.debug('[PyMQI::send_request_and_wait_for_reply]:: Round-trip time [%.6f] seconds.' % rtt)
+                return _decode_text(reply, reply_md.CodedCharSetId), rtt
+
+        except pymqi.MQMIError as err:
+            if pooled is not None:
+                reply_queues.discard(pooled[1])
+                pooled = None
+            raise Exception("[PyMQI::send_request_and_wait_for_reply] Error:", str(err))
+
+        finally:
+            if pooled is not None:
+                reply_queues.release(model_queue, *pooled)
+
+
+    def get_all_messages(self, queue_name: str, as_list: bool = False, max_messages: Optional[int] = None, max_bytes: Optional[int] = None) -> Union[str, List[str]]:
+        """
+         Get all messages from a queue.
+
+        Message contents are not logged; only the number of messages got is.
+
+        *Args:*\n
+            _queue_name_   - Name of the target queue;\n
+            _as_list_      - Return the messages as a list instead of one comma separated string;\n
+            _max_messages_ - Stop after getting this many messages;\n
+            _max_bytes_    - Stop as soon as the got messages reach this total size in bytes;\n
+
+        *Returns:*\n
+            Messages joined with ', ', or the list of messages if _as_list_ is set.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            ${msg} = |  Get All Messages | 'TEST.SERVICENAME.REPLY'
+            @{msgs} = |  Get All Messages | 'TEST.SERVICENAME.REPLY' | as_list=True | max_messages=100
+        """
+
+        try:
+            with self._instrumentation.call('get_all_messages', queue_name) as call:
+                messages = []
+                for message, md in self._drain_queue(queue_name, max_messages, max_bytes):
+                    call.add(len(message))
+                    messages.append(_decode_text(message, md.CodedCharSetId))
+                return messages if as_list else ', '.join(messages)
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::get_all_messages] Error:", str(err))
+
+
+    def consume_messages(self, queue_name: str, max_messages: Optional[int] = None, max_bytes: Optional[int] = None) -> Iterator[str]:
+        """
+         Get messages from a queue lazily, one message per iteration step.
+
+        A message is only got from the queue when the caller asks for the next item, so
+        stopping the iteration early leaves the remaining messages on the queue.
+
+        *Args:*\n
+            _queue_name_   - Name of the target queue;\n
+            _max_messages_ - Stop after getting this many messages;\n
+            _max_bytes_    - Stop as soon as the got messages reach this total size in bytes;\n
+
+        *Returns:*\n
+            Iterator over the message contents.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            | ${msgs} = |  Consume Messages | 'TEST.SERVICENAME.REPLY'
+            | FOR | ${msg} | IN | @{msgs}
+        """
+
+        try:
+            with self._instrumentation.call('consume_messages', queue_name) as call:
+                for message, md in self._drain_queue(queue_name, max_messages, max_bytes):
+                    call.add(len(message))
+                    yield _decode_text(message, md.CodedCharSetId)
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::consume_messages] Error:", str(err))
+
+
+    def get_message_object(self, queue_name: str, codec: str = 'auto', timeout: Union[str, float] = 0) -> Optional[MQMessage]:
+        """
+         Get a message from a queue as a message object, with its raw bytes and MQMD.
+
+        Nothing is decoded until asked for. The object has the properties _payload_ (the bytes
+        as got), _md_, _text_ (decoded by the CCSID of the message), _json_, _xml_ (an
+        ElementTree element), _value_ (decoded by _codec_), _msg_id_, _correl_id_, _ccsid_ and
+        _format_; every decoding is done once and then cached. Codecs are _auto_ (text if the
+        Format is MQSTR or the payload decodes, bytes otherwise), _text_, _bytes_, _json_, _xml_,
+        _fixed:name=width,..._ and the ones added with `Register Payload Codec`.
+
+        *Args:*\n
+            _queue_name_ - Name of the target queue;\n
+            _codec_      - Codec of the _value_ property;\n
+            _timeout_    - Time to wait for a message to arrive, in Robot time format, 0 means no wait;\n
+
+        *Returns:*\n
+            The message object, or None if there is no message.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            | ${msg} = |  Get Message Object | 'TEST.SERVICENAME.REPLY' | codec=json | timeout=5s
+            | Should Be Equal | ${msg.value}[status] | OK
+            | Should Be Equal | ${msg.json}[order][id] | 42
+        """
+
+        try:
+            with self._instrumentation.call('get_message_object', queue_name) as call:
+                md = pymqi.MD()
+                gmo = pymqi.GMO(Options=pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+                message = self._get_or_wait(self._open_queue(queue_name, _OPEN_INPUT), queue_name, timestr_to_secs(timeout), md, gmo)
+                if message is None:
+                    return None
+                call.add(len(message))
+                return MQMessage(message, md, codec, self._codecs)
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::get_message_object] Error:", str(err))
+
+
+    def get_message_objects(self, queue_name: str, codec: str = 'auto', max_messages: Optional[int] = None,
+                            max_bytes: Optional[int] = None) -> List[MQMessage]:
+        """
+         Get all messages from a queue as message objects, see `Get Message Object`.
+
+        *Args:*\n
+            _queue_name_   - Name of the target queue;\n
+            _codec_        - Codec of the _value_ property;\n
+            _max_messages_ - Stop after getting this many messages;\n
+            _max_bytes_    - Stop as soon as the got messages reach this total size in bytes;\n
+
+        *Returns:*\n
+            List of the message objects.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            @{msgs} = |  Get Message Objects | 'TEST.SERVICENAME.REPLY' | codec=fixed:id=8,name=20
+        """
+
+        try:
+            with self._instrumentation.call('get_message_objects', queue_name) as call:
+                messages = []
+                for message, md in self._drain_queue(queue_name, max_messages, max_bytes):
+                    call.add(len(message))
+                    messages.append(MQMessage(message, md, codec, self._codecs))
+                return messages
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::get_message_objects] Error:", str(err))
+
+
+    def decode_message(self, message: MQMessage, codec: str) -> Any:
+        """
+         Decode a message object with the given codec; the result is cached in the message.
+
+        *Args:*\n
+            _message_ - Message object, as returned by `Get Message Object`;\n
+            _codec_   - Name of the codec, optionally with options after a colon;\n
+
+        *Returns:*\n
+            The decoded payload.
+
+        *Raises:*\n
+            Decode Error: Unknown codec, or the payload cannot be decoded with it.
+
+        *Example:*\n
+            ${record} = |  Decode Message | ${msg} | fixed:id=8,name=20,amount=10
+        """
+
+        try:
+            return message.decode(codec)
+        except (ValueError, ElementTree.ParseError) as err:
+            raise Exception("[PyMQI::decode_message] Error:", str(err))
+
+
+    def register_payload_codec(self, name: str, decoder: Union[str, Callable[[MQMessage, Optional[str]], Any]]) -> None:
+        """
+         Add a codec usable by the message objects of this library instance, or replace one.
+
+        The decoder is called with the message object and the options given after the colon of
+        the codec name (or None), and returns the decoded value.
+
+        *Args:*\n
+            _name_    - Name of the codec;\n
+            _decoder_ - The decoder function, or its import path as _module.function_;\n
+
+        *Example:*\n
+            |  Register Payload Codec | edifact | mycodecs.decode_edifact
+        """
+
+        if isinstance(decoder, str):
+            module_name, _, function_name = decoder.rpartition('.')
+            try:
+                decoder = getattr(importlib.import_module(module_name), function_name)
+            except (ImportError, AttributeError, ValueError) as err:
+                raise Exception("[PyMQI::register_payload_codec] Error:", "Cannot import decoder '%s': %s" % (decoder, err))
+        self._codecs[name] = decoder
+
+
+    def get_message_into_file(self, queue_name: str, file_path: str, segmented: bool = False) -> None:
+        """
+         Getting a message into file from a queue.
+
+        The received bytes are written to the file as they are, so binary content is preserved.
+        With _segmented_, a segmented message is got segment by segment in logical order and each
+        segment is written to the file as it arrives, instead of reassembling it in memory.
+
+        *Args:*\n
+            _queue_name_ - Name of the target queue;\n
+            _file_path_  - Path to a message file;\n
+            _segmented_  - Get a segmented message one segment at a time;\n
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            |  Get Messgae Into File | 'TEST.SERVICENAME.REQUEST' |  ${CURDIR}${/}message.dat 
+        """
+
+        try:
+            with self._instrumentation.call('get_message_into_file', queue_name, _EMPTY_QUEUE_REASONS) as call:
+                with open(file_path, "wb") as messagefile:
+                    queue = self._open_queue(queue_name, _OPEN_INPUT)
+                    if segmented:
+                        call.add(self._get_segments_into_file(queue, messagefile))
+                    else:
+                        message = self._get(queue, queue_name)
+                        call.add(len(message))
+                        messagefile.write(message)
+
+        except pymqi.MQMIError as err:
+            if err.reason == pymqi.CMQC.MQRC_NO_MSG_AVAILABLE:
+                self._instrumentation.debug('[PyMQI::get_message_into_file]:: Ended successfully with no message.')
+            else:
+                if segmented:
+                    self._backout()
+                raise Exception("[PyMQI::get_message_into_file] Error:", str(err))
+
+
+    def get_all_messages_into_file(self, queue_name: str, file_path: str, max_messages: Optional[int] = None, max_bytes: Optional[int] = None) -> int:
+        """
+         Getting all messages into file from a queue.
+
+        Messages are written to the file as they are got, separated by ', '.
+
+        *Args:*\n
+            _queue_name_   - Name of the target queue;\n
+            _file_path_    - Path to a message file;\n
+            _max_messages_ - Stop after getting this many messages;\n
+            _max_bytes_    - Stop as soon as the got messages reach this total size in bytes;\n
+
+        *Returns:*\n
+            Number of messages written into the file.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            |  Get All Messages Into File | 'TEST.SERVICENAME.REQUEST' |  ${CURDIR}${/}message.dat 
+        """
+
+        msg_cnt = 0
+        try:
+            with self._instrumentation.call('get_all_messages_into_file', queue_name) as call:
+                with open(file_path, "w") as messagefile:
+                    for message, md in self._drain_queue(queue_name, max_messages, max_bytes):
+                        if msg_cnt:
+                            messagefile.write(', ')
+                        messagefile.write(_decode_text(message, md.CodedCharSetId))
+                        call.add(len(message))
+                        msg_cnt += 1
+                return msg_cnt
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::get_all_messages_into_file] Error:", str(err))
+
+
+    def export_queue_to_file(self, queue_name: str, file_path: str, browse: bool = True, compression: str = 'none',
+                             max_messages: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """
+         Export the messages of a queue with their MQMD into a snapshot file.
+
+        Messages are streamed into the file one at a time, so the memory used does not depend on the
+        depth of the queue. By default the queue is browsed and left as it is; with _browse_ set to
+        False the messages are got under syncpoint and committed once per batch, after the batch has
+        been flushed into the file. The file can be loaded back with `Import Queue From File`.
+
+        *Args:*\n
+            _queue_name_   - Name of the queue to export;\n
+            _file_path_    - Path of the snapshot file;\n
+            _browse_       - Browse the messages instead of getting them;\n
+            _compression_  - none, gzip, bz2 or lzma;\n
+            _max_messages_ - Stop after exporting this many messages;\n
+            _batch_size_   - Number of messages got under one syncpoint, if not browsing;\n
+
+        *Returns:*\n
+            Number of messages written into the file.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI. If not browsing, the uncommitted batch is backed out.
+
+        *Example:*\n
+            | ${count} = |  Export Queue To File | 'TEST.SERVICENAME.REQUEST' | ${CURDIR}${/}request.snapshot | compression=gzip
+        """
+
+        batch_size = max(1, int(batch_size))
+        msg_cnt = 0
+        in_batch = 0
+        try:
+            with self._instrumentation.call('export_queue_to_file', queue_name) as call:
+                with _open_snapshot(file_path, 'wb', compression) as snapshotfile:
+                    snapshotfile.write(_SNAPSHOT_MAGIC)
+                    if browse:
+                        messages = self._browse_queue(queue_name, max_messages)
+                    else:
+                        messages = self._drain_queue(queue_name, max_messages, syncpoint=True)
+                    for message, md in messages:
+                        md_bytes = md.pack()
+                        snapshotfile.write(_SNAPSHOT_RECORD.pack(len(md_bytes), len(message)))
+                        snapshotfile.write(md_bytes)
+                        snapshotfile.write(message)
+                        call.add(len(message))
+                        msg_cnt += 1
+                        if not browse:
+                            in_batch += 1
+                            if in_batch >= batch_size:
+                                snapshotfile.flush()
+                                self.connection.commit()
+                                in_batch = 0
+                # The last batch is committed only once the file has been closed completely.
+                if in_batch:
+                    self.connection.commit()
+                return msg_cnt
+
+        except (pymqi.MQMIError, ValueError, OSError) as err:
+            if in_batch:
+                self._backout()
+            raise Exception("[PyMQI::export_queue_to_file] Error:", str(err))
+
+
+    def import_queue_from_file(self, file_path: str, queue_name: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                               set_context: bool = False, new_ids: bool = False) -> int:
+        """
+         Put the messages of a snapshot file made by `Export Queue To File` into a queue.
+
+        The file is read one message at a time and the messages are put with their exported MQMD,
+        under syncpoint and committed once per batch. The compression is recognized from the file.
+        The queue manager sets the context fields (put date and time, user, application) of the put
+        messages unless _set_context_ is given, which needs set all context authority on the queue.
+
+        *Args:*\n
+            _file_path_   - Path of the snapshot file;\n
+            _queue_name_  - Name of the target queue;\n
+            _batch_size_  - Number of messages put under one syncpoint before committing;\n
+            _set_context_ - Keep the exported context fields of the messages;\n
+            _new_ids_     - Give the messages new message IDs instead of the exported ones;\n
+
+        *Returns:*\n
+            Number of messages put into the queue.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, or the file is not a snapshot file. The uncommitted batch is backed out.
+
+        *Example:*\n
+            | ${count} = |  Import Queue From File | ${CURDIR}${/}request.snapshot | 'TEST.SERVICENAME.REQUEST'
+        """
+
+        batch_size = max(1, int(batch_size))
+        msg_cnt = 0
+        in_batch = 0
+        try:
+            with self._instrumentation.call('import_queue_from_file', queue_name) as call:
+                options = pymqi.CMQC.MQPMO_SYNCPOINT | pymqi.CMQC.MQPMO_FAIL_IF_QUIESCING
+                open_options = _OPEN_OUTPUT
+                if set_context:
+                    options |= pymqi.CMQC.MQPMO_SET_ALL_CONTEXT
+                    open_options |= pymqi.CMQC.MQOO_SET_ALL_CONTEXT
+                if new_ids:
+                    options |= pymqi.CMQC.MQPMO_NEW_MSG_ID
+                pmo = pymqi.PMO(Options=options)
+                queue = self._open_queue(queue_name, open_options)
+                with _open_snapshot(file_path, 'rb') as snapshotfile:
+                    if snapshotfile.read(len(_SNAPSHOT_MAGIC)) != _SNAPSHOT_MAGIC:
+                        raise ValueError("'%s' is not a queue snapshot file." % file_path)
+                    while True:
+                        header = snapshotfile.read(_SNAPSHOT_RECORD.size)
+                        if not header:
+                            break
+                        md_length, length = _SNAPSHOT_RECORD.unpack(header) if len(header) == _SNAPSHOT_RECORD.size else (0, -1)
+                        md_bytes = snapshotfile.read(md_length)
+                        message = snapshotfile.read(length)
+                        if length < 0 or len(md_bytes) < md_length or len(message) < length:
+                            raise ValueError("'%s' ends in the middle of a message." % file_path)
+                        md = pymqi.MD()
+                        md.unpack(md_bytes)
+                        self._put(queue, message, md, pmo)
+                        call.add(length)
+                        msg_cnt += 1
+                        in_batch += 1
+                        if in_batch >= batch_size:
+                            self.connection.commit()
+                            in_batch = 0
+                if in_batch:
+                    self.connection.commit()
+                return msg_cnt
+
+        except (pymqi.MQMIError, ValueError, OSError, EOFError) as err:
+            # EOFError: a compressed file that ends in the middle of its stream.
+            if in_batch:
+                self._backout()
+            raise Exception("[PyMQI::import_queue_from_file] Error:", str(err) or type(err).__name__)
+
+
+    def get_queue_depth(self, queue_name: str) -> int:
+        """
+         Get the number of messages on a queue without getting any of them.
+
+        *Args:*\n
+            _queue_name_ - Name of the queue;\n
+
+        *Returns:*\n
+            Current depth of the queue.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            ${depth} = |  Get Queue Depth | 'TEST.SERVICENAME.REPLY'
+        """
+
+        try:
+            with self._instrumentation.call('get_queue_depth', queue_name):
+                return self._open_queue(queue_name, _OPEN_INQUIRE).inquire(pymqi.CMQC.MQIA_CURRENT_Q_DEPTH)
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::get_queue_depth] Error:", str(err))
+
+
+    def get_queue_attributes(self, queue_name: str, *selectors: Union[str, int]) -> Dict[str, Any]:
+        """
+         Get several attributes of a queue in one inquiry.
+
+        The attributes are asked for with one PCF INQUIRE QUEUE command. If that is not possible
+        (missing authority, no command server), they are inquired one by one (MQINQ) on an open
+        queue handle that is kept for later inquiries.
+
+        *Args:*\n
+            _queue_name_ - Name of the queue;\n
+            _selectors_  - Attribute names as in CMQC, with or without the MQIA_/MQCA_ prefix, or their numbers; `DEFAULT_QUEUE_ATTRIBUTES` if none are given;\n
+
+        *Returns:*\n
+            Dictionary of the attribute values keyed by the selectors as given; text values are stripped.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, or an unknown selector.
+
+        *Example:*\n
+            ${attrs} = |  Get Queue Attributes | 'TEST.SERVICENAME.REPLY' | CURRENT_Q_DEPTH | MAX_Q_DEPTH | MQCA_Q_DESC
+            Should Be True | ${attrs}[CURRENT_Q_DEPTH] < ${attrs}[MAX_Q_DEPTH]
+        """
+
+        names = selectors or self.DEFAULT_QUEUE_ATTRIBUTES
+        keys = [self._selector('get_queue_attributes', name) for name in names]
+        try:
+            with self._instrumentation.call('get_queue_attributes', queue_name):
+                values = self._inquire_queue(queue_name, keys)
+            return {str(name): values[key] for name, key in zip(names, keys)}
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::get_queue_attributes] Error:", str(err))
+
+
+    def wait_until_queue_depth_is(self, queue_name: str, depth: int, timeout: Union[str, float] = DEFAULT_WAIT_TIMEOUT,
+                                  comparison: str = '==') -> int:
+        """
+         Wait until the depth of a queue compares to the given one, without getting any message.
+
+        The depth is inquired first after `DEPTH_POLL_INTERVAL` seconds, then the interval doubles up
+        to `WAIT_SLICE` seconds. The wait is capped by the remaining Robot keyword or test timeout
+        and can be interrupted with `Cancel Waits`.
+
+        *Args:*\n
+            _queue_name_ - Name of the queue;\n
+            _depth_      - Expected depth;\n
+            _timeout_    - Maximum time to wait, in Robot time format;\n
+            _comparison_ - One of ==, !=, >=, <=, >, < applied as _current depth comparison depth_;\n
+
+        *Returns:*\n
+            The depth that satisfied the comparison.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, or the depth was not reached in time.
+
+        *Example:*\n
+            |  Wait Until Queue Depth Is | 'TEST.SERVICENAME.REPLY' | 5000 | timeout=2min | comparison=>=
+            |  Wait Until Queue Depth Is | 'TEST.SERVICENAME.REQUEST' | 0
+        """
+
+        compare = self.DEPTH_COMPARISONS.get(comparison)
+        if compare is None:
+            raise Exception("[PyMQI::wait_until_queue_depth_is] Error:", "Unknown comparison '%s', expected one of %s."
+                            % (comparison, ', '.join(self.DEPTH_COMPARISONS)))
+        depth = int(depth)
+        started = time.monotonic()
+        deadline = started + timestr_to_secs(timeout)
+        interval = self.DEPTH_POLL_INTERVAL
+        try:
+            with self._instrumentation.call('wait_until_queue_depth_is', queue_name):
+                queue = self._open_queue(queue_name, _OPEN_INQUIRE)
+                while True:
+                    current = queue.inquire(pymqi.CMQC.MQIA_CURRENT_Q_DEPTH)
+                    if compare(current, depth):
+                        return current
+                    remaining = deadline - time.monotonic()
+                    robot_remaining = self._robot_time_left()
+                    if robot_remaining is not None:
+                        remaining = min(remaining, robot_remaining)
+                    if remaining <= 0 or self._cancel_waits.wait(min(interval, remaining)):
+                        self._wait_cancelled()
+                        raise Exception("[PyMQI::wait_until_queue_depth_is] Error:", "Depth of '%s' is %d, not %s %d, after %.3f seconds."
+                                        % (queue_name, current, comparison, depth, time.monotonic() - started))
+                    interval = min(interval * 2, self.WAIT_SLICE)
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::wait_until_queue_depth_is] Error:", str(err))
+
+
+    def define_queues(self, queue_names: Union[List[str], str], replace: bool = False, **attributes: Any) -> int:
+        """
+         Define local queues with PCF commands, skipping the ones known to exist.
+
+        Queues defined, found or inquired earlier in this run are known to exist and are skipped
+        unless _replace_ is given; so is a queue the queue manager reports as already existing.
+        The commands go over one PCF connection kept on the active connection. Every queue is
+        tried, the failures are reported together at the end.
+
+        *Args:*\n
+            _queue_names_ - List of queue names, or a comma separated string of them;\n
+            _replace_     - Define the queues again, replacing their attributes, even if they exist;\n
+            _attributes_  - Queue attributes as in CMQC, with or without the MQIA_/MQCA_ prefix, and their values;\n
+
+        *Returns:*\n
+            Number of queues defined.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI for every queue that could not be defined.
+
+        *Example:*\n
+            | ${count} = |  Define Queues | ${queues} | MAX_Q_DEPTH=50000 | Q_DESC=Robot test queue
+            | Define Queues | TEST.SVC1.REQUEST, TEST.SVC1.REPLY | replace=True | DEF_PERSISTENCE=MQPER_PERSISTENT
+        """
+
+        args = self._pcf_attributes('define_queues', attributes)
+        args[pymqi.CMQC.MQIA_Q_TYPE] = pymqi.CMQC.MQQT_LOCAL
+        if replace:
+            args[pymqi.CMQCFC.MQIACF_REPLACE] = pymqi.CMQCFC.MQRP_YES
+        known = self._known_queues()
+        skip = () if replace else known
+        done: Dict[str, Any] = {}
+        try:
+            self._pcf_each('define_queues', 'MQCMD_CREATE_Q', queue_names, args, skip,
+                           ignore=(pymqi.CMQCFC.MQRCCF_OBJECT_ALREADY_EXISTS,), done=done)
+        finally:
+            known.update(done)
+        return sum(1 for responses in done.values() if responses is not None)
+
+
+    def alter_queues(self, queue_names: Union[List[str], str], **attributes: Any) -> None:
+        """
+         Change attributes of local queues with PCF commands.
+
+        *Args:*\n
+            _queue_names_ - List of queue names, or a comma separated string of them;\n
+            _attributes_  - Queue attributes as in CMQC, with or without the MQIA_/MQCA_ prefix, and their values;\n
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI for every queue that could not be changed.
+
+        *Example:*\n
+            |  Alter Queues | ${queues} | INHIBIT_PUT=MQQA_PUT_INHIBITED
+        """
+
+        args = self._pcf_attributes('alter_queues', attributes)
+        args[pymqi.CMQC.MQIA_Q_TYPE] = pymqi.CMQC.MQQT_LOCAL
+        done: Dict[str, Any] = {}
+        try:
+            self._pcf_each('alter_queues', 'MQCMD_CHANGE_Q', queue_names, args, done=done)
+        finally:
+            self._known_queues().update(done)
+
+
+    def delete_queues(self, queue_names: Union[List[str], str], purge: bool = True) -> int:
+        """
+         Delete local queues with PCF commands; queues that do not exist are skipped.
+
+        *Args:*\n
+            _queue_names_ - List of queue names, or a comma separated string of them;\n
+            _purge_       - Delete the queues even if they hold messages;\n
+
+        *Returns:*\n
+            Number of queues deleted.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI for every queue that could not be deleted.
+
+        *Example:*\n
+            | Delete Queues | ${queues}
+        """
+
+        args = {pymqi.CMQCFC.MQIACF_PURGE: pymqi.CMQCFC.MQPO_YES if purge else pymqi.CMQCFC.MQPO_NO}
+        done: Dict[str, Any] = {}
+        try:
+            self._pcf_each('delete_queues', 'MQCMD_DELETE_Q', queue_names, args,
+                           ignore=(pymqi.CMQC.MQRC_UNKNOWN_OBJECT_NAME,), done=done)
+        finally:
+            self._known_queues().difference_update(done)
+        return sum(1 for responses in done.values() if responses is not None)
+
+
+    def clear_queues(self, queue_names: Union[List[str], str]) -> None:
+        """
+         Remove all messages from local queues with PCF commands.
+
+        Unlike `Purge Queue`, there is no fallback to getting the messages; a queue that is open
+        elsewhere cannot be cleared.
+
+        *Args:*\n
+            _queue_names_ - List of queue names, or a comma separated string of them;\n
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI for every queue that could not be cleared.
+
+        *Example:*\n
+            | Clear Queues | TEST.SVC1.REQUEST, TEST.SVC1.REPLY
+        """
+
+        done: Dict[str, Any] = {}
+        try:
+            self._pcf_each('clear_queues', 'MQCMD_CLEAR_Q', queue_names, {}, done=done)
+        finally:
+            self._known_queues().update(done)
+
+
+    def inquire_queues(self, queue_names: Union[List[str], str], *selectors: Union[str, int]) -> Dict[str, Dict[str, Any]]:
+        """
+         Get attributes of several queues with PCF commands.
+
+        A name may be generic, ending with *, to inquire all queues matching it in one command.
+
+        *Args:*\n
+            _queue_names_ - List of queue names, or a comma separated string of them;\n
+            _selectors_   - Attribute names as in CMQC, with or without the MQIA_/MQCA_ prefix, or their numbers; `DEFAULT_QUEUE_ATTRIBUTES` if none are given;\n
+
+        *Returns:*\n
+            Dictionary keyed by queue name of dictionaries of the attribute values keyed by the selectors as given.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI for every name that could not be inquired.
+
+        *Example:*\n
+            | ${queues} = |  Inquire Queues | TEST.SVC1.* | CURRENT_Q_DEPTH | MAX_Q_DEPTH
+            | Should Be Equal As Integers | ${queues}[TEST.SVC1.REQUEST][CURRENT_Q_DEPTH] | 0
+        """
+
+        names = selectors or self.DEFAULT_QUEUE_ATTRIBUTES
+        keys = [self._selector('inquire_queues', name) for name in names]
+        args = {pymqi.CMQCFC.MQIACF_Q_ATTRS: [pymqi.CMQC.MQCA_Q_NAME] + keys}
+        queues: Dict[str, Dict[str, Any]] = {}
+        for responses in self._pcf_each('inquire_queues', 'MQCMD_INQUIRE_Q', queue_names, args).values():
+            for response in responses:
+                queue_name = self._attribute_value(response[pymqi.CMQC.MQCA_Q_NAME])
+                queues[queue_name] = {str(name): self._attribute_value(response.get(key)) for name, key in zip(names, keys)}
+        self._known_queues().update(queues)
+        return queues
+
+
+    def start_queue_listener(self, queue_name: str, max_buffered: int = DEFAULT_LISTENER_BUFFER) -> None:
+        """
+         Start getting the messages of a queue in the background while the test continues.
+
+        The listener thread opens its own connection with the parameters of the active connection
+        and keeps the got messages with their MQMD in a buffer of at most _max_buffered_ messages,
+        dropping the oldest one when it is full. Check the buffer with `Listener Should Have Received`
+        and `Get Listener Messages`, end the listener with `Stop Queue Listener`.
+
+        *Args:*\n
+            _queue_name_   - Name of the queue to listen on;\n
+            _max_buffered_ - Maximum number of messages kept in the buffer;\n
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, or a listener is already running on the queue.
+
+        *Example:*\n
+            |  Start Queue Listener | 'TEST.SERVICENAME.REPLY'
+        """
+
+        try:
+            self._instrumentation.info('[PyMQI::start_queue_listener]:: Start with queue_name=[%s]...' % queue_name)
+            with self._lock:
+                listener = self._listeners.get(queue_name)
+                if listener is not None and listener.running:
+                    raise Exception("[PyMQI::start_queue_listener] Error:", "A listener is already running on '%s'." % queue_name)
+                listener = _QueueListener(self._active_connection.connect_again(), self._queue_name(queue_name),
+                                          max(1, int(max_buffered)), self.WAIT_SLICE, self.RECEIVE_BUFFER_PERCENTILE,
+                                          self._codecs)
+                self._listeners[queue_name] = listener
+            listener.start()
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::start_queue_listener] Error:", str(err))
+
+
+    def stop_queue_listener(self, queue_name: str) -> int:
+        """
+         Stop the listener of a queue and close its connection.
+
+        The stop takes at most `WAIT_SLICE` seconds. The messages the listener got but nobody
+        looked at are gone from the queue, they are only logged as a count.
+
+        *Args:*\n
+            _queue_name_ - Name of the queue the listener runs on;\n
+
+        *Returns:*\n
+            Number of messages the listener got from the queue.
+
+        *Raises:*\n
+            MQ Error: The listener stopped with an MQ error.
+
+        *Example:*\n
+            ${count} = |  Stop Queue Listener | 'TEST.SERVICENAME.REPLY'
+        """
+
+        listener = self._get_listener('stop_queue_listener', queue_name)
+        with self._instrumentation.call('stop_queue_listener', queue_name) as call:
+            with self._lock:
+                self._listeners.pop(queue_name, None)
+            listener.stop()
+            call.add(listener.bytes, listener.received)
+        self._instrumentation.info('[PyMQI::stop_queue_listener]:: Ended with [%d] messages got, [%d] left in the buffer, [%d] dropped.'
+                                   % (listener.received, len(listener.buffer), listener.dropped))
+        if listener.error is not None:
+            raise Exception("[PyMQI::stop_queue_listener] Error:", listener.error)
+        return listener.received
+
+
+    def listener_should_have_received(self, queue_name: str, count: int = 1, contains: Optional[str] = None,
+                                      correl_id: Optional[Union[str, bytes]] = None, msg_id: Optional[Union[str, bytes]] = None,
+                                      timeout: Union[str, float] = DEFAULT_WAIT_TIMEOUT) -> List[str]:
+        """
+         Check that the listener of a queue has buffered the expected messages, waiting for them if needed.
+
+        Only the buffer of the listener is checked, no MQ call is made. All given conditions must
+        hold for a message to match. The wait is capped by the remaining Robot keyword or test timeout.
+
+        *Args:*\n
+            _queue_name_ - Name of the queue the listener runs on;\n
+            _count_      - Minimum number of matching messages;\n
+            _contains_   - Text the message content must contain;\n
+            _correl_id_  - Correlation ID as a 48 character hex string, or as text padded with zero bytes;\n
+            _msg_id_     - Message ID as a 48 character hex string, or as text padded with zero bytes;\n
+            _timeout_    - Maximum time to wait for the messages, in Robot time format;\n
+
+        *Returns:*\n
+            List of the contents of the matching messages.
+
+        *Raises:*\n
+            AssertionError: Not enough matching messages arrived in time.
+
+        *Example:*\n
+            |  Listener Should Have Received | 'TEST.SERVICENAME.REPLY' | contains=OrderCreated | timeout=5s
+            | @{msgs} = |  Listener Should Have Received | 'TEST.SERVICENAME.REPLY' | count=3 | correl_id=${ids}[0]
+        """
+
+        listener = self._get_listener('listener_should_have_received', queue_name)
+        count = int(count)
+        correl_id = None if correl_id is None else self._to_mq_id(correl_id)
+        msg_id = None if msg_id is None else self._to_mq_id(msg_id)
+
+        def matches(message: MQMessage) -> bool:
+            return ((correl_id is None or message.md.CorrelId == correl_id) and (msg_id is None or message.md.MsgId == msg_id) and
+                    (contains is None or contains in str(message)))
+
+        timeout = timestr_to_secs(timeout)
+        robot_remaining = self._robot_time_left()
+        if robot_remaining is not None:
+            timeout = min(timeout, robot_remaining)
+        matching = listener.wait_for(matches, count, time.monotonic() + timeout)
+        if len(matching) < count:
+            if listener.error is not None:
+                raise Exception("[PyMQI::listener_should_have_received] Error:", listener.error)
+            raise AssertionError("[PyMQI::listener_should_have_received] Only %d of %d matching messages received on '%s'."
+                                 % (len(matching), count, queue_name))
+        return [str(message) for message in matching]
+
+
+    def get_listener_messages(self, queue_name: str, clear: bool = False, as_objects: bool = False) -> List[Union[str, MQMessage]]:
+        """
+         Get the contents of the messages buffered by the listener of a queue, oldest first.
+
+        *Args:*\n
+            _queue_name_ - Name of the queue the listener runs on;\n
+            _clear_      - Empty the buffer after reading it;\n
+            _as_objects_ - Return the messages as message objects, see `Get Message Object`;\n
+
+        *Returns:*\n
+            List of the buffered message contents or message objects.
+
+        *Example:*\n
+            @{msgs} = |  Get Listener Messages | 'TEST.SERVICENAME.REPLY' | clear=True
+        """
+
+        listener = self._get_listener('get_listener_messages', queue_name)
+        messages = listener.messages(clear)
+        return messages if as_objects else [str(message) for message in messages]
+
+
+    def subscribe(self, topic_string: str, subscription_name: Optional[str] = None, durable: bool = False) -> str:
+        """
+         Subscribe to a topic, or reuse the subscription opened by an earlier call.
+
+        The subscription is managed, so its publications are kept on a queue provided by the queue
+        manager until `Get Publications` gets them. It stays open on the active connection across
+        keywords and tests until `Unsubscribe` or disconnect. A durable subscription also outlives
+        the connection and is resumed by the next `Subscribe` with the same name.
+
+        *Args:*\n
+            _topic_string_      - Topic string to subscribe to, may contain the wildcards # and +;\n
+            _subscription_name_ - Name of the subscription, the topic string by default;\n
+            _durable_           - Keep the subscription on the queue manager after disconnect;\n
+
+        *Returns:*\n
+            Name of the subscription, to be passed to `Get Publications`.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, or the name is already used for another topic.
+
+        *Example:*\n
+            | ${sub} = |  Subscribe | orders/created | durable=True | subscription_name=ORDERS.TEST
+        """
+
+        subscription_name = subscription_name or topic_string
+        try:
+            with self._instrumentation.call('subscribe', topic_string):
+                self._active_connection.subscriptions.subscribe(subscription_name, topic_string, bool(durable))
+                return subscription_name
+
+        except (pymqi.MQMIError, ValueError) as err:
+            raise Exception("[PyMQI::subscribe] Error:", str(err))
+
+
+    def unsubscribe(self, subscription_name: str, remove: bool = False) -> None:
+        """
+         Close a subscription opened by `Subscribe`.
+
+        A non-durable subscription ends with it; a durable one stays on the queue manager, keeping
+        the publications sent meanwhile, unless _remove_ is given.
+
+        *Args:*\n
+            _subscription_name_ - Name of the subscription;\n
+            _remove_            - Remove a durable subscription from the queue manager;\n
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            |  Unsubscribe | ORDERS.TEST | remove=True
+        """
+
+        try:
+            with self._instrumentation.call('unsubscribe', subscription_name):
+                self._active_connection.subscriptions.close(subscription_name, bool(remove))
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::unsubscribe] Error:", str(err))
+
+
+    def publish(self, message: str, topic_string: str) -> None:
+        """
+         Publish a message on a topic.
+
+        The topic is opened once per connection and kept open for later publications.
+
+        *Args:*\n
+            _message_      - Content of the message to publish;\n
+            _topic_string_ - Topic string to publish on;\n
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI.
+
+        *Example:*\n
+            |  Publish |  {"order": 42} | orders/created
+        """
+
+        try:
+            with self._instrumentation.call('publish', topic_string) as call:
+                topic = self._active_connection.subscriptions.topic(topic_string)
+                payload = message.encode('utf-8')
+                topic.pub(payload, pymqi.MD(), pymqi.PMO(Options=pymqi.CMQC.MQPMO_NEW_MSG_ID | pymqi.CMQC.MQPMO_FAIL_IF_QUIESCING))
+                call.add(len(payload))
+                self._instrumentation.payload('publish', payload)
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::publish] Error:", str(err))
+
+
+    def get_publications(self, subscription_name: str, max_count: int = DEFAULT_BATCH_SIZE,
+                         wait: Union[str, float] = DEFAULT_PUBLICATION_WAIT, as_objects: bool = False) -> List[Union[str, MQMessage]]:
+        """
+         Get the publications received by a subscription, in one batch.
+
+        Publications are got until _max_count_ of them have been got or none arrives within _wait_,
+        under one syncpoint that is committed at the end. The wait is capped by the remaining Robot
+        keyword or test timeout and can be interrupted with `Cancel Waits`.
+
+        *Args:*\n
+            _subscription_name_ - Name returned by `Subscribe`;\n
+            _max_count_         - Maximum number of publications to get;\n
+            _wait_              - Time to wait for the next publication, in Robot time format;\n
+            _as_objects_        - Return message objects instead of the decoded texts;\n
+
+        *Returns:*\n
+            List of the got publications, possibly empty.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, or the subscription is not open. The publications got are backed out.
+
+        *Example:*\n
+            | @{events} = |  Get Publications | orders/created | max_count=200 | wait=2s
+            | Length Should Be | ${events} | 200
+        """
+
+        max_count = int(max_count)
+        wait = timestr_to_secs(wait)
+        publications: List[Union[str, MQMessage]] = []
+        try:
+            with self._instrumentation.call('get_publications', subscription_name) as call:
+                subscription = self._active_connection.subscriptions.get(subscription_name)
+                while len(publications) < max_count:
+                    md = pymqi.MD()
+                    gmo = pymqi.GMO(Options=pymqi.CMQC.MQGMO_SYNCPOINT | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+                    message = self._get_or_wait(subscription, subscription_name, wait, md, gmo)
+                    if message is None:
+                        break
+                    call.add(len(message))
+                    publication = MQMessage(message, md, codecs=self._codecs)
+                    publications.append(publication if as_objects else str(publication))
+                if publications:
+                    self.connection.commit()
+                return publications
+
+        except (pymqi.MQMIError, ValueError) as err:
+            if publications:
+                self._backout()
+            raise Exception("[PyMQI::get_publications] Error:", str(err))
+
+
+    def run_put_load(self, queue_name: str, workers: int = 1, count: Optional[int] = None, duration: Optional[Union[str, float]] = None,
+                     rate: float = 0, template: str = DEFAULT_LOAD_TEMPLATE) -> Dict[str, Union[int, float]]:
+        """
+         Put generated messages into a queue from several threads and measure the throughput.
+
+        Every worker thread opens its own connection with the parameters of the active connection.
+        The payload is built from _template_ with Python format fields _{n}_ (message number of the
+        worker), _{worker}_ (worker number) and _{timestamp}_.
+
+        *Args:*\n
+            _queue_name_ - Name of the target queue;\n
+            _workers_    - Number of worker threads;\n
+            _count_      - Total number of messages to put;\n
+            _duration_   - Time to run, in Robot time format;\n
+            _rate_       - Target total rate in messages per second, 0 means as fast as possible;\n
+            _template_   - Payload template;\n
+
+        *Returns:*\n
+            Dictionary with _messages_, _bytes_, _errors_, _duration_, _msgs_per_sec_, _bytes_per_sec_
+            and _put_p50_ms_, _put_p95_ms_, _put_p99_ms_ latencies.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, if no worker could put any message.
+
+        *Example:*\n
+            ${result} = |  Run Put Load | 'TEST.SERVICENAME.REQUEST' | workers=4 | duration=30s | rate=500
+            Should Be True | ${result}[put_p99_ms] < 50
+        """
+
+        return self._run_load('run_put_load', queue_name, None, False, workers, count, duration, rate, template, 0)
+
+
+    def run_put_get_load(self, queue_name: str, reply_queue: Optional[str] = None, workers: int = 1, count: Optional[int] = None,
+                         duration: Optional[Union[str, float]] = None, rate: float = 0, template: str = DEFAULT_LOAD_TEMPLATE,
+                         reply_timeout: Union[str, float] = DEFAULT_WAIT_TIMEOUT) -> Dict[str, Union[int, float]]:
+        """
+         Put generated messages from several threads, get each one back and measure the round trip.
+
+        Without _reply_queue_, every message is got back from _queue_name_ by its message ID. With
+        _reply_queue_, the messages are requests with ReplyToQ set and the replies are got from
+        _reply_queue_ by correlation ID. See `Run Put Load` for the workers and the template.
+
+        *Args:*\n
+            _queue_name_    - Name of the target queue;\n
+            _reply_queue_   - Name of the reply queue of a request/reply service;\n
+            _workers_       - Number of worker threads;\n
+            _count_         - Total number of messages to put;\n
+            _duration_      - Time to run, in Robot time format;\n
+            _rate_          - Target total rate in messages per second, 0 means as fast as possible;\n
+            _template_      - Payload template;\n
+            _reply_timeout_ - Maximum time to wait for each reply, in Robot time format;\n
+
+        *Returns:*\n
+            The result of `Run Put Load` extended with _rtt_p50_ms_, _rtt_p95_ms_ and _rtt_p99_ms_.
+
+        *Raises:*\n
+            MQ Error: Error message according PyMQI, if no worker could complete any round trip.
+
+        *Example:*\n
+            ${result} = |  Run Put Get Load | 'TEST.SERVICENAME.REQUEST' | 'TEST.SERVICENAME.REPLY' | workers=8 | count=10000
+        """
+
+        return self._run_load('run_put_get_load', queue_name, reply_queue, True, workers, count, duration, rate, template,
+                              timestr_to_secs(reply_timeout))
+
+
+    def get_partitioned_queue_name(self, queue_name: str) -> str:
+        """
+         Get the name the keywords really use for a queue, see _queue_partition_ in `Importing`.
+
+        Useful when the name is passed to the system under test, e.g. as a reply queue.
+
+        *Args:*\n
+            _queue_name_ - Name of the queue as given to the keywords;\n
+
+        *Returns:*\n
+            Name of the queue of this pabot process, or _queue_name_ itself outside pabot.
+
+        *Example:*\n
+            ${reply_queue} = |  Get Partitioned Queue Name | 'TEST.SERVICENAME.REPLY'
+        """
+
+        return self._queue_name(queue_name)
+
+
+    def get_receive_buffer_sizes(self) -> Dict[str, Dict[str, int]]:
+        """
+         Get the receive buffer sizes learned per queue from the sizes of the got messages.
+
+        *Returns:*\n
+            Dictionary keyed by queue name with _buffer_size_, _samples_, _p50_, the configured
+            percentile, _max_ and _truncations_ (gets that had to be retried with a bigger buffer).
+
+        *Example:*\n
+            ${sizes} = |  Get Receive Buffer Sizes
+        """
+
+        return self._receive_buffers.stats()
+
+
+    def get_import_times(self) -> Dict[str, float]:
+        """
+         Get how long importing the library and, once a keyword needed it, pymqi took.
+
+        *Returns:*\n
+            Dictionary of the import times in seconds, keyed by module name (_PyMQI_, _pymqi_).
+
+        *Example:*\n
+            ${times} = |  Get Import Times
+            Should Be True | ${times}[PyMQI] < 0.5
+        """
+
+        return dict(_IMPORT_TIMES)
+
+
+    def get_keyword_metrics(self) -> Dict[str, Dict[str, Dict[str, Union[int, float]]]]:
+        """
+         Get the metrics of the keyword calls made so far.
+
+        *Returns:*\n
+            Dictionary with _keywords_ and _queues_, each keyed by name with _calls_, _errors_,
+            _messages_, _bytes_, _seconds_ and _last_reason_ (MQ reason code of the last failure),
+            and _connections_ with _reconnects_, _failed_reconnects_, _outage_seconds_ and
+            _max_outage_seconds_ of the reconnects made by the library.
+
+        *Example:*\n
+            ${metrics} = |  Get Keyword Metrics
+            Should Be Equal As Integers | ${metrics}[queues][TEST.SERVICENAME.REPLY][errors] | 0
+        """
+
+        return self._instrumentation.metrics()
+
+
+    def log_metrics_summary(self, metrics_file: Optional[str] = None) -> None:
+        """
+         Log the metrics of the keyword calls made so far as a table.
+
+        The same summary is logged automatically when the library goes out of scope.
+
+        *Args:*\n
+            _metrics_file_ - path of a JSON file to write the metrics to, the library argument if not given;\n
+
+        *Example:*\n
+            |  Log Metrics Summary | ${OUTPUT DIR}${/}mq_metrics.json
+        """
+
+        self._instrumentation.log_summary(metrics_file or self.metrics_file)
+
+
+    def get_queue_handle_cache_stats(self) -> Dict[str, int]:
+        """
+         Get statistics of the open queue handle cache of the active connection.
+
+        *Returns:*\n
+            Dictionary with _size_, _max_size_, _hits_, _misses_ and _evictions_.
+
+        *Example:*\n
+            ${stats} = |  Get Queue Handle Cache Stats
+        """
+
+        if self.queue_cache is None:
+            return {'size': 0, 'max_size': self.queue_cache_size, 'hits': 0, 'misses': 0, 'evictions': 0}
+        return self.queue_cache.stats()
+
+
+    @staticmethod
+    def _iter_messages(messages: Union[Iterable[Union[str, bytes]], str]) -> Iterator[bytes]:
+        if isinstance(messages, str):
+            if os.path.isdir(messages):
+                for name in sorted(os.listdir(messages)):
+                    path = os.path.join(messages, name)
+                    if os.path.isfile(path):
+                        with open(path, 'rb') as messagefile:
+                            yield messagefile.read()
+                return
+            with open(messages, 'rb') as messagefile:
+                for line in messagefile:
+                    yield line.rstrip(b'\r\n')
+            return
+        for message in messages:
+            yield message if isinstance(message, bytes) else str(message).encode('utf-8')
+
+
+    def _put_segments(self, queue: pymqi.Queue, messagefile: Any, size: int, segment_size: int) -> None:
+        pmo = pymqi.PMO(Version=pymqi.CMQC.MQPMO_VERSION_2,
+                        Options=pymqi.CMQC.MQPMO_SYNCPOINT | pymqi.CMQC.MQPMO_LOGICAL_ORDER | pymqi.CMQC.MQPMO_FAIL_IF_QUIESCING)
+        md = pymqi.MD(Version=pymqi.CMQC.MQMD_VERSION_2)
+        for offset in range(0, size, segment_size):
+            last = offset + segment_size >= size
+            md.MsgFlags = pymqi.CMQC.MQMF_LAST_SEGMENT if last else pymqi.CMQC.MQMF_SEGMENT
+            self._put(queue, messagefile.read(segment_size), md, pmo)
+        self.connection.commit()
+
+
+    def _get_segments_into_file(self, queue: pymqi.Queue, messagefile: Any) -> int:
+        gmo = pymqi.GMO(Version=pymqi.CMQC.MQGMO_VERSION_2, MatchOptions=pymqi.CMQC.MQMO_NONE,
+                        Options=pymqi.CMQC.MQGMO_SYNCPOINT | pymqi.CMQC.MQGMO_LOGICAL_ORDER |
+                        pymqi.CMQC.MQGMO_ALL_SEGMENTS_AVAILABLE | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+        md = pymqi.MD(Version=pymqi.CMQC.MQMD_VERSION_2)
+        size = 0
+        while True:
+            segment = queue.get(None, md, gmo)
+            messagefile.write(segment)
+            size += len(segment)
+            if not md.MsgFlags & pymqi.CMQC.MQMF_SEGMENT or md.MsgFlags & pymqi.CMQC.MQMF_LAST_SEGMENT:
+                break
+        self.connection.commit()
+        return size
+
+
+    def _drain_queue(self, queue_name: str, max_messages: Optional[int] = None,
+                     max_bytes: Optional[int] = None, syncpoint: bool = False) -> Iterator[Tuple[bytes, pymqi.MD]]:
+        max_messages = None if max_messages is None else int(max_messages)
+        max_bytes = None if max_bytes is None else int(max_bytes)
+        queue = self._open_queue(queue_name, _OPEN_INPUT)
+        gmo = None
+        if syncpoint:
+            gmo = pymqi.GMO(Options=pymqi.CMQC.MQGMO_SYNCPOINT | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+        msg_cnt = 0
+        total_bytes = 0
+        while max_messages is None or msg_cnt < max_messages:
+            if max_bytes is not None and total_bytes >= max_bytes:
+                return
+            md = pymqi.MD()
+            try:
+                message = self._get(queue, queue_name, md, gmo)
+            except pymqi.MQMIError as err:
+                if err.reason == pymqi.CMQC.MQRC_NO_MSG_AVAILABLE:
+                    return
+                raise
+            msg_cnt += 1
+            total_bytes += len(message)
+            yield message, md
+
+
+    def _browse_queue(self, queue_name: str, max_messages: Optional[int] = None) -> Iterator[Tuple[bytes, pymqi.MD]]:
+        max_messages = None if max_messages is None else int(max_messages)
+        queue = self._open_queue(queue_name, _OPEN_BROWSE_INPUT)
+        options = pymqi.CMQC.MQGMO_BROWSE_FIRST
+        # A browse that failed on a too big message has moved the cursor onto it, so it is read again from there.
+        retry_gmo = pymqi.GMO(Options=pymqi.CMQC.MQGMO_BROWSE_MSG_UNDER_CURSOR | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+        msg_cnt = 0
+        while max_messages is None or msg_cnt < max_messages:
+            md = pymqi.MD()
+            gmo = pymqi.GMO(Options=options | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+            options = pymqi.CMQC.MQGMO_BROWSE_NEXT
+            try:
+                message = self._get(queue, queue_name, md, gmo, retry_gmo)
+            except pymqi.MQMIError as err:
+                if err.reason == pymqi.CMQC.MQRC_NO_MSG_AVAILABLE:
+                    return
+                raise
+            msg_cnt += 1
+            yield message, md
+
+
+    def _clear_queue(self, queue_name: str) -> Optional[int]:
+        queue_name = self._queue_name(queue_name)
+        connection = self._active_connection
+        if not connection.pcf_clear_allowed:
+            return None
+        # CLEAR QLOCAL fails while the queue is open, so our own cached handles must go first.
+        connection.queue_cache.discard_queue(queue_name)
+        try:
+            queue = pymqi.Queue(connection.qmgr, queue_name, _OPEN_INQUIRE)
+            try:
+                depth = queue.inquire(pymqi.CMQC.MQIA_CURRENT_Q_DEPTH)
+            finally:
+                queue.close()
+            connection.pcf.MQCMD_CLEAR_Q({pymqi.CMQC.MQCA_Q_NAME: queue_name.encode('utf-8')})
+            return depth
+        except pymqi.MQMIError as err:
+            if err.reason in (pymqi.CMQC.MQRC_NOT_AUTHORIZED, pymqi.CMQC.MQRC_NO_MSG_AVAILABLE):
+                # Not authorised, or no command server answering: do not try again on this connection.
+                connection.pcf_clear_allowed = False
+            self._instrumentation.debug('[PyMQI::purge_queue]:: PCF CLEAR QLOCAL not possible, falling back to gets: [%s].' % err)
+            return None
+
+
+    def _inquire_queue(self, queue_name: str, selectors: List[int]) -> Dict[int, Any]:
+        connection = self._active_connection
+        if connection.pcf_inquire_allowed and len(selectors) > 1:
+            try:
+                attributes = connection.pcf.MQCMD_INQUIRE_Q({pymqi.CMQC.MQCA_Q_NAME: self._queue_name(queue_name).encode('utf-8'),
+                                                             pymqi.CMQCFC.MQIACF_Q_ATTRS: selectors})[0]
+                if all(selector in attributes for selector in selectors):
+                    return {selector: self._attribute_value(attributes[selector]) for selector in selectors}
+            except pymqi.MQMIError as err:
+                if err.reason in (pymqi.CMQC.MQRC_NOT_AUTHORIZED, pymqi.CMQC.MQRC_NO_MSG_AVAILABLE):
+                    # Not authorised, or no command server answering: do not try again on this connection.
+                    connection.pcf_inquire_allowed = False
+                self._instrumentation.debug('[PyMQI::get_queue_attributes]:: PCF INQUIRE QUEUE not possible, falling back to MQINQ: [%s].' % err)
+        queue = self._open_queue(queue_name, _OPEN_INQUIRE)
+        return {selector: self._attribute_value(queue.inquire(selector)) for selector in selectors}
+
+
+    @staticmethod
+    def _selector(keyword: str, name: Union[str, int]) -> int:
+        if isinstance(name, int) or name.isdigit():
+            return int(name)
+        for prefix in ('', 'MQIA_', 'MQCA_'):
+            selector = getattr(pymqi.CMQC, prefix + name.upper(), None)
+            if isinstance(selector, int):
+                return selector
+        raise Exception("[PyMQI::%s] Error:" % keyword, "Unknown queue attribute '%s'." % name)
+
+
+    @staticmethod
+    def _attribute_value(value: Any) -> Any:
+        return value.decode('utf-8', 'replace').strip(' \0') if isinstance(value, bytes) else value
+
+
+    def _pcf_attributes(self, keyword: str, attributes: Dict[str, Any]) -> Dict[int, Any]:
+        # Integer attributes take numbers or CMQC names (MQPER_PERSISTENT), character attributes take text.
+        args: Dict[int, Any] = {}
+        for name, value in attributes.items():
+            selector = self._selector(keyword, name)
+            if selector >= pymqi.CMQC.MQCA_FIRST:
+                value = value if isinstance(value, bytes) else str(value).encode('utf-8')
+            elif isinstance(value, str) and not value.lstrip('-').isdigit():
+                value = getattr(pymqi.CMQC, value.upper(), None)
+                if not isinstance(value, int):
+                    raise Exception("[PyMQI::%s] Error:" % keyword, "Unknown value '%s' of queue attribute '%s'." % (attributes[name], name))
+            args[selector] = int(value) if not isinstance(value, bytes) else value
+        return args
+
+
+    def _pcf_each(self, keyword: str, command: str, queue_names: Union[List[str], str], args: Dict[int, Any],
+                  skip: Iterable[str] = (), ignore: Tuple[int, ...] = (), done: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # One command per queue over the cached PCF connection. The result maps every queue the command
+        # succeeded on to its responses; queues skipped or failing with an ignored reason map to None.
+        # It is filled into _done_ as the commands go, so a caller sees the successes also when some fail.
+        queue_names = self._queue_list(queue_names)
+        skip = set(skip)
+        done = {} if done is None else done
+        errors = []
+        try:
+            with self._instrumentation.call(keyword, ', '.join(queue_names)):
+                connection = self._active_connection
+                execute = getattr(connection.pcf, command)
+                for queue_name in queue_names:
+                    mq_name = self._queue_name(queue_name)
+                    if mq_name in skip:
+                        done[mq_name] = None
+                        continue
+                    if command in ('MQCMD_DELETE_Q', 'MQCMD_CLEAR_Q'):
+                        # The queue manager refuses to delete or clear a queue while it is open.
+                        connection.queue_cache.discard_queue(mq_name)
+                    queue_args = dict(args)
+                    queue_args[pymqi.CMQC.MQCA_Q_NAME] = mq_name.encode('utf-8')
+                    try:
+                        done[mq_name] = execute(queue_args)
+                    except pymqi.MQMIError as err:
+                        if err.reason in ignore:
+                            done[mq_name] = None
+                        else:
+                            errors.append('%s: %s' % (queue_name, err))
+                if errors:
+                    raise Exception("[PyMQI::%s] Error:" % keyword, '; '.join(errors))
+                return done
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::%s] Error:" % keyword, str(err))
+
+
+    def _known_queues(self) -> Set[str]:
+        return _KNOWN_QUEUES.setdefault(self._active_connection.key[:3], set())
+
+
+    @staticmethod
+    def _queue_list(queue_names: Union[List[str], str]) -> List[str]:
+        if isinstance(queue_names, str):
+            queue_names = [queue_name.strip() for queue_name in queue_names.split(',')]
+        return list(OrderedDict.fromkeys(queue_names))
+
+
+    def _purge_queue_by_get(self, queue_name: str, batch_size: int) -> int:
+        queue = self._open_queue(queue_name, _OPEN_INPUT)
+        gmo = pymqi.GMO(Options=pymqi.CMQC.MQGMO_NO_WAIT | pymqi.CMQC.MQGMO_SYNCPOINT |
+                        pymqi.CMQC.MQGMO_ACCEPT_TRUNCATED_MSG | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+        msg_cnt = 0
+        in_batch = 0
+        try:
+            while True:
+                try:
+                    queue.get(_PURGE_BUFFER_LENGTH, pymqi.MD(), gmo)
+                except pymqi.MQMIError as err:
+                    if err.reason == pymqi.CMQC.MQRC_NO_MSG_AVAILABLE:
+                        break
+                    if err.reason != pymqi.CMQC.MQRC_TRUNCATED_MSG_ACCEPTED:
+                        raise
+                msg_cnt += 1
+                in_batch += 1
+                if in_batch >= batch_size:
+                    self.connection.commit()
+                    in_batch = 0
+            if in_batch:
+                self.connection.commit()
+            return msg_cnt
+
+        except pymqi.MQMIError:
+            if in_batch:
+                self._backout()
+            raise
+
+
+    def _get_message_by_id(self, queue_name: str, md: pymqi.MD, match_options: int, timeout: Union[str, float],
+                           browse_first: bool) -> Optional[bytes]:
+        if not browse_first:
+            gmo = pymqi.GMO(Version=pymqi.CMQC.MQGMO_VERSION_2, MatchOptions=match_options,
+                            Options=pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+            return self._get_or_wait(self._open_queue(queue_name, _OPEN_INPUT), queue_name, timestr_to_secs(timeout), md, gmo)
+
+        queue = self._open_queue(queue_name, _OPEN_BROWSE_INPUT)
+        deadline = time.monotonic() + timestr_to_secs(timeout)
+        while True:
+            # A new GMO for every browse, as a waiting one is left with MQGMO_WAIT and its wait interval.
+            gmo = pymqi.GMO(Version=pymqi.CMQC.MQGMO_VERSION_2, MatchOptions=match_options,
+                            Options=pymqi.CMQC.MQGMO_BROWSE_FIRST | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+            if self._get_or_wait(queue, queue_name, max(0.0, deadline - time.monotonic()), md, gmo) is None:
+                return None
+            try:
+                return self._get(queue, queue_name, md, pymqi.GMO(Options=pymqi.CMQC.MQGMO_MSG_UNDER_CURSOR
+                                                                   | pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING))
+            except pymqi.MQMIError as err:
+                # Another consumer got the browsed message first, so browse for the next matching one.
+                if err.reason != pymqi.CMQC.MQRC_NO_MSG_AVAILABLE:
+                    raise
+
+
+    def _run_load(self, keyword: str, queue_name: str, reply_queue: Optional[str], round_trip: bool, workers: int,
+                  count: Optional[int], duration: Optional[Union[str, float]], rate: float, template: str,
+                  reply_timeout: float) -> Dict[str, Union[int, float]]:
+        workers = max(1, int(workers))
+        if count is None and duration is None:
+            raise Exception("[PyMQI::%s] Error:" % keyword, "Either count or duration must be given.")
+        try:
+            template.format(n=0, worker=0, timestamp=time.time())
+        except (KeyError, IndexError, ValueError, AttributeError) as err:
+            raise Exception("[PyMQI::%s] Error:" % keyword, "Invalid message template '%s': %r" % (template, err))
+        self._instrumentation.info('[PyMQI::%s]:: Start with queue_name=[%s], workers=[%s], count=[%s], duration=[%s], rate=[%s]...'
+                                   % (keyword, queue_name, workers, count, duration, rate))
+        connection = self._active_connection
+        deadline = None if duration is None else time.monotonic() + timestr_to_secs(duration)
+        interval = workers / float(rate) if float(rate) > 0 else 0.0
+        try:
+            load_workers = []
+            for index in range(workers):
+                worker_count = None if count is None else int(count) // workers + (1 if index < int(count) % workers else 0)
+                load_workers.append(_LoadWorker(connection.connect_again(), index, self._queue_name(queue_name),
+                                                None if reply_queue is None else self._queue_name(reply_queue), round_trip,
+                                                template, worker_count, deadline, interval, reply_timeout))
+        except pymqi.MQMIError as err:
+            for worker in load_workers:
+                try:
+                    worker.qmgr.disconnect()
+                except pymqi.Error:
+                    pass
+            raise Exception("[PyMQI::%s] Error:" % keyword, str(err))
+
+        with self._instrumentation.call(keyword, queue_name) as call:
+            started = time.perf_counter()
+            threads = [Thread(target=worker.run, name='PyMQI-load-%d' % worker.index, daemon=True) for worker in load_workers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            messages = sum(worker.messages for worker in load_workers)
+            sent_bytes = sum(worker.bytes for worker in load_workers)
+            call.add(sent_bytes, messages)
+            errors = [worker.error for worker in load_workers if worker.error is not None]
+            if errors and not messages:
+                raise Exception("[PyMQI::%s] Error:" % keyword, errors[0])
+        result: Dict[str, Union[int, float]] = {
+            'messages': messages, 'bytes': sent_bytes, 'errors': len(errors), 'duration': round(elapsed, 3),
+            'msgs_per_sec': round(messages / elapsed, 1) if elapsed else 0.0,
+            'bytes_per_sec': round(sent_bytes / elapsed, 1) if elapsed else 0.0}
+        self._add_latency_percentiles(result, 'put', [latency for worker in load_workers for latency in worker.put_latencies])
+        if round_trip:
+            self._add_latency_percentiles(result, 'rtt', [latency for worker in load_workers for latency in worker.round_trip_latencies])
+        for error in errors:
+            logger.warn('[PyMQI::%s]:: Worker stopped with error: [%s].' % (keyword, error))
+        self._instrumentation.info('[PyMQI::%s]:: Ended with [%d] messages, [%s] messages per second.'
+                                   % (keyword, messages, result['msgs_per_sec']))
+        return result
+
+
+    @staticmethod
+    def _add_latency_percentiles(result: Dict[str, Union[int, float]], name: str, latencies: List[float]) -> None:
+        latencies.sort()
+        for percentile in (50, 95, 99):
+            result['%s_p%d_ms' % (name, percentile)] = round(_percentile(latencies, percentile) * 1000.0, 3) if latencies else 0.0
+
+
+    def _get(self, queue: pymqi.Queue, queue_name: str, md: Optional[pymqi.MD] = None, gmo: Optional[pymqi.GMO] = None,
+             retry_gmo: Optional[pymqi.GMO] = None) -> bytes:
+        try:
+            return self._receive_buffers.get(queue, queue_name, md if md is not None else pymqi.MD(), gmo, retry_gmo)
+        except pymqi.MQMIError as err:
+            self._discard_broken_handle(queue, err)
+            raise
+
+
+    def _put(self, queue: pymqi.Queue, message: bytes, md: Optional[pymqi.MD] = None, pmo: Optional[pymqi.PMO] = None) -> None:
+        try:
+            queue.put(message, md if md is not None else pymqi.MD(), pmo if pmo is not None else pymqi.PMO())
+        except pymqi.MQMIError as err:
+            self._discard_broken_handle(queue, err)
+            raise
+
+
+    def _discard_broken_handle(self, queue: pymqi.Queue, err: pymqi.MQMIError) -> None:
+        # The next call opens the queue again instead of failing on the same dead handle.
+        if err.reason in _HANDLE_ERROR_REASONS and self._connections:
+            self._connections.current.queue_cache.discard(queue)
+
+
+    def _get_or_wait(self, queue: pymqi.Queue, queue_name: str, timeout: float, md: pymqi.MD, gmo: pymqi.GMO) -> Optional[bytes]:
+        if timeout > 0:
+            return self._wait_get(queue, queue_name, time.monotonic() + timeout, md, gmo)
+        try:
+            return self._get(queue, queue_name, md, gmo)
+        except pymqi.MQMIError as err:
+            if err.reason == pymqi.CMQC.MQRC_NO_MSG_AVAILABLE:
+                return None
+            raise
+
+
+    @staticmethod
+    def _to_mq_id(value: Union[str, bytes]) -> bytes:
+        if isinstance(value, bytes):
+            return value.ljust(24, b'\0')
+        if len(value) == 48:
+            try:
+                return bytes.fromhex(value)
+            except ValueError:
+                pass
+        return value.encode('utf-8').ljust(24, b'\0')
+
+
+    def _wait_cancelled(self) -> bool:
+        # A cancel is kept until a wait notices it, so one given just before the wait starts is not lost.
+        if not self._cancel_waits.is_set():
+            return False
+        self._cancel_waits.clear()
+        return True
+
+
+    def _wait_get(self, queue: pymqi.Queue, queue_name: str, deadline: float, md: Optional[pymqi.MD] = None,
+                  gmo: Optional[pymqi.GMO] = None) -> Optional[bytes]:
+        # The wait is sliced, so a cancellation or an expiring Robot timeout is noticed in time.
+        gmo = gmo if gmo is not None else pymqi.GMO(Options=pymqi.CMQC.MQGMO_FAIL_IF_QUIESCING)
+        gmo.Options |= pymqi.CMQC.MQGMO_WAIT
+        while not self._wait_cancelled():
+            remaining = deadline - time.monotonic()
+            robot_remaining = self._robot_time_left()
+            if robot_remaining is not None:
+                remaining = min(remaining, robot_remaining)
+            if remaining <= 0:
+                break
+            gmo.WaitInterval = max(1, int(min(remaining, self.WAIT_SLICE) * 1000))
+            try:
+                return self._get(queue, queue_name, md, gmo)
+            except pymqi.MQMIError as err:
+                if err.reason != pymqi.CMQC.MQRC_NO_MSG_AVAILABLE:
+                    raise
+        return None
+
+
+    def _fan_in(self, keyword: str, queue_names: Union[List[str], str], needed: Optional[int], timeout: Union[str, float],
+                as_objects: bool) -> List[Dict[str, Any]]:
+        queue_names = self._queue_list(queue_names)
+        needed = len(queue_names) if needed is None else needed
+        try:
+            with self._instrumentation.call(keyword, ', '.join(queue_names)) as call:
+                started = time.monotonic()
+                deadline = started + timestr_to_secs(timeout)
+                receiver = _FanInReceiver(self._active_connection.connect_again,
+                                          [(queue_name, self._queue_name(queue_name)) for queue_name in queue_names],
+                                          needed, self.WAIT_SLICE, self.RECEIVE_BUFFER_PERCENTILE, self._codecs)
+                complete = False
+                receiver.start()
+                try:
+                    while not self._wait_cancelled():
+                        remaining = deadline - time.monotonic()
+                        robot_remaining = self._robot_time_left()
+                        if robot_remaining is not None:
+                            remaining = min(remaining, robot_remaining)
+                        if remaining <= 0 or receiver.wait(min(remaining, self.WAIT_SLICE)):
+                            break
+                    complete = len(receiver.results) >= needed and not receiver.errors
+                finally:
+                    receiver.finish(complete)
+                if receiver.errors:
+                    raise Exception("[PyMQI::%s] Error:" % keyword, '; '.join('%s: %s' % error for error in receiver.errors.items()))
+                if not complete:
+                    arrived = set(result['queue'] for result in receiver.results)
+                    missing = ', '.join("'%s'" % queue_name for queue_name in queue_names if queue_name not in arrived)
+                    raise Exception("[PyMQI::%s] Error:" % keyword, "No message arrived on %s within %.3f seconds."
+                                    % (missing, time.monotonic() - started))
+                for result in receiver.results:
+                    call.add(len(result['message'].payload))
+                    if not as_objects:
+                        result['message'] = str(result['message'])
+                return receiver.results
+
+        except pymqi.MQMIError as err:
+            raise Exception("[PyMQI::%s] Error:" % keyword, str(err))
+
+
+    @staticmethod
+    def _robot_time_left() -> Optional[float]:
+        context = EXECUTION_CONTEXTS.current
+        if context is None:
+            return None
+        remaining = [timeout.time_left() for timeout in getattr(context, 'timeouts', ())
+                     if isinstance(timeout, (KeywordTimeout, TestTimeout)) and getattr(timeout, 'active', True)]
+        return min(remaining) if remaining else None
+
+
+    def _get_listener(self, keyword: str, queue_name: str) -> _QueueListener:
+        with self._lock:
+            listener = self._listeners.get(queue_name)
+        if listener is None:
+            raise Exception("[PyMQI::%s] Error:" % keyword, "No listener is running on '%s'." % queue_name)
+        return listener
+
+
+    def _stop_listeners(self) -> None:
+        with self._lock:
+            listeners = list(self._listeners.items())
+            self._listeners.clear()
+        for queue_name, listener in listeners:
+            listener.stop()
+            if listener.error is not None:
+                logger.warn('[PyMQI]:: Listener on [%s] stopped with error: [%s].' % (queue_name, listener.error))
+
+
+    def _connection_lost(self, err: Exception) -> None:
+        if self.RECONNECT_MODES[self.reconnect] is None or getattr(err, 'reason', None) not in _CONNECTION_LOST_REASONS:
+            return
+        connections = self._connections
+        if connections and connections.current.broken_since is None:
+            connections.current.broken_since = time.monotonic()
+            logger.warn('[PyMQI]:: Connection to [%s] lost: [%s], reconnecting on the next keyword.' % (connections.current.key[0], err))
+
+
+    def _reconnect(self, connection: _MQConnection) -> None:
+        # The timeout counts from when the loss was noticed, so after it expired every keyword tries once.
+        broken_since = connection.broken_since
+        deadline = broken_since + self.reconnect_timeout
+        delay = self.reconnect_backoff
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                connection.reconnect()
+                break
+            except pymqi.MQMIError as err:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._instrumentation.reconnected(None)
+                    raise Exception("[PyMQI] Error:", "Could not reconnect to '%s' within %.1f seconds: %s"
+                                    % (connection.key[0], self.reconnect_timeout, err))
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, self.RECONNECT_BACKOFF_MAX)
+        outage = time.monotonic() - broken_since
+        self._instrumentation.reconnected(outage)
+        self._instrumentation.info('[PyMQI]:: Reconnected to [%s] after [%.3f] seconds and [%d] attempts.'
+                                   % (connection.key[0], outage, attempts))
+
+
+    def _backout(self) -> None:
+        try:
+            self.connection.backout()
+        except pymqi.MQMIError as err:
+            logger.warn('[PyMQI]:: Backout failed: [%s].' % err)
+
+
+    @property
+    def _active_connection(self) -> _MQConnection:
+        connections = self._connections
+        if not connections and self.execution_mode == 'thread':
+            # A new thread gets its own connection like the last one opened, on its first MQ call.
+            with self._lock:
+                template = self._last_connection
+            if template is not None and template.is_alive:
+                connections.register(_MQConnection(template.connect_again(), template.key, self.queue_cache_size,
+                                                   template._password, template.options, template.ccdt_url))
+        if not connections and self.lazy_connect and not self._disconnected and self.qmgr is not None:
+            self._instrumentation.info('[PyMQI]:: No open connection, connecting with the default config...')
+            self.connect_in_client_mode()
+        connection = connections.current
+        if connections and connection.broken_since is not None:
+            self._reconnect(connection)
+        return connection
+
+
+    @property
+    def connection(self) -> pymqi.QueueManager:
+        return self._active_connection.qmgr
+
+
+    @property
+    def queue_cache(self) -> Optional[_QueueHandleCache]:
+        if not self._connections:
+            return None
+        return self._connections.current.queue_cache
+
+
+    @property
+    def _connections(self) -> ConnectionCache:
+        if self.execution_mode == 'shared':
+            return self._shared_connections
+        connections = getattr(self._thread_connections, 'connections', None)
+        if connections is None:
+            connections = self._thread_connections.connections = ConnectionCache('No open IBM MQ connection.')
+            with self._lock:
+                ended = [cache for thread, cache in self._connection_caches if thread is not None and not thread.is_alive()]
+                self._connection_caches = [(thread, cache) for thread, cache in self._connection_caches
+                                           if thread is None or thread.is_alive()]
+                self._connection_caches.append((current_thread(), connections))
+            for cache in ended:
+                self._close_cache(cache)
+        return connections
+
+
+    @staticmethod
+    def _close_cache(connections: ConnectionCache) -> None:
+        # Connections of threads that have ended, nobody is left to report their errors to.
+        for connection in connections:
+            try:
+                connection.close()
+            except pymqi.MQMIError:
+                pass
+        connections.empty_cache()
+
+
+    def _queue_name(self, queue_name: str) -> str:
+        if self.queue_partition is None:
+            return queue_name
+        partitioned = self._partitioned_queues.get(queue_name)
+        if partitioned is None:
+            if self._pabot_worker is None:
+                try:
+                    worker = BuiltIn().get_variable_value('${PABOTQUEUEINDEX}')
+                except RobotNotRunningError:
+                    worker = None
+                self._pabot_worker = '' if worker is None else str(worker)
+            if not self._pabot_worker:
+                return queue_name
+            partitioned = self.queue_partition.format(queue=queue_name, worker=self._pabot_worker)
+            with self._lock:
+                partitioned = self._partitioned_queues.setdefault(queue_name, partitioned)
+        return partitioned
+
+
+    def _open_queue(self, queue_name: str, open_options: int) -> pymqi.Queue:
+        return self._active_connection.queue_cache.get(self._queue_name(queue_name), open_options)
+
+
+    def _connection_key(self, qmgr: str, channel: Optional[str], host: Optional[str], port: Optional[int],
+                        user: Optional[str]) -> Tuple[str, Optional[str], Optional[str], Optional[str]]:
+        if host is None and port is None and self.ccdt is not None:
+            return qmgr, None, None, user
+        return qmgr, channel, _conn_info(host, port), user
+
+
+    def _reuse_connection(self, key: Tuple[str, Optional[str], Optional[str], Optional[str]], alias: Optional[str]) -> Optional[int]:
+        for index, connection in enumerate(self._connections, start=1):
+            if connection.key == key and connection.is_alive:
+                self._connections.switch(index)
+                self._disconnected = False
+                if alias is not None:
+                    self._forget_reused_alias(alias)
+                    connection.aliases.add(alias)
+                self._instrumentation.debug('[PyMQI]:: Reusing live connection [%s].' % index)
+                return index
+        return None
+
+
+    def _register_connection(self, qmgr: pymqi.QueueManager, key: Tuple[str, Optional[str], Optional[str], Optional[str]],
+                             alias: Optional[str], password: Optional[str] = None) -> int:
+        connection = _MQConnection(qmgr, key, self.queue_cache_size, password, self.RECONNECT_MODES[self.reconnect] or 0,
+                                   self._ccdt_url)
+        with self._lock:
+            self._last_connection = connection
+            self._disconnected = False
+        if alias is not None:
+            self._forget_reused_alias(alias)
+        return self._connections.register(connection, alias)
+
+
+    def _reused_alias_index(self, alias: Union[str, int]) -> Optional[int]:
+        for index, connection in enumerate(self._connections, start=1):
+            if alias in connection.aliases:
+                return index
+        return None
+
+
+    def _forget_reused_alias(self, alias: str) -> None:
+        # The alias now names another connection.
+        for connection in self._connections:
+            connection.aliases.discard(alias)
+
+
+_IMPORT_TIMES['PyMQI'] = time.perf_counter() - _IMPORT_STARTED
 
 
 """
@@ -0,0 +1,129 @@
+# Offline benchmark of the PyMQI keywords against the in-process fake queue manager.
+#
+# Usage:
+#   python PyMQI_bench.py                      - run and compare with PyMQI_bench_baseline.json if it exists
+#   python PyMQI_bench.py --save               - run and store the results as the new baseline
+#   python PyMQI_bench.py --tolerance 0.5      - allowed slowdown against the baseline (default 0.25 = 25%)
+#
+# The exit code is 1 if any case is slower than the baseline by more than the tolerance.
+# The committed PyMQI_bench_baseline.json was recorded on a development machine, timings are
+# machine-specific, so regenerate it with --save before comparing on another host.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import PyMQI_fake
+PyMQI_fake.install()
+
+import PyMQI
+
+QMGR = 'BENCH.QM'
+QUEUE = 'BENCH.QUEUE'
+COUNTS = (100, 1000)
+SIZES = (64, 4096, 65536)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PyMQI_bench_baseline.json')
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - started
+
+
+def fill(pq, count, payload):
+    pq.put_messages([payload] * count, QUEUE, batch_size=count)
+
+
+def run_case(pq, workdir, keyword, count, size):
+    payload = 'x' * size
+    in_file = os.path.join(workdir, 'bench_input.msg')
+    out_file = os.path.join(workdir, 'bench_output.msg')
+    with open(in_file, 'w') as messagefile:
+        messagefile.write(payload)
+    pq.purge_queue(QUEUE)
+
+    if keyword == 'put_message':
+        return timed(lambda: [pq.put_message(payload, QUEUE) for _ in range(count)])
+    if keyword == 'put_messages':
+        return timed(pq.put_messages, [payload] * count, QUEUE)
+    if keyword == 'put_message_from_file':
+        return timed(lambda: [pq.put_message_from_file(in_file, QUEUE) for _ in range(count)])
+
+    fill(pq, count, payload)
+    if keyword == 'get_message':
+        return timed(lambda: [pq.get_message(QUEUE) for _ in range(count)])
+    if keyword == 'get_all_messages':
+        return timed(pq.get_all_messages, QUEUE, as_list=True)
+    if keyword == 'get_message_into_file':
+        return timed(lambda: [pq.get_message_into_file(QUEUE, out_file) for _ in range(count)])
+    if keyword == 'get_all_messages_into_file':
+        return timed(pq.get_all_messages_into_file, QUEUE, out_file)
+    if keyword == 'purge_queue':
+        return timed(pq.purge_queue, QUEUE)
+    if keyword == 'purge_queue_by_get':
+        return timed(pq.purge_queue, QUEUE, use_pcf=False)
+    raise ValueError('Unknown benchmark keyword: %s' % keyword)
+
+
+KEYWORDS = ('put_message', 'put_messages', 'put_message_from_file', 'get_message', 'get_all_messages',
+            'get_message_into_file', 'get_all_messages_into_file', 'purge_queue', 'purge_queue_by_get')
+
+
+def run(repeat):
+    results = {}
+    PyMQI_fake.reset()
+    with tempfile.TemporaryDirectory() as workdir:
+        pq = PyMQI.PyMQI()
+        pq.connect_in_client_mode(QMGR, 'BENCH.SVRCONN', 'localhost', 1414)
+        for keyword in KEYWORDS:
+            for count in COUNTS:
+                for size in SIZES:
+                    elapsed = min(run_case(pq, workdir, keyword, count, size) for _ in range(repeat))
+                    results['%s/%d/%d' % (keyword, count, size)] = elapsed
+        pq.disconnect_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the PyMQI keywords.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the fastest one counts')
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as baselinefile:
+            baseline = json.load(baselinefile)
+
+    regressions = 0
+    print('%-46s %12s %12s %12s %8s' % ('case (keyword/count/size)', 'seconds', 'msgs/sec', 'baseline', 'change'))
+    for case, elapsed in results.items():
+        count = int(case.split('/')[1])
+        line = '%-46s %12.6f %12.0f' % (case, elapsed, count / elapsed if elapsed else 0)
+        if case in baseline:
+            change = elapsed / baseline[case] - 1.0 if baseline[case] else 0.0
+            flag = ''
+            if change > args.tolerance:
+                regressions += 1
+                flag = '  REGRESSION'
+            line += ' %12.6f %+7.0f%%%s' % (baseline[case], change * 100, flag)
+        print(line)
+
+    if args.save:
+        with open(args.baseline, 'w') as baselinefile:
+            json.dump(results, baselinefile, indent=2, sort_keys=True)
+        print('Baseline saved to [', args.baseline, '].')
+    if regressions:
+        print('[', regressions, '] cases are slower than the baseline by more than', '%d%%.' % (args.tolerance * 100))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,772 @@
+# -*- coding: utf-8 -*-
+"""
+In-process fake of the parts of pymqi used by the PyMQI library.
+
+It keeps queues in memory, so the library can be exercised and benchmarked without a queue
+manager or the native MQ client. Put, get, waiting gets, MsgId / CorrelId matching, syncpoint,
+browse cursors, truncation, temporary dynamic queues, queue attribute inquiry, PCF CLEAR QLOCAL
+and INQUIRE / DEFINE / ALTER / DELETE QUEUE, MQMD pack / unpack, publishing to managed, durable or non-durable
+subscriptions, and broken connections with queue manager outages (`break_connections`) are
+supported.
+
+Usage, before the library is imported:
+
+| import PyMQI_fake
+| PyMQI_fake.install()
+| import PyMQI
+"""
+import itertools
+import pickle
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+
+class _Constants(object):
+
+    def __init__(self, **constants: Any) -> None:
+        self.__dict__.update(constants)
+
+
+CMQC = _Constants(
+    MQOO_INPUT_AS_Q_DEF=1, MQOO_INPUT_SHARED=2, MQOO_INPUT_EXCLUSIVE=4, MQOO_BROWSE=8, MQOO_OUTPUT=16,
+    MQOO_INQUIRE=32, MQOO_SET=64, MQOO_SET_ALL_CONTEXT=2048, MQOO_FAIL_IF_QUIESCING=8192,
+    MQGMO_NO_WAIT=0, MQGMO_WAIT=1, MQGMO_SYNCPOINT=2, MQGMO_NO_SYNCPOINT=4, MQGMO_BROWSE_FIRST=16,
+    MQGMO_BROWSE_NEXT=32, MQGMO_ACCEPT_TRUNCATED_MSG=64, MQGMO_MSG_UNDER_CURSOR=256, MQGMO_LOCK=512, MQGMO_BROWSE_MSG_UNDER_CURSOR=2048,
+    MQGMO_FAIL_IF_QUIESCING=8192, MQGMO_CONVERT=16384, MQGMO_LOGICAL_ORDER=32768, MQGMO_COMPLETE_MSG=65536,
+    MQGMO_ALL_MSGS_AVAILABLE=131072, MQGMO_ALL_SEGMENTS_AVAILABLE=262144,
+    MQGMO_VERSION_1=1, MQGMO_VERSION_2=2, MQWI_UNLIMITED=-1,
+    MQMO_NONE=0, MQMO_MATCH_MSG_ID=1, MQMO_MATCH_CORREL_ID=2,
+    MQPMO_SYNCPOINT=2, MQPMO_NO_SYNCPOINT=4, MQPMO_NEW_MSG_ID=64, MQPMO_NEW_CORREL_ID=128, MQPMO_SET_ALL_CONTEXT=2048,
+    MQPMO_FAIL_IF_QUIESCING=8192, MQPMO_LOGICAL_ORDER=32768, MQPMO_VERSION_1=1, MQPMO_VERSION_2=2,
+    MQMD_VERSION_1=1, MQMD_VERSION_2=2,
+    MQMF_NONE=0, MQMF_SEGMENTATION_ALLOWED=1, MQMF_SEGMENT=2, MQMF_LAST_SEGMENT=4, MQMF_MSG_IN_GROUP=8,
+    MQMF_LAST_MSG_IN_GROUP=16,
+    MQMT_REQUEST=1, MQMT_REPLY=2, MQMT_DATAGRAM=8, MQPER_NOT_PERSISTENT=0, MQPER_PERSISTENT=1,
+    MQPER_PERSISTENCE_AS_Q_DEF=2,
+    MQMI_NONE=b'\0' * 24, MQCI_NONE=b'\0' * 24, MQFMT_NONE=b'        ', MQFMT_STRING=b'MQSTR   ',
+    MQCCSI_Q_MGR=0,
+    MQCO_NONE=0, MQCO_DELETE=1, MQCO_DELETE_PURGE=2, MQCO_KEEP_SUB=4, MQCO_REMOVE_SUB=8,
+    MQSO_NONE=0, MQSO_NON_DURABLE=0, MQSO_ALTER=1, MQSO_CREATE=2, MQSO_RESUME=4, MQSO_DURABLE=8, MQSO_MANAGED=32,
+    MQSO_FAIL_IF_QUIESCING=8192, MQOT_Q=1, MQOT_TOPIC=8,
+    MQCNO_RECONNECT=16777216, MQCNO_RECONNECT_DISABLED=33554432, MQCNO_RECONNECT_Q_MGR=67108864,
+    MQCC_OK=0, MQCC_WARNING=1, MQCC_FAILED=2,
+    MQRC_NONE=0, MQRC_CONNECTION_BROKEN=2009, MQRC_GET_INHIBITED=2016, MQRC_HCONN_ERROR=2018, MQRC_HOBJ_ERROR=2019,
+    MQRC_NO_MSG_AVAILABLE=2033, MQRC_NOT_AUTHORIZED=2035, MQRC_OBJECT_IN_USE=2042, MQRC_PUT_INHIBITED=2051, MQRC_Q_MGR_NAME_ERROR=2058,
+    MQRC_Q_MGR_NOT_AVAILABLE=2059, MQRC_TRUNCATED_MSG_ACCEPTED=2079, MQRC_TRUNCATED_MSG_FAILED=2080,
+    MQRC_Q_NOT_EMPTY=2055, MQRC_SELECTOR_ERROR=2067, MQRC_UNKNOWN_OBJECT_NAME=2085, MQRC_Q_MGR_QUIESCING=2161, MQRC_Q_MGR_STOPPING=2162,
+    MQRC_CONNECTION_QUIESCING=2202, MQRC_NO_SUBSCRIPTION=2428, MQRC_SUBSCRIPTION_IN_USE=2429,
+    MQRC_SUB_ALREADY_EXISTS=2432, MQRC_RECONNECT_FAILED=2548,
+    MQIA_CURRENT_Q_DEPTH=3, MQIA_DEF_INPUT_OPEN_OPTION=4, MQIA_DEF_PERSISTENCE=5, MQIA_INHIBIT_GET=9, MQIA_INHIBIT_PUT=10,
+    MQIA_MAX_MSG_LENGTH=13, MQIA_MAX_Q_DEPTH=15, MQIA_OPEN_INPUT_COUNT=17, MQIA_OPEN_OUTPUT_COUNT=18,
+    MQIA_Q_TYPE=20, MQCA_Q_DESC=2013, MQCA_Q_MGR_NAME=2015, MQCA_Q_NAME=2016,
+    MQQT_LOCAL=1, MQQT_MODEL=2, MQQA_GET_ALLOWED=0, MQQA_GET_INHIBITED=1, MQQA_PUT_ALLOWED=0, MQQA_PUT_INHIBITED=1,
+    MQCA_FIRST=2001,
+)
+
+CMQCFC = _Constants(
+    MQCMD_CHANGE_Q=8, MQCMD_CLEAR_Q=9, MQCMD_CREATE_Q=11, MQCMD_DELETE_Q=12, MQCMD_INQUIRE_Q=13,
+    MQIACF_Q_ATTRS=1002, MQIACF_REPLACE=1006, MQIACF_PURGE=1007, MQIACF_ALL=1009,
+    MQRP_NO=0, MQRP_YES=1, MQPO_NO=0, MQPO_YES=1, MQRCCF_COMMAND_FAILED=3008, MQRCCF_OBJECT_ALREADY_EXISTS=4001,
+)
+
+CMQXC = _Constants(MQCHT_CLNTCONN=6, MQXPT_TCP=2)
+
+
+class Error(Exception):
+    pass
+
+
+class PYIFError(Error):
+    pass
+
+
+class MQMIError(Error):
+
+    def __init__(self, comp: int, reason: int, **kw: Any) -> None:
+        super(MQMIError, self).__init__(comp, reason)
+        self.comp = comp
+        self.reason = reason
+        for name, value in kw.items():
+            setattr(self, name, value)
+
+    def __str__(self) -> str:
+        names = [name for name, value in vars(CMQC).items() if name.startswith('MQRC_') and value == self.reason]
+        return 'MQI Error. Comp: %d, Reason %d: %s: %s' % (self.comp, self.reason, 'WARNING' if self.comp == CMQC.MQCC_WARNING else 'FAILED',
+                                                          names[0] if names else 'MQRC_%d' % self.reason)
+
+
+class _Opts(object):
+
+    """
+    Attribute bag standing in for the pymqi MQ structures (MD, GMO, PMO, OD, ...).
+    """
+
+    _defaults: Dict[str, Any] = {}
+
+    def __init__(self, **kw: Any) -> None:
+        self.__dict__.update(self._defaults)
+        self.__dict__.update(kw)
+
+    def __getitem__(self, name: str) -> Any:
+        return self.__dict__[name]
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        self.__dict__[name] = value
+
+    def set_vs(self, name: str, value: Any, *args: Any) -> None:
+        self.__dict__[name] = value
+
+    def get_vs(self, name: str) -> Any:
+        return self.__dict__[name]
+
+    def copy(self) -> '_Opts':
+        return type(self)(**self.__dict__)
+
+    def pack(self) -> bytes:
+        return pickle.dumps(self.__dict__)
+
+    def unpack(self, buff: bytes) -> '_Opts':
+        self.__dict__.update(pickle.loads(buff))
+        return self
+
+
+class MD(_Opts):
+    _defaults = dict(Version=1, Report=0, MsgType=CMQC.MQMT_DATAGRAM, Expiry=-1, Feedback=0, Encoding=273,
+                     CodedCharSetId=0, Format=CMQC.MQFMT_NONE, Priority=-1, Persistence=CMQC.MQPER_PERSISTENCE_AS_Q_DEF,
+                     MsgId=CMQC.MQMI_NONE, CorrelId=CMQC.MQCI_NONE, BackoutCount=0, ReplyToQ=b'', ReplyToQMgr=b'',
+                     UserIdentifier=b'', AccountingToken=b'', ApplIdentityData=b'', PutApplType=0,
+                     PutApplName=b'', PutDate=b'', PutTime=b'', ApplOriginData=b'', GroupId=b'\0' * 24,
+                     MsgSeqNumber=1, Offset=0, MsgFlags=0, OriginalLength=-1)
+
+
+class GMO(_Opts):
+    _defaults = dict(Version=1, Options=CMQC.MQGMO_NO_WAIT, WaitInterval=0, MatchOptions=CMQC.MQMO_MATCH_MSG_ID | CMQC.MQMO_MATCH_CORREL_ID)
+
+
+class PMO(_Opts):
+    _defaults = dict(Version=1, Options=0)
+
+
+class OD(_Opts):
+    _defaults = dict(ObjectType=1, ObjectName=b'', ObjectQMgrName=b'', DynamicQName=b'AMQ.*')
+
+
+class CNO(_Opts):
+    _defaults = dict(Options=0)
+
+
+class CD(_Opts):
+    _defaults = dict(ChannelName=b'', ConnectionName=b'', ChannelType=CMQXC.MQCHT_CLNTCONN, TransportType=CMQXC.MQXPT_TCP)
+
+
+class SCO(_Opts):
+    pass
+
+
+class CSP(_Opts):
+    pass
+
+
+class SD(_Opts):
+    _defaults = dict(Options=0, ObjectName=b'', ObjectString=b'', SubName=b'')
+
+
+def _text(value: Union[str, bytes, None]) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    return value.strip().rstrip('\0')
+
+
+class _Message(object):
+
+    __slots__ = ('md', 'body')
+
+    def __init__(self, md: MD, body: bytes) -> None:
+        self.md = md
+        self.body = body
+
+
+class _QueueState(object):
+
+    def __init__(self, name: str, temporary: bool = False) -> None:
+        self.name = name
+        self.temporary = temporary
+        self.messages: Deque[_Message] = deque()
+        self.open_handles = 0
+        self.open_input = 0
+        self.open_output = 0
+        self.open_exclusive = 0
+        self.attributes: Dict[int, Any] = {
+            CMQC.MQIA_Q_TYPE: CMQC.MQQT_LOCAL, CMQC.MQIA_MAX_Q_DEPTH: 5000, CMQC.MQIA_MAX_MSG_LENGTH: 4194304,
+            CMQC.MQIA_DEF_PERSISTENCE: CMQC.MQPER_NOT_PERSISTENT, CMQC.MQIA_INHIBIT_GET: 0, CMQC.MQIA_INHIBIT_PUT: 0,
+            CMQC.MQIA_DEF_INPUT_OPEN_OPTION: CMQC.MQOO_INPUT_EXCLUSIVE,
+            CMQC.MQCA_Q_DESC: b''}
+
+    def attribute(self, selector: int) -> Any:
+        if selector == CMQC.MQIA_CURRENT_Q_DEPTH:
+            return len(self.messages)
+        if selector == CMQC.MQIA_OPEN_INPUT_COUNT:
+            return self.open_input
+        if selector == CMQC.MQIA_OPEN_OUTPUT_COUNT:
+            return self.open_output
+        if selector == CMQC.MQCA_Q_NAME:
+            return self.name.encode('utf-8')
+        if selector not in self.attributes:
+            raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_SELECTOR_ERROR)
+        return self.attributes[selector]
+
+    def count_open(self, open_opts: int, delta: int) -> None:
+        # Input opens share the queue unless one of them is exclusive, as with DEFSOPT(EXCL) for MQOO_INPUT_AS_Q_DEF.
+        exclusive = bool(open_opts & CMQC.MQOO_INPUT_EXCLUSIVE or open_opts & CMQC.MQOO_INPUT_AS_Q_DEF
+                         and self.attributes[CMQC.MQIA_DEF_INPUT_OPEN_OPTION] == CMQC.MQOO_INPUT_EXCLUSIVE)
+        if open_opts & (CMQC.MQOO_INPUT_AS_Q_DEF | CMQC.MQOO_INPUT_SHARED | CMQC.MQOO_INPUT_EXCLUSIVE):
+            if delta > 0 and (self.open_exclusive or exclusive and self.open_input):
+                raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_OBJECT_IN_USE)
+            self.open_input += delta
+            if exclusive:
+                self.open_exclusive += delta
+        self.open_handles += delta
+        if open_opts & CMQC.MQOO_OUTPUT:
+            self.open_output += delta
+
+
+class _SubscriptionState(object):
+
+    def __init__(self, name: str, topic: str, durable: bool, queue: _QueueState) -> None:
+        self.name = name
+        self.topic = topic
+        self.durable = durable
+        self.queue = queue
+        self.in_use = False
+
+    def matches(self, topic: str) -> bool:
+        # MQ topic wildcards: '#' matches any number of levels, '+' exactly one.
+        pattern = self.topic.split('/')
+        levels = topic.split('/')
+        for index, part in enumerate(pattern):
+            if part == '#':
+                return True
+            if index >= len(levels) or (part != '+' and part != levels[index]):
+                return False
+        return len(pattern) == len(levels)
+
+
+class _QueueManagerState(object):
+
+    """
+    Queues and subscriptions of one fake queue manager, shared by every connection to it.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.queues: Dict[str, _QueueState] = {}
+        self.subscriptions: Dict[str, _SubscriptionState] = {}
+        self.model_queues = {'SYSTEM.DEFAULT.MODEL.QUEUE'}
+        self.condition = threading.Condition()
+        self.auto_define = True
+        self.generation = 0
+        self.unavailable_until = 0.0
+
+    def queue(self, name: str) -> _QueueState:
+        state = self.queues.get(name)
+        if state is None:
+            if not self.auto_define:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_UNKNOWN_OBJECT_NAME)
+            state = self.queues[name] = _QueueState(name)
+        return state
+
+
+_queue_managers: Dict[str, _QueueManagerState] = {}
+_registry_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+def _state(qmgr_name: str) -> _QueueManagerState:
+    with _registry_lock:
+        state = _queue_managers.get(qmgr_name)
+        if state is None:
+            state = _queue_managers[qmgr_name] = _QueueManagerState(qmgr_name)
+        return state
+
+
+def _new_id() -> bytes:
+    return ('AMQ FAKE%016d' % next(_ids)).encode('ascii')
+
+
+def reset() -> None:
+    """
+    Forget all fake queue managers and their messages.
+    """
+    with _registry_lock:
+        _queue_managers.clear()
+
+
+def depth(qmgr_name: str, queue_name: str) -> int:
+    """
+    Current depth of a fake queue, for assertions that must not consume messages.
+    """
+    state = _state(qmgr_name)
+    with state.condition:
+        return len(state.queue(queue_name).messages)
+
+
+def break_connections(qmgr_name: str, outage: float = 0.0) -> None:
+    """
+    Break every connection to a fake queue manager, which refuses new ones for _outage_ seconds.
+    """
+    state = _state(qmgr_name)
+    with state.condition:
+        state.generation += 1
+        state.unavailable_until = time.monotonic() + outage
+        state.condition.notify_all()
+
+
+def install() -> None:
+    """
+    Make `import pymqi` resolve to this fake, including an already imported PyMQI library.
+    """
+    module = sys.modules[__name__]
+    sys.modules['pymqi'] = module
+    library = sys.modules.get('PyMQI')
+    if library is not None:
+        library.pymqi = module
+
+
+class QueueManager(object):
+
+    def __init__(self, name: Union[str, bytes, None] = None, disconnect_on_exit: bool = True) -> None:
+        self._state: Optional[_QueueManagerState] = None
+        self._puts: List[Tuple[_QueueState, _Message]] = []
+        self._gets: List[Tuple[_QueueState, _Message]] = []
+        self._subscriptions: List[_SubscriptionState] = []
+        self._generation = 0
+        self.connect_options = 0
+        if name is not None:
+            self.connect(name)
+
+    def connect(self, name: Union[str, bytes]) -> None:
+        state = _state(_text(name))
+        if time.monotonic() < state.unavailable_until:
+            raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_Q_MGR_NOT_AVAILABLE)
+        self._state = state
+        self._generation = state.generation
+
+    def connect_tcp_client(self, name: Union[str, bytes], cd: Any, channel: Any, conn_info: Any,
+                           user: Any = None, password: Any = None) -> None:
+        self.connect(name)
+
+    def connect_with_options(self, name: Union[str, bytes], *args: Any, **kwargs: Any) -> None:
+        self.connect(name)
+        self.connect_options = kwargs.get('opts', 0)
+
+    def disconnect(self) -> None:
+        self._check()
+        # A normal MQDISC commits the unit of work and ends the non-durable subscriptions.
+        self.commit()
+        for subscription in list(self._subscriptions):
+            _end_subscription(self._state, subscription, remove=not subscription.durable)
+        self._subscriptions = []
+        self._state = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self._state is not None
+
+    def get_handle(self) -> int:
+        self._check()
+        return id(self)
+
+    getHandle = get_handle
+
+    def inquire(self, attribute: int) -> Any:
+        state = self._check()
+        if attribute == CMQC.MQCA_Q_MGR_NAME:
+            return state.name.encode('utf-8').ljust(48)
+        return 0
+
+    def commit(self) -> None:
+        state = self._check()
+        with state.condition:
+            for queue, message in self._puts:
+                queue.messages.append(message)
+            self._puts = []
+            self._gets = []
+            state.condition.notify_all()
+
+    def backout(self) -> None:
+        state = self._check()
+        with state.condition:
+            for queue, message in reversed(self._gets):
+                message.md.BackoutCount += 1
+                queue.messages.appendleft(message)
+            self._puts = []
+            self._gets = []
+            state.condition.notify_all()
+
+    def _check(self) -> _QueueManagerState:
+        if self._state is None:
+            raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_HCONN_ERROR)
+        if self._generation != self._state.generation:
+            raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_CONNECTION_BROKEN)
+        return self._state
+
+
+def connect(queue_manager: Union[str, bytes], channel: Any = None, conn_info: Any = None, user: Any = None,
+            password: Any = None, **kwargs: Any) -> QueueManager:
+    return QueueManager(queue_manager)
+
+
+class Queue(object):
+
+    def __init__(self, queue_manager: QueueManager, q_desc: Union[str, bytes, OD, None] = None,
+                 open_opts: Optional[int] = None) -> None:
+        self._qmgr = queue_manager
+        self._desc = q_desc
+        self._open_opts = open_opts
+        self._queue: Optional[_QueueState] = None
+        self._cursor: Optional[_Message] = None
+        if q_desc is not None and open_opts is not None:
+            self._open(open_opts)
+
+    def _open(self, open_opts: int) -> _QueueState:
+        state = self._qmgr._check()
+        with state.condition:
+            if isinstance(self._desc, OD) and _text(self._desc.ObjectName) in state.model_queues:
+                # Opening a model queue creates a temporary dynamic queue, named back into the OD.
+                name = _text(self._desc.DynamicQName).replace('*', '%016X' % next(_ids))
+                queue = state.queues[name] = _QueueState(name, temporary=True)
+                self._desc.ObjectName = name.encode('utf-8').ljust(48)
+            else:
+                name = _text(self._desc.ObjectName) if isinstance(self._desc, OD) else _text(self._desc)
+                if not name:
+                    raise PYIFError('The Queue Descriptor has not been set.')
+                queue = state.queue(name)
+            queue.count_open(open_opts, 1)
+        self._open_opts = open_opts
+        self._queue = queue
+        return queue
+
+    def _handle(self, default_opts: int) -> Tuple[_QueueManagerState, _QueueState]:
+        state = self._qmgr._check()
+        queue = self._queue if self._queue is not None else self._open(default_opts)
+        return state, queue
+
+    def get_handle(self) -> Optional[int]:
+        return id(self) if self._queue is not None else None
+
+    def put(self, msg: bytes, md: Optional[MD] = None, opts: Optional[PMO] = None) -> None:
+        if not isinstance(msg, bytes):
+            raise TypeError('Message type is %s. Allowed type is bytes.' % type(msg))
+        state, queue = self._handle(CMQC.MQOO_OUTPUT)
+        md = md if md is not None else MD()
+        opts = opts if opts is not None else PMO()
+        if opts.Options & CMQC.MQPMO_NEW_MSG_ID or md.MsgId == CMQC.MQMI_NONE:
+            md.MsgId = _new_id()
+        if opts.Options & CMQC.MQPMO_NEW_CORREL_ID:
+            md.CorrelId = _new_id()
+        if not opts.Options & CMQC.MQPMO_SET_ALL_CONTEXT:
+            md.PutDate = time.strftime('%Y%m%d').encode('ascii')
+            md.PutTime = time.strftime('%H%M%S00').encode('ascii')
+        message = _Message(md.copy(), msg)
+        with state.condition:
+            if queue.attributes[CMQC.MQIA_INHIBIT_PUT] == CMQC.MQQA_PUT_INHIBITED:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_PUT_INHIBITED)
+            if opts.Options & CMQC.MQPMO_SYNCPOINT:
+                self._qmgr._puts.append((queue, message))
+            else:
+                queue.messages.append(message)
+                state.condition.notify_all()
+
+    def get(self, max_length: Optional[int] = None, md: Optional[MD] = None, opts: Optional[GMO] = None) -> bytes:
+        state, queue = self._handle(CMQC.MQOO_INPUT_AS_Q_DEF)
+        md = md if md is not None else MD()
+        opts = opts if opts is not None else GMO()
+        options = opts.Options
+        browse = options & (CMQC.MQGMO_BROWSE_FIRST | CMQC.MQGMO_BROWSE_NEXT | CMQC.MQGMO_BROWSE_MSG_UNDER_CURSOR)
+        match = opts.MatchOptions if opts.Version >= CMQC.MQGMO_VERSION_2 else CMQC.MQMO_MATCH_MSG_ID | CMQC.MQMO_MATCH_CORREL_ID
+        msg_id = md.MsgId if match & CMQC.MQMO_MATCH_MSG_ID and md.MsgId != CMQC.MQMI_NONE else None
+        correl_id = md.CorrelId if match & CMQC.MQMO_MATCH_CORREL_ID and md.CorrelId != CMQC.MQCI_NONE else None
+        wait = options & CMQC.MQGMO_WAIT
+        deadline = None if wait and opts.WaitInterval == CMQC.MQWI_UNLIMITED else time.monotonic() + max(0, opts.WaitInterval) / 1000.0
+
+        with state.condition:
+            if queue.attributes[CMQC.MQIA_INHIBIT_GET] == CMQC.MQQA_GET_INHIBITED:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_GET_INHIBITED)
+            while True:
+                self._qmgr._check()
+                message = self._find(queue, options, msg_id, correl_id)
+                if message is not None:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not wait or (remaining is not None and remaining <= 0):
+                    raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_NO_MSG_AVAILABLE)
+                state.condition.wait(remaining)
+
+            length = len(message.body) if max_length is None else int(max_length)
+            truncated = len(message.body) > length
+            md.__dict__.update(message.md.__dict__)
+            if truncated and not options & CMQC.MQGMO_ACCEPT_TRUNCATED_MSG:
+                if browse:
+                    # Like MQ, a browse that fails on truncation still moves the cursor to the message.
+                    self._cursor = message
+                raise MQMIError(CMQC.MQCC_WARNING, CMQC.MQRC_TRUNCATED_MSG_FAILED,
+                                message=message.body[:length], original_length=len(message.body))
+            if browse:
+                self._cursor = message
+            else:
+                queue.messages.remove(message)
+                if self._cursor is message:
+                    self._cursor = None
+                if options & CMQC.MQGMO_SYNCPOINT:
+                    self._qmgr._gets.append((queue, message))
+        if truncated:
+            raise MQMIError(CMQC.MQCC_WARNING, CMQC.MQRC_TRUNCATED_MSG_ACCEPTED,
+                            message=message.body[:length], original_length=len(message.body))
+        return message.body
+
+    def _find(self, queue: _QueueState, options: int, msg_id: Optional[bytes], correl_id: Optional[bytes]) -> Optional[_Message]:
+        if options & (CMQC.MQGMO_MSG_UNDER_CURSOR | CMQC.MQGMO_BROWSE_MSG_UNDER_CURSOR):
+            if self._cursor is None or self._cursor not in queue.messages:
+                return None
+            return self._cursor
+        candidates: Iterable[_Message] = queue.messages
+        if options & CMQC.MQGMO_BROWSE_NEXT and self._cursor is not None and self._cursor in queue.messages:
+            candidates = itertools.islice(queue.messages, queue.messages.index(self._cursor) + 1, None)
+        for message in candidates:
+            if msg_id is not None and message.md.MsgId != msg_id:
+                continue
+            if correl_id is not None and message.md.CorrelId != correl_id:
+                continue
+            return message
+        return None
+
+    def inquire(self, attribute: int) -> Any:
+        state, queue = self._handle(CMQC.MQOO_INQUIRE)
+        with state.condition:
+            value = queue.attribute(attribute)
+        return value.ljust(48) if attribute == CMQC.MQCA_Q_NAME else value
+
+    def close(self, options: Optional[int] = None) -> None:
+        if self._queue is None:
+            raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_HOBJ_ERROR)
+        state = self._qmgr._state
+        queue, self._queue = self._queue, None
+        if state is None:
+            return
+        with state.condition:
+            queue.count_open(self._open_opts or 0, -1)
+            if queue.temporary and queue.open_handles <= 0:
+                state.queues.pop(queue.name, None)
+
+
+def _end_subscription(state: _QueueManagerState, subscription: _SubscriptionState, remove: bool) -> None:
+    with state.condition:
+        subscription.in_use = False
+        if remove:
+            state.subscriptions.pop(subscription.name, None)
+            state.queues.pop(subscription.queue.name, None)
+
+
+class Topic(object):
+
+    def __init__(self, queue_manager: QueueManager, topic_name: Any = None, topic_string: Any = None,
+                 topic_desc: Any = None, open_opts: Optional[int] = None) -> None:
+        self._qmgr = queue_manager
+        self.topic_string = _text(topic_string)
+        self._open_opts: Optional[int] = None
+        if open_opts is not None:
+            self.open(open_opts=open_opts)
+
+    def open(self, topic_name: Any = None, topic_string: Any = None, topic_desc: Any = None,
+             open_opts: Optional[int] = None) -> None:
+        self._qmgr._check()
+        if topic_string is not None:
+            self.topic_string = _text(topic_string)
+        if not self.topic_string:
+            raise PYIFError('The Topic String has not been set.')
+        self._open_opts = CMQC.MQOO_OUTPUT if open_opts is None else open_opts
+
+    def pub(self, msg: bytes, *opts: Any) -> None:
+        if not isinstance(msg, bytes):
+            raise TypeError('Message type is %s. Allowed type is bytes.' % type(msg))
+        if self._open_opts is None:
+            raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_HOBJ_ERROR)
+        state = self._qmgr._check()
+        md = opts[0] if len(opts) > 0 and opts[0] is not None else MD()
+        pmo = opts[1] if len(opts) > 1 and opts[1] is not None else PMO()
+        with state.condition:
+            targets = [subscription.queue for subscription in state.subscriptions.values() if subscription.matches(self.topic_string)]
+        # Every subscriber gets its own copy of the publication.
+        for queue in targets:
+            target = Queue(self._qmgr)
+            target._queue = queue
+            target.put(msg, md.copy(), pmo)
+
+    def close(self, options: Optional[int] = None) -> None:
+        if self._open_opts is None:
+            raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_HOBJ_ERROR)
+        self._open_opts = None
+
+
+class Subscription(object):
+
+    def __init__(self, queue_manager: QueueManager, sub_desc: Optional[SD] = None, sub_name: Any = None,
+                 sub_queue: Any = None, sub_opts: Optional[int] = None, topic_name: Any = None, topic_string: Any = None) -> None:
+        self._qmgr = queue_manager
+        self.sub_queue: Optional[Queue] = None
+        self._subscription: Optional[_SubscriptionState] = None
+        if sub_desc is not None:
+            self.sub(sub_desc=sub_desc)
+
+    def sub(self, sub_desc: Optional[SD] = None, sub_queue: Any = None, sub_name: Any = None, sub_opts: Optional[int] = None,
+            topic_name: Any = None, topic_string: Any = None) -> None:
+        state = self._qmgr._check()
+        if sub_desc is None:
+            sub_desc = SD(Options=sub_opts or CMQC.MQSO_CREATE | CMQC.MQSO_MANAGED, SubName=sub_name or b'',
+                          ObjectString=topic_string or b'')
+        name = _text(sub_desc.SubName)
+        options = sub_desc.Options
+        with state.condition:
+            subscription = state.subscriptions.get(name) if name else None
+            if subscription is not None:
+                if not options & CMQC.MQSO_RESUME:
+                    raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_SUB_ALREADY_EXISTS)
+                if subscription.in_use:
+                    raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_SUBSCRIPTION_IN_USE)
+            else:
+                if not options & CMQC.MQSO_CREATE:
+                    raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_NO_SUBSCRIPTION)
+                durable = bool(options & CMQC.MQSO_DURABLE)
+                queue_name = 'SYSTEM.MANAGED.%s.%016X' % ('DURABLE' if durable else 'NDURABLE', next(_ids))
+                queue = state.queues[queue_name] = _QueueState(queue_name)
+                subscription = _SubscriptionState(name or queue_name, _text(sub_desc.ObjectString), durable, queue)
+                state.subscriptions[subscription.name] = subscription
+            subscription.in_use = True
+            subscription.queue.count_open(CMQC.MQOO_INPUT_AS_Q_DEF, 1)
+        self.sub_queue = Queue(self._qmgr)
+        self.sub_queue._queue = subscription.queue
+        self.sub_queue._open_opts = CMQC.MQOO_INPUT_AS_Q_DEF
+        self._subscription = subscription
+        self._qmgr._subscriptions.append(subscription)
+
+    def get_sub_queue(self) -> Optional[Queue]:
+        return self.sub_queue
+
+    def get(self, max_length: Optional[int] = None, *opts: Any) -> bytes:
+        if self.sub_queue is None:
+            raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_HOBJ_ERROR)
+        return self.sub_queue.get(max_length, *opts)
+
+    def close(self, sub_close_options: int = CMQC.MQCO_NONE, close_sub_queue: bool = False,
+              close_sub_queue_options: int = CMQC.MQCO_NONE) -> None:
+        subscription, self._subscription = self._subscription, None
+        if subscription is None:
+            raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_HOBJ_ERROR)
+        state = self._qmgr._check()
+        if subscription in self._qmgr._subscriptions:
+            self._qmgr._subscriptions.remove(subscription)
+        if close_sub_queue and self.sub_queue is not None:
+            self.sub_queue.close()
+            self.sub_queue = None
+        _end_subscription(state, subscription, remove=not subscription.durable or bool(sub_close_options & CMQC.MQCO_REMOVE_SUB))
+
+
+class PCFExecute(QueueManager):
+
+    """
+    Administration commands of the fake queue manager, run against the queues directly.
+    """
+
+    def __init__(self, name: Any = None, *args: Any, **kwargs: Any) -> None:
+        super(PCFExecute, self).__init__(None)
+        if isinstance(name, QueueManager):
+            self._state = name._check()
+            self._generation = name._generation
+        elif name is not None:
+            self.connect(name)
+
+    def disconnect(self) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        if not name.startswith('MQCMD_'):
+            raise AttributeError(name)
+        handler = getattr(self, '_' + name.lower(), None)
+
+        def command(args: Optional[Dict[int, Any]] = None, filters: Any = None) -> List[Dict[int, Any]]:
+            if handler is None:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQCFC.MQRCCF_COMMAND_FAILED)
+            return handler(args or {})
+        return command
+
+    def _mqcmd_inquire_q(self, args: Dict[int, Any]) -> List[Dict[int, Any]]:
+        state = self._check()
+        name = _text(args[CMQC.MQCA_Q_NAME])
+        with state.condition:
+            if name.endswith('*'):
+                # A generic name answers with every matching queue.
+                queues = [queue for queue_name, queue in sorted(state.queues.items()) if queue_name.startswith(name[:-1])]
+            else:
+                queues = [state.queue(name)]
+            responses = []
+            for queue in queues:
+                selectors = args.get(CMQCFC.MQIACF_Q_ATTRS, [CMQCFC.MQIACF_ALL])
+                if CMQCFC.MQIACF_ALL in selectors:
+                    selectors = [CMQC.MQCA_Q_NAME, CMQC.MQIA_CURRENT_Q_DEPTH, CMQC.MQIA_OPEN_INPUT_COUNT,
+                                 CMQC.MQIA_OPEN_OUTPUT_COUNT] + list(queue.attributes)
+                responses.append({selector: queue.attribute(selector) for selector in selectors})
+            return responses
+
+    def _mqcmd_create_q(self, args: Dict[int, Any]) -> List[Dict[int, Any]]:
+        state = self._check()
+        name = _text(args[CMQC.MQCA_Q_NAME])
+        with state.condition:
+            queue = state.queues.get(name)
+            if queue is not None and args.get(CMQCFC.MQIACF_REPLACE) != CMQCFC.MQRP_YES:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQCFC.MQRCCF_OBJECT_ALREADY_EXISTS)
+            if queue is None:
+                queue = state.queues[name] = _QueueState(name)
+            self._set_attributes(queue, args)
+        return [{}]
+
+    def _mqcmd_change_q(self, args: Dict[int, Any]) -> List[Dict[int, Any]]:
+        state = self._check()
+        with state.condition:
+            queue = state.queues.get(_text(args[CMQC.MQCA_Q_NAME]))
+            if queue is None:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_UNKNOWN_OBJECT_NAME)
+            self._set_attributes(queue, args)
+        return [{}]
+
+    def _mqcmd_delete_q(self, args: Dict[int, Any]) -> List[Dict[int, Any]]:
+        state = self._check()
+        with state.condition:
+            queue = state.queues.get(_text(args[CMQC.MQCA_Q_NAME]))
+            if queue is None:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_UNKNOWN_OBJECT_NAME)
+            if queue.open_handles:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_OBJECT_IN_USE)
+            if queue.messages and args.get(CMQCFC.MQIACF_PURGE) != CMQCFC.MQPO_YES:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_Q_NOT_EMPTY)
+            del state.queues[queue.name]
+        return [{}]
+
+    @staticmethod
+    def _set_attributes(queue: _QueueState, args: Dict[int, Any]) -> None:
+        for selector, value in args.items():
+            if selector not in (CMQC.MQCA_Q_NAME, CMQC.MQIA_Q_TYPE, CMQCFC.MQIACF_REPLACE):
+                queue.attributes[selector] = value
+
+    def _mqcmd_clear_q(self, args: Dict[int, Any]) -> List[Dict[int, Any]]:
+        state = self._check()
+        with state.condition:
+            queue = state.queue(_text(args[CMQC.MQCA_Q_NAME]))
+            if queue.open_handles:
+                raise MQMIError(CMQC.MQCC_FAILED, CMQC.MQRC_OBJECT_IN_USE)
+            queue.messages.clear()
+        return [{}]
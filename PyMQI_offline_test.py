@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+"""
+Offline checks of the PyMQI library against the in-process fake queue manager (PyMQI_fake.py).
+
+Usage:
+  python -m unittest PyMQI_offline_test
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import PyMQI_fake
+PyMQI_fake.install()
+
+import PyMQI
+
+QMGR = 'OFFLINE.QM'
+CHANNEL = 'OFFLINE.SVRCONN'
+QUEUE = 'OFFLINE.QUEUE'
+
+
+class PyMQIOfflineTest(unittest.TestCase):
+
+    def setUp(self):
+        PyMQI_fake.reset()
+        PyMQI._KNOWN_QUEUES.clear()
+        self.pq = PyMQI.PyMQI(qmgr=QMGR, channel=CHANNEL, host='localhost', port=1414)
+        self.index = self.pq.connect_in_client_mode()
+
+    def tearDown(self):
+        self.pq.disconnect_all()
+
+    def test_connect_reuses_live_connection(self):
+        self.assertEqual(self.pq.connect_in_client_mode(), self.index)
+        self.assertEqual(self.pq.connect_in_client_mode(QMGR, CHANNEL, 'localhost', 1414), self.index)
+
+    def test_reused_connection_takes_alias(self):
+        self.pq.connect_in_client_mode(QMGR, CHANNEL, 'localhost', 1415)
+        self.assertEqual(self.pq.connect_in_client_mode(alias='first'), self.index)
+        self.pq.switch_connection(2)
+        self.pq.switch_connection('first')
+        self.assertEqual(self.pq._connections.current_index, self.index)
+
+    def test_latest_connect_owns_an_alias(self):
+        second = self.pq.connect_in_client_mode(QMGR, CHANNEL, 'localhost', 1415, alias='other')
+        self.pq.connect_in_client_mode(QMGR, CHANNEL, 'localhost', 1414, alias='other')
+        self.pq.switch_connection(second)
+        self.pq.switch_connection('other')
+        self.assertEqual(self.pq._connections.current_index, self.index)
+        third = self.pq.connect_in_client_mode(QMGR, CHANNEL, 'localhost', 1416, alias='other')
+        self.pq.switch_connection(self.index)
+        self.pq.switch_connection('other')
+        self.assertEqual(self.pq._connections.current_index, third)
+
+    def test_disconnect_all_ignores_broken_connections(self):
+        PyMQI_fake.break_connections(QMGR)
+        self.pq.disconnect_all()
+
+    def test_thread_mode_connects_lazily_and_drops_ended_threads(self):
+        pq = PyMQI.PyMQI(qmgr=QMGR, channel=CHANNEL, host='localhost', port=1414, execution_mode='thread')
+        pq.connect_in_client_mode()
+        for target, args, expected in ((lambda: pq._connections, (), [0, 1, 0]),
+                                       (pq.put_message, ('from thread', QUEUE), [0, 1, 1]),
+                                       (lambda: pq._connections, (), [0, 1, 0])):
+            thread = threading.Thread(target=target, args=args)
+            thread.start()
+            thread.join()
+            self.assertEqual([len(connections) for _, connections in pq._connection_caches], expected)
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 1)
+        pq.disconnect_all()
+
+    def test_ccdt_location_is_set_only_while_connecting(self):
+        seen = []
+        connect_with_options = PyMQI_fake.QueueManager.connect_with_options
+
+        def record_ccdt(qmgr, *args, **kwargs):
+            seen.append(os.environ.get('MQCCDTURL'))
+            return connect_with_options(qmgr, *args, **kwargs)
+
+        PyMQI_fake.QueueManager.connect_with_options = record_ccdt
+        try:
+            # Without host and port, also from PyMQI.cfg, the channel comes from the CCDT.
+            pq = PyMQI.PyMQI(qmgr=QMGR, ccdt='ftp://ccdt.example/AMQCLCHL.TAB', config_file=os.devnull)
+            self.assertNotIn('MQCCDTURL', os.environ)
+            pq.connect_in_client_mode()
+            pq.put_message('via CCDT', QUEUE)
+        finally:
+            PyMQI_fake.QueueManager.connect_with_options = connect_with_options
+        self.assertEqual(seen, ['ftp://ccdt.example/AMQCLCHL.TAB'])
+        self.assertNotIn('MQCCDTURL', os.environ)
+        pq.disconnect_all()
+
+    def test_purge_counts_removed_messages(self):
+        self.pq.put_messages(['a', 'b', 'c'], QUEUE)
+        self.assertEqual(self.pq.purge_queue(QUEUE), 3)
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 0)
+        self.pq.put_messages(['a', 'b'], QUEUE)
+        self.assertEqual(self.pq.purge_queue(QUEUE, use_pcf=False, batch_size=1), 2)
+        self.assertEqual(self.pq.purge_queue(QUEUE), 0)
+
+    def test_put_message_from_file_whole_and_segmented(self):
+        payload = bytes(range(256)) * 40
+        with tempfile.TemporaryDirectory() as workdir:
+            in_file = os.path.join(workdir, 'in.bin')
+            out_file = os.path.join(workdir, 'out.bin')
+            with open(in_file, 'wb') as messagefile:
+                messagefile.write(payload)
+            for segment_size, segmented in ((None, False), (4096, True)):
+                self.pq.put_message_from_file(in_file, QUEUE, segment_size=segment_size)
+                self.pq.get_message_into_file(QUEUE, out_file, segmented=segmented)
+                with open(out_file, 'rb') as messagefile:
+                    self.assertEqual(messagefile.read(), payload)
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 0)
+
+    def test_import_of_missing_or_truncated_snapshot_fails(self):
+        self.pq.put_messages(['a' * 1000] * 50, QUEUE)
+        with tempfile.TemporaryDirectory() as workdir:
+            snapshot = os.path.join(workdir, 'queue.snapshot')
+            self.assertEqual(self.pq.export_queue_to_file(QUEUE, snapshot, compression='gzip'), 50)
+            with open(snapshot, 'rb') as snapshotfile:
+                data = snapshotfile.read()
+            with open(snapshot, 'wb') as snapshotfile:
+                snapshotfile.write(data[:len(data) // 2])
+            for path in (snapshot, os.path.join(workdir, 'missing.snapshot')):
+                with self.assertRaises(Exception) as raised:
+                    self.pq.import_queue_from_file(path, QUEUE, batch_size=1000)
+                self.assertEqual(raised.exception.args[0], '[PyMQI::import_queue_from_file] Error:')
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 50)
+
+    def test_get_message_by_message_id_leaves_other_messages(self):
+        msg_ids = self.pq.put_messages(['first', 'second', 'third'], QUEUE)
+        self.assertEqual(self.pq.get_message_by_message_id(QUEUE, msg_ids[1]), 'second')
+        self.assertEqual(self.pq.get_message_by_message_id(QUEUE, msg_ids[2], browse_first=True), 'third')
+        self.assertIsNone(self.pq.get_message_by_message_id(QUEUE, msg_ids[1]))
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 1)
+
+    def test_browse_first_skips_message_got_by_another_consumer(self):
+        correl_id = b'OFFLINE'.ljust(24, b'\0')
+        queue = PyMQI_fake.Queue(PyMQI_fake.connect(QMGR), QUEUE)
+        queue.put(b'first', PyMQI_fake.MD(CorrelId=correl_id))
+        queue.put(b'second', PyMQI_fake.MD(CorrelId=correl_id))
+        browse = self.pq._get_or_wait
+
+        def browse_then_lose_message(*args):
+            message = browse(*args)
+            if message == b'first':
+                queue.get(None, PyMQI_fake.MD(CorrelId=correl_id),
+                          PyMQI_fake.GMO(Version=2, MatchOptions=PyMQI_fake.CMQC.MQMO_MATCH_CORREL_ID))
+            return message
+
+        self.pq._get_or_wait = browse_then_lose_message
+        self.assertEqual(self.pq.get_message_by_correlation_id(QUEUE, correl_id, browse_first=True), 'second')
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 0)
+
+    def test_message_objects_and_codecs(self):
+        other = PyMQI.PyMQI(qmgr=QMGR, channel=CHANNEL, host='localhost', port=1414)
+        self.pq.register_payload_codec('upper', lambda message, options: message.text.upper())
+        self.pq.put_messages(['abc', 'abc'], QUEUE)
+        first = self.pq.get_message_object(QUEUE, codec='upper')
+        second = other.get_message_object(QUEUE)
+        self.assertEqual(first.value, 'ABC')
+        self.assertEqual(first, second)
+        self.assertEqual(first, b'abc')
+        self.assertEqual(len({first, second, b'abc'}), 1)
+        self.assertNotEqual(first, 'abc')
+        with self.assertRaises(ValueError):
+            second.decode('upper')
+        other.disconnect_all()
+
+    def test_get_from_empty_queue_is_not_an_error(self):
+        errors = []
+        self.pq._instrumentation.on_error = errors.append
+        self.assertIsNone(self.pq.get_message(QUEUE))
+        metrics = self.pq.get_keyword_metrics()
+        self.assertEqual(metrics['keywords']['get_message']['errors'], 0)
+        self.assertNotIn('last_reason', metrics['keywords']['get_message'])
+        self.assertEqual(metrics['queues'][QUEUE]['errors'], 0)
+        self.assertEqual(errors, [])
+
+    def test_cached_input_handles_share_the_queue(self):
+        self.pq.put_message('first', QUEUE)
+        self.assertEqual(self.pq.get_message(QUEUE), 'first')
+        other = PyMQI_fake.Queue(PyMQI_fake.connect(QMGR), QUEUE, PyMQI_fake.CMQC.MQOO_INPUT_SHARED)
+        self.pq.put_message('second', QUEUE)
+        self.assertEqual(other.get(), b'second')
+        other.close()
+
+    def test_handle_that_failed_on_its_queue_is_opened_again(self):
+        self.pq.put_message('first', QUEUE)
+        self.pq.alter_queues([QUEUE], INHIBIT_PUT='MQQA_PUT_INHIBITED')
+        with self.assertRaises(Exception):
+            self.pq.put_message('second', QUEUE)
+        self.assertEqual(self.pq.get_queue_handle_cache_stats()['size'], 0)
+        self.pq.alter_queues([QUEUE], INHIBIT_PUT='MQQA_PUT_ALLOWED')
+        self.pq.put_message('second', QUEUE)
+        self.assertEqual(self.pq.get_queue_handle_cache_stats()['misses'], 2)
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 2)
+
+    def test_load_with_invalid_template_fails(self):
+        with self.assertRaises(Exception) as raised:
+            self.pq.run_put_load(QUEUE, workers=2, count=4, template='{foo}')
+        self.assertEqual(raised.exception.args[0], '[PyMQI::run_put_load] Error:')
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 0)
+
+    def test_reconnect_after_connection_broken(self):
+        pq = PyMQI.PyMQI(qmgr=QMGR, channel=CHANNEL, host='localhost', port=1414, reconnect='library',
+                         reconnect_timeout=5, reconnect_backoff=0.05)
+        pq.connect_in_client_mode()
+        pq.put_message('before', QUEUE)
+        PyMQI_fake.break_connections(QMGR, 0.1)
+        with self.assertRaises(Exception):
+            pq.put_message('lost', QUEUE)
+        pq.put_message('after', QUEUE)
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 2)
+        connections = pq.get_keyword_metrics()['connections']
+        self.assertEqual(connections['reconnects'], 1)
+        self.assertEqual(connections['failed_reconnects'], 0)
+        pq.disconnect_all()
+
+    def test_metrics_count_calls_messages_and_errors(self):
+        self.pq.put_messages(['a', 'bb'], QUEUE)
+        self.pq.get_message(QUEUE)
+        metrics = self.pq.get_keyword_metrics()
+        put = metrics['keywords']['put_messages']
+        self.assertEqual((put['calls'], put['messages'], put['bytes'], put['errors']), (1, 2, 3, 0))
+        self.assertEqual(metrics['keywords']['get_message']['messages'], 1)
+        self.assertEqual(metrics['queues'][QUEUE]['calls'], 2)
+
+    def test_define_queues_skips_known_queues(self):
+        self.assertEqual(self.pq.define_queues(['OFFLINE.A', 'OFFLINE.B'], MAX_Q_DEPTH=10), 2)
+        self.assertEqual(self.pq.define_queues('OFFLINE.A, OFFLINE.B'), 0)
+        self.assertEqual(self.pq.define_queues(['OFFLINE.A'], replace=True, MAX_Q_DEPTH=20), 1)
+        queues = self.pq.inquire_queues('OFFLINE.*', 'MAX_Q_DEPTH')
+        self.assertEqual(queues, {'OFFLINE.A': {'MAX_Q_DEPTH': 20}, 'OFFLINE.B': {'MAX_Q_DEPTH': 10}})
+        self.pq.put_messages(['a', 'b'], 'OFFLINE.A')
+        self.pq.clear_queues(['OFFLINE.A'])
+        self.assertEqual(PyMQI_fake.depth(QMGR, 'OFFLINE.A'), 0)
+        self.assertEqual(self.pq.delete_queues(['OFFLINE.A', 'OFFLINE.B', 'OFFLINE.MISSING']), 2)
+
+    def test_partly_failed_pcf_commands_keep_known_queues_right(self):
+        self.pq.define_queues(['OFFLINE.A', 'OFFLINE.B'])
+        held = PyMQI_fake.Queue(PyMQI_fake.connect(QMGR), 'OFFLINE.B')
+        held.put(b'keeps the queue open')
+        with self.assertRaises(Exception) as raised:
+            self.pq.delete_queues(['OFFLINE.A', 'OFFLINE.B'])
+        self.assertEqual(raised.exception.args[0], '[PyMQI::delete_queues] Error:')
+        self.assertIn('OFFLINE.B', raised.exception.args[1])
+        self.assertEqual(self.pq.define_queues(['OFFLINE.A']), 1)
+        held.close()
+        self.pq.delete_queues(['OFFLINE.A', 'OFFLINE.B'])
+        with self.assertRaises(Exception):
+            self.pq.alter_queues(['OFFLINE.C', 'OFFLINE.D'], MAX_Q_DEPTH=5)
+        self.pq.define_queues(['OFFLINE.C'])
+        PyMQI._KNOWN_QUEUES.clear()
+        with self.assertRaises(Exception):
+            self.pq.alter_queues(['OFFLINE.C', 'OFFLINE.D'], MAX_Q_DEPTH=5)
+        self.assertEqual(PyMQI._KNOWN_QUEUES[(QMGR, CHANNEL, 'localhost(1414)')], {'OFFLINE.C'})
+    def test_no_lazy_connect_after_explicit_disconnect(self):
+        pq = PyMQI.PyMQI(qmgr=QMGR, channel=CHANNEL, host='localhost', port=1414)
+        pq.put_message('lazily connected', QUEUE)
+        pq.connect_in_client_mode('OFFLINE.QM2', CHANNEL, 'localhost', 1414, alias='qm2')
+        pq.disconnect()
+        with self.assertRaises(Exception):
+            pq.put_message('after disconnect', QUEUE)
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 1)
+        pq.connect_in_client_mode()
+        pq.disconnect_all()
+        with self.assertRaises(Exception):
+            pq.put_message('after disconnect all', QUEUE)
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 1)
+    def test_wait_for_message_gets_message_arriving_later(self):
+        timer = threading.Timer(0.1, self.pq.put_message, ('late', QUEUE))
+        timer.start()
+        self.assertEqual(self.pq.wait_for_message(QUEUE, '5s'), 'late')
+        timer.join()
+        with self.assertRaises(Exception) as raised:
+            self.pq.wait_for_message(QUEUE, '0.1s')
+        self.assertEqual(raised.exception.args[0], '[PyMQI::wait_for_message] Error:')
+
+    def test_wait_for_n_messages_leaves_messages_on_timeout(self):
+        self.pq.put_messages(['first', 'second'], QUEUE)
+        with self.assertRaises(Exception) as raised:
+            self.pq.wait_for_n_messages(QUEUE, 3, '0.3s')
+        self.assertIn('Only 2 of 3', raised.exception.args[1])
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 2)
+        self.assertEqual(self.pq.wait_for_n_messages(QUEUE, 2, '1s'), ['first', 'second'])
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 0)
+
+    def test_cancel_given_before_the_wait_ends_it(self):
+        self.pq.cancel_waits()
+        started = time.monotonic()
+        with self.assertRaises(Exception):
+            self.pq.wait_for_message(QUEUE, '10s')
+        self.assertLess(time.monotonic() - started, 1.0)
+        timer = threading.Timer(0.1, self.pq.cancel_waits)
+        timer.start()
+        started = time.monotonic()
+        with self.assertRaises(Exception):
+            self.pq.wait_for_n_messages(QUEUE, 1, '10s')
+        self.assertLess(time.monotonic() - started, self.pq.WAIT_SLICE + 1.0)
+        timer.join()
+        self.pq.put_message('after cancel', QUEUE)
+        self.assertEqual(self.pq.wait_for_message(QUEUE, '1s'), 'after cancel')
+
+    def test_browse_retry_after_timeout_does_not_wait(self):
+        msg_id = self.pq.put_messages(['taken'], QUEUE)[0]
+        queue = PyMQI_fake.Queue(PyMQI_fake.connect(QMGR), QUEUE, PyMQI_fake.CMQC.MQOO_INPUT_SHARED)
+        browse = self.pq._get_or_wait
+
+        def browse_then_lose_message(*args):
+            message = browse(*args)
+            if message is not None:
+                queue.get()
+                time.sleep(0.6)
+            return message
+
+        self.pq._get_or_wait = browse_then_lose_message
+        started = time.monotonic()
+        self.assertIsNone(self.pq.get_message_by_message_id(QUEUE, msg_id, timeout='0.5s', browse_first=True))
+        self.assertLess(time.monotonic() - started, 0.9)
+
+    def test_waits_log_how_long_they_took(self):
+        self.pq.put_messages(['a', 'b', 'c'], QUEUE)
+        logged = []
+        info = PyMQI.logger.info
+        PyMQI.logger.info = lambda message, *args, **kwargs: logged.append(message)
+        try:
+            self.pq.wait_for_message(QUEUE, '1s')
+            self.pq.wait_for_n_messages(QUEUE, 2, '1s')
+        finally:
+            PyMQI.logger.info = info
+        self.assertTrue(any(message.startswith('[PyMQI::wait_for_message]:: Ended successfully after [') for message in logged))
+        self.assertTrue(any(message.startswith('[PyMQI::wait_for_n_messages]:: Ended successfully after [') for message in logged))
+
+    def test_listener_buffers_small_and_big_messages(self):
+        big = 'x' * 10000
+        self.pq.start_queue_listener(QUEUE)
+        self.pq.put_messages(['small', big], QUEUE)
+        self.assertEqual(self.pq.listener_should_have_received(QUEUE, 2, timeout='2s'), ['small', big])
+        with self.assertRaises(AssertionError):
+            self.pq.listener_should_have_received(QUEUE, 3, timeout='0.1s')
+        self.assertEqual(self.pq.get_listener_messages(QUEUE, clear=True), ['small', big])
+        self.assertEqual(self.pq.get_listener_messages(QUEUE), [])
+        self.assertEqual(self.pq.stop_queue_listener(QUEUE), 2)
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 0)
+        with self.assertRaises(Exception):
+            self.pq.get_listener_messages(QUEUE)
+
+    def test_browsing_export_reads_big_messages_whole(self):
+        big = 'y' * 10000
+        self.pq.put_messages(['small', big, 'last'], QUEUE)
+        with tempfile.TemporaryDirectory() as workdir:
+            snapshot = os.path.join(workdir, 'queue.snapshot')
+            self.assertEqual(self.pq.export_queue_to_file(QUEUE, snapshot), 3)
+            self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 3)
+            self.assertEqual(self.pq.import_queue_from_file(snapshot, 'OFFLINE.COPY'), 3)
+        self.assertEqual(self.pq.get_all_messages('OFFLINE.COPY', as_list=True), ['small', big, 'last'])
+
+
+    def test_fan_in_gets_first_message_or_all_of_them(self):
+        big = 'z' * 10000
+        self.pq.put_message(big, 'OFFLINE.B')
+        first = self.pq.wait_for_message_on_any_queue(['OFFLINE.A', 'OFFLINE.B'], timeout='2s')
+        self.assertEqual((first['queue'], first['message']), ('OFFLINE.B', big))
+        self.pq.put_message('billing', 'OFFLINE.A')
+        with self.assertRaises(Exception) as raised:
+            self.pq.collect_from_queues('OFFLINE.A, OFFLINE.B', timeout='0.3s')
+        self.assertIn("'OFFLINE.B'", raised.exception.args[1])
+        self.assertEqual(PyMQI_fake.depth(QMGR, 'OFFLINE.A'), 1)
+        self.pq.put_message('shipping', 'OFFLINE.B')
+        replies = self.pq.collect_from_queues('OFFLINE.A, OFFLINE.B', timeout='2s')
+        self.assertEqual(sorted(reply['message'] for reply in replies), ['billing', 'shipping'])
+        self.assertEqual(PyMQI_fake.depth(QMGR, 'OFFLINE.A') + PyMQI_fake.depth(QMGR, 'OFFLINE.B'), 0)
+
+
+    def test_request_reply_and_reply_timeout(self):
+        late_errors = []
+
+        def reply(delay):
+            connection = PyMQI_fake.connect(QMGR)
+            service = PyMQI_fake.Queue(connection, QUEUE, PyMQI_fake.CMQC.MQOO_INPUT_SHARED)
+            md = PyMQI_fake.MD()
+            request = service.get(None, md, PyMQI_fake.GMO(Options=PyMQI_fake.CMQC.MQGMO_WAIT, WaitInterval=2000))
+            time.sleep(delay)
+            try:
+                reply_queue = PyMQI_fake.Queue(connection, md.ReplyToQ, PyMQI_fake.CMQC.MQOO_OUTPUT)
+            except PyMQI_fake.MQMIError as err:
+                late_errors.append(err.reason)
+                return
+            reply_queue.put(b're: ' + request, PyMQI_fake.MD(CorrelId=md.MsgId))
+            reply_queue.close()
+
+        def reply_queues():
+            return [name for name in PyMQI_fake._state(QMGR).queues if name.startswith('PYMQI.REPLY.')]
+
+        responder = threading.Thread(target=reply, args=(0,))
+        responder.start()
+        answer, rtt = self.pq.send_request_and_wait_for_reply('ping', QUEUE, timeout='2s')
+        responder.join()
+        self.assertEqual(answer, 're: ping')
+        self.assertGreater(rtt, 0)
+        self.assertEqual(len(reply_queues()), 1)
+
+        PyMQI_fake._state(QMGR).auto_define = False
+        responder = threading.Thread(target=reply, args=(0.5,))
+        responder.start()
+        with self.assertRaises(Exception) as raised:
+            self.pq.send_request_and_wait_for_reply('ping', QUEUE, timeout='0.2s')
+        self.assertIn('No reply arrived on', raised.exception.args[1])
+        self.assertEqual(reply_queues(), [])
+        responder.join()
+        self.assertEqual(late_errors, [PyMQI_fake.CMQC.MQRC_UNKNOWN_OBJECT_NAME])
+
+
+    def test_put_messages_commits_per_batch_and_backs_out_a_failed_one(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            lines = os.path.join(workdir, 'messages.txt')
+            with open(lines, 'w') as messagefile:
+                messagefile.write('one\r\ntwo\n')
+            self.assertEqual(len(self.pq.put_messages(lines, QUEUE)), 2)
+        self.assertEqual(len(set(self.pq.put_messages(['a', 'b', 'c'], QUEUE, batch_size=2))), 3)
+        self.assertEqual(self.pq.get_all_messages(QUEUE, as_list=True), ['one', 'two', 'a', 'b', 'c'])
+
+        put = self.pq._put
+
+        def fail_fourth_put(queue, message, *args):
+            if message == b'4':
+                raise PyMQI_fake.MQMIError(PyMQI_fake.CMQC.MQCC_FAILED, PyMQI_fake.CMQC.MQRC_PUT_INHIBITED)
+            put(queue, message, *args)
+
+        self.pq._put = fail_fourth_put
+        with self.assertRaises(Exception) as raised:
+            self.pq.put_messages(['1', '2', '3', '4'], QUEUE, batch_size=2)
+        self.assertEqual(raised.exception.args[0], '[PyMQI::put_messages] Error:')
+        self.assertEqual(self.pq.get_all_messages(QUEUE, as_list=True), ['1', '2'])
+
+
+    def test_streaming_gets_stop_at_their_limits(self):
+        self.pq.put_messages(['m1', 'm2', 'm3', 'm4', 'm5', 'm6'], QUEUE)
+        self.assertEqual(self.pq.get_all_messages(QUEUE, max_messages=2), 'm1, m2')
+        self.assertEqual(self.pq.get_all_messages(QUEUE, as_list=True, max_bytes=3), ['m3', 'm4'])
+        consumed = self.pq.consume_messages(QUEUE)
+        self.assertEqual(next(consumed), 'm5')
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 1)
+        consumed.close()
+        with tempfile.TemporaryDirectory() as workdir:
+            target = os.path.join(workdir, 'messages.dat')
+            self.assertEqual(self.pq.get_all_messages_into_file(QUEUE, target), 1)
+            with open(target) as messagefile:
+                self.assertEqual(messagefile.read(), 'm6')
+        self.assertEqual(self.pq.get_all_messages(QUEUE), '')
+
+    def test_streaming_get_from_get_inhibited_queue_fails(self):
+        self.pq.put_message('kept', QUEUE)
+        self.pq.alter_queues([QUEUE], INHIBIT_GET='MQQA_GET_INHIBITED')
+        with self.assertRaises(Exception) as raised:
+            self.pq.get_all_messages(QUEUE)
+        self.assertEqual(raised.exception.args[0], '[PyMQI::get_all_messages] Error:')
+        self.assertIn('2016', raised.exception.args[1])
+        with self.assertRaises(Exception):
+            list(self.pq.consume_messages(QUEUE))
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 1)
+
+
+    def test_receive_buffer_follows_message_sizes(self):
+        self.pq.put_messages(['s' * 100] * 19 + ['b' * 10000], QUEUE)
+        self.assertEqual(len(self.pq.get_all_messages(QUEUE, as_list=True)), 20)
+        sizes = self.pq.get_receive_buffer_sizes()[QUEUE]
+        self.assertEqual((sizes['samples'], sizes['p50'], sizes['max'], sizes['truncations']), (20, 100, 10000, 1))
+        self.assertEqual(sizes['buffer_size'], 256)
+        self.pq.put_messages(['b' * 10000] * 20, QUEUE)
+        self.assertEqual(self.pq.get_all_messages(QUEUE, as_list=True), ['b' * 10000] * 20)
+        sizes = self.pq.get_receive_buffer_sizes()[QUEUE]
+        self.assertEqual(sizes['buffer_size'], 16384)
+        self.assertEqual(sizes['truncations'], 2)
+
+
+    def test_load_keywords_report_what_they_did(self):
+        result = self.pq.run_put_load(QUEUE, workers=2, count=10)
+        self.assertEqual((result['messages'], result['errors']), (10, 0))
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 10)
+        self.assertIn('put_p95_ms', result)
+        self.pq.purge_queue(QUEUE)
+        result = self.pq.run_put_get_load(QUEUE, workers=2, count=6)
+        self.assertEqual((result['messages'], result['errors']), (6, 0))
+        self.assertIn('rtt_p99_ms', result)
+        self.assertEqual(PyMQI_fake.depth(QMGR, QUEUE), 0)
+
+    def test_round_trip_load_without_replies_fails(self):
+        with self.assertRaises(Exception) as raised:
+            self.pq.run_put_get_load(QUEUE, reply_queue='OFFLINE.REPLY', workers=2, count=2, reply_timeout='0.2s')
+        self.assertEqual(raised.exception.args[0], '[PyMQI::run_put_get_load] Error:')
+
+
+    def test_queue_depth_and_attributes(self):
+        self.pq.put_messages(['a', 'b', 'c'], QUEUE)
+        self.assertEqual(self.pq.get_queue_depth(QUEUE), 3)
+        expected = {'CURRENT_Q_DEPTH': 3, 'MAX_Q_DEPTH': 5000, 'OPEN_INPUT_COUNT': 0, 'OPEN_OUTPUT_COUNT': 1,
+                    'INHIBIT_GET': 0, 'INHIBIT_PUT': 0}
+        self.assertEqual(self.pq.get_queue_attributes(QUEUE), expected)
+        self.pq._active_connection.pcf_inquire_allowed = False
+        self.assertEqual(self.pq.get_queue_attributes(QUEUE), expected)
+        self.assertEqual(self.pq.get_queue_attributes(QUEUE, 'MQCA_Q_NAME', 'max_q_depth'),
+                         {'MQCA_Q_NAME': QUEUE, 'max_q_depth': 5000})
+        with self.assertRaises(Exception) as raised:
+            self.pq.get_queue_attributes(QUEUE, 'NO_SUCH_ATTRIBUTE')
+        self.assertIn('NO_SUCH_ATTRIBUTE', raised.exception.args[1])
+
+    def test_wait_until_queue_depth_is(self):
+        timer = threading.Timer(0.2, self.pq.put_messages, (['a', 'b'], QUEUE))
+        timer.start()
+        self.assertEqual(self.pq.wait_until_queue_depth_is(QUEUE, 2, timeout='2s', comparison='>='), 2)
+        timer.join()
+        started = time.monotonic()
+        with self.assertRaises(Exception) as raised:
+            self.pq.wait_until_queue_depth_is(QUEUE, 0, timeout='0.3s')
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertIn("Depth of 'OFFLINE.QUEUE' is 2, not == 0", raised.exception.args[1])
+        with self.assertRaises(Exception):
+            self.pq.wait_until_queue_depth_is(QUEUE, 2, comparison='=~')
+
+
+    def test_durable_subscription_keeps_publications_while_closed(self):
+        sub = self.pq.subscribe('orders/created', 'ORDERS.TEST', durable=True)
+        for number in range(3):
+            self.pq.publish('order %d' % number, 'orders/created')
+        self.assertEqual(self.pq.get_publications(sub, max_count=2, wait='0.1s'), ['order 0', 'order 1'])
+        self.assertEqual(self.pq.get_publications(sub, wait='0.1s'), ['order 2'])
+        self.assertEqual(self.pq.get_publications(sub, wait='0.1s'), [])
+        self.pq.unsubscribe(sub)
+        self.pq.publish('while closed', 'orders/created')
+        self.assertEqual(self.pq.subscribe('orders/created', 'ORDERS.TEST', durable=True), sub)
+        self.assertEqual(self.pq.get_publications(sub, wait='0.1s'), ['while closed'])
+        self.pq.unsubscribe(sub, remove=True)
+
+    def test_publication_keywords_fail_on_unknown_or_clashing_subscriptions(self):
+        self.pq.subscribe('orders/created', 'ORDERS.TEST')
+        with self.assertRaises(Exception) as raised:
+            self.pq.subscribe('orders/cancelled', 'ORDERS.TEST')
+        self.assertEqual(raised.exception.args[0], '[PyMQI::subscribe] Error:')
+        self.pq.unsubscribe('ORDERS.TEST')
+        with self.assertRaises(Exception) as raised:
+            self.pq.get_publications('ORDERS.TEST', wait='0.1s')
+        self.assertIn('is not open', raised.exception.args[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
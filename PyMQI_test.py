@@ -1,6 +1,8 @@
 # Pre-requisite:
 # export LD_LIBRARY_PATH="$LD_LIBRARY_PATH:/opt/mqm/lib64"
 
+import os
+
 import PyMQI
 
 print('Testing PyMQI wrapper python library')
@@ -8,11 +10,16 @@ print('')
 
 print('Test step: Instantiate a pyMQI object and connect to a queuemanager...')
 pq = PyMQI.PyMQI()
-pq.connect_in_client_mode()
+conn_id = pq.connect_in_client_mode()
+print('')
+
+print('Test step: Connect again with the same parameters, the live connection must be reused...')
+print('Connection IDs: [', conn_id, '] and [', pq.connect_in_client_mode(), '].')
 print('')
 
 print('Test step: Purge a queue...')
-pq.purge_queue('T1.SVC1.REQUEST')
+print('Purged messages: [', pq.purge_queue('T1.SVC1.REQUEST'), '].')
+print('Purged messages without PCF: [', pq.purge_queue('T1.SVC1.REQUEST', use_pcf=False), '].')
 print('')
 
 print('Test step: Put a message into a queue in queuemanager and read it back...')
@@ -102,6 +109,114 @@ print('].')
 pq.purge_queue('T1.SVC1.REPLY')
 print('')
 
+print('Test step: Put a binary file into a queue in 3 segments and read it back segment by segment into an output file...')
+ifmsg = bytes(range(256)) * 1024
+with open("schrkd_input.bin", "wb") as fih:
+    fih.write(ifmsg)
+pq.put_message_from_file("schrkd_input.bin", 'T1.SVC1.REPLY', segment_size=100000)
+pq.get_message_into_file('T1.SVC1.REPLY', "schrkd_output.bin", segmented=True)
+with open("schrkd_output.bin", "rb") as file1:
+    print('Binary content got back unchanged: [', file1.read() == ifmsg, '].')
+pq.purge_queue('T1.SVC1.REPLY')
+print('')
+
+print('Test step: Put 2 messages into a queue and wait for both of them...')
+pq.put_message('Hello world_t4_1', 'T1.SVC1.REPLY')
+pq.put_message('Hello world_t4_2', 'T1.SVC1.REPLY')
+msgs = pq.wait_for_n_messages('T1.SVC1.REPLY', 2, '5s')
+print('Messages got back from queue: [', msgs, '].')
+print('')
+
+print('Test step: Put 3 messages into a queue and get the 2nd one back by its message ID...')
+ids = pq.put_messages(['Hello world_t5_1', 'Hello world_t5_2', 'Hello world_t5_3'], 'T1.SVC1.REPLY')
+msg = pq.get_message_by_message_id('T1.SVC1.REPLY', ids[1])
+print('Message got back from queue: [', msg, '].')
+msg = pq.get_message_by_message_id('T1.SVC1.REPLY', ids[2], browse_first=True)
+print('Message got back from queue under browse cursor: [', msg, '].')
+pq.purge_queue('T1.SVC1.REPLY')
+print('')
+
+print('Test step: Put 1000 messages into a queue in batches under syncpoint and read all of them back...')
+ids = pq.put_messages(['Hello world_t3_%d' % i for i in range(1000)], 'T1.SVC1.REPLY', 100)
+print('Number of message IDs got back: [', len(ids), '].')
+msgs = pq.get_all_messages('T1.SVC1.REPLY', as_list=True, max_messages=600)
+print('Number of messages got back as list, limited to 600: [', len(msgs), '].')
+print('Number of remaining messages got back lazily: [', sum(1 for msg in pq.consume_messages('T1.SVC1.REPLY')), '].')
+pq.purge_queue('T1.SVC1.REPLY')
+print('')
+
+print('Test step: Put 5 messages into a queue and check its depth and attributes without getting them...')
+pq.put_messages(['Hello world_t7_%d' % i for i in range(5)], 'T1.SVC1.REPLY')
+print('Depth reached: [', pq.wait_until_queue_depth_is('T1.SVC1.REPLY', 5, '5s', '>='), '].')
+print('Queue depth: [', pq.get_queue_depth('T1.SVC1.REPLY'), '].')
+print('Queue attributes: [', pq.get_queue_attributes('T1.SVC1.REPLY', 'CURRENT_Q_DEPTH', 'MAX_Q_DEPTH', 'Q_DESC'), '].')
+pq.purge_queue('T1.SVC1.REPLY')
+print('')
+
+print('Test step: Put a JSON message into a queue and get it back as a message object...')
+pq.put_message('{"order": {"id": 42, "status": "OK"}}', 'T1.SVC1.REPLY')
+msg = pq.get_message_object('T1.SVC1.REPLY', codec='json', timeout='5s')
+print('Message object: [', repr(msg), '], status: [', msg.value['order']['status'], '], CCSID: [', msg.ccsid, '].')
+print('')
+
+print('Test step: Export 5 messages of a queue into a compressed snapshot file and import them back...')
+pq.put_messages(['Hello world_t8_%d' % i for i in range(5)], 'T1.SVC1.REPLY')
+print('Number of messages exported: [', pq.export_queue_to_file('T1.SVC1.REPLY', 'PyMQI_test.snapshot', compression='gzip'), '].')
+pq.purge_queue('T1.SVC1.REPLY')
+print('Number of messages imported: [', pq.import_queue_from_file('PyMQI_test.snapshot', 'T1.SVC1.REPLY'), '].')
+print('Queue depth after the import: [', pq.get_queue_depth('T1.SVC1.REPLY'), '].')
+pq.purge_queue('T1.SVC1.REPLY')
+os.remove('PyMQI_test.snapshot')
+print('')
+
+print('Test step: Put a message into two queues and collect one from each, then wait for one on any of them...')
+pq.put_message('Hello world_t9_1', 'T1.SVC1.REQUEST')
+pq.put_message('Hello world_t9_2', 'T1.SVC1.REPLY')
+print('Messages collected: [', [(msg['queue'], msg['message']) for msg in pq.collect_from_queues(['T1.SVC1.REQUEST', 'T1.SVC1.REPLY'], '5s')], '].')
+pq.put_message('Hello world_t9_3', 'T1.SVC1.REPLY')
+msg = pq.wait_for_message_on_any_queue('T1.SVC1.REQUEST, T1.SVC1.REPLY', '5s')
+print('First message: [', msg['message'], '] from [', msg['queue'], '] after [', msg['elapsed'], '] seconds.')
+print('')
+
+print('Test step: Subscribe to a topic, publish 100 messages on it and get them in one batch...')
+sub = pq.subscribe('T1/SVC1/EVENTS')
+for i in range(100):
+    pq.publish('Hello world_t10_%d' % i, 'T1/SVC1/EVENTS')
+print('Number of publications got: [', len(pq.get_publications(sub, max_count=200, wait='2s')), '].')
+pq.unsubscribe(sub)
+print('')
+
+print('Test step: Define 3 temporary queues, define them again, inquire, alter and delete them...')
+tmp_queues = ['T1.SVC1.TMP.%d' % i for i in range(3)]
+print('Number of queues defined: [', pq.define_queues(tmp_queues, MAX_Q_DEPTH=100, Q_DESC='PyMQI test'), '].')
+print('Number of queues defined again, known ones are skipped: [', pq.define_queues(tmp_queues), '].')
+pq.alter_queues(tmp_queues, MAX_Q_DEPTH=200)
+print('Queues inquired: [', pq.inquire_queues('T1.SVC1.TMP.*', 'MAX_Q_DEPTH', 'Q_DESC'), '].')
+print('Number of queues deleted: [', pq.delete_queues(tmp_queues), '].')
+print('')
+
+print('Test step: Start a listener on a queue, put 3 messages and check them in the listener buffer...')
+pq.start_queue_listener('T1.SVC1.REPLY')
+pq.put_messages(['Hello world_t6_1', 'Hello world_t6_2', 'Hello world_t6_3'], 'T1.SVC1.REPLY')
+msgs = pq.listener_should_have_received('T1.SVC1.REPLY', count=3, contains='_t6_', timeout='5s')
+print('Messages received by the listener: [', msgs, '].')
+print('Messages got by the listener: [', pq.stop_queue_listener('T1.SVC1.REPLY'), '].')
+print('')
+
+print('Test step: Show the reconnects made so far, there must be none...')
+print('Connection metrics: [', pq.get_keyword_metrics()['connections'], '].')
+print('')
+
+print('Test step: Show the open queue handle cache statistics, the queues above must have been opened only once...')
+stats = pq.get_queue_handle_cache_stats()
+print('Queue handle cache stats: [', stats, '].')
+print('')
+
+print('Test step: Show the per keyword and per queue metrics of the calls above...')
+metrics = pq.get_keyword_metrics()
+print('Metrics of queue T1.SVC1.REPLY: [', metrics['queues']['T1.SVC1.REPLY'], '].')
+print('')
+
 print('Test step: Disconnect from queuemanager...')
-pq.disconnect()
+pq.disconnect_all()
 print('')